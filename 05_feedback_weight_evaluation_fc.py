@@ -11,6 +11,22 @@ from network.layers.conv_to_fully_connected import ConvToFullyConnected
 from network.layers.fully_connected import FullyConnected
 from network.model import Model
 from network.optimizer import GDMomentumOptimizer
+from network.schedule import EarlyStopping
+from network.sweep import SweepRunner, grid
+
+
+def build(initializer, num_hidden_units, num_hidden_layers):
+    layers = [ConvToFullyConnected()]
+    for i in range(num_hidden_layers):
+        layers += [FullyConnected(size=num_hidden_units, activation=activation.tanh, fb_weight_initializer=initializer)]
+    layers += [FullyConnected(size=10, activation=None, last_layer=True)]
+
+    return Model(
+        layers=layers,
+        num_classes=10,
+        optimizer=GDMomentumOptimizer(lr=1e-3, mu=0.9)
+    )
+
 
 if __name__ == '__main__':
     freeze_support()
@@ -39,34 +55,22 @@ if __name__ == '__main__':
         'Normal(sigma=100, mu=0)',
     ]
 
-    statistics = []
-
-    for initializer in initializers:
-        layers = [ConvToFullyConnected()]
-        for i in range(num_hidden_layers):
-            layers += [FullyConnected(size=num_hidden_units, activation=activation.tanh, fb_weight_initializer=initializer)]
-        layers += [FullyConnected(size=10, activation=None, last_layer=True)]
-
-        model = Model(
-            layers=layers,
-            num_classes=10,
-            optimizer=GDMomentumOptimizer(lr=1e-3, mu=0.9)
-        )
+    # the configurations are trained concurrently, one worker process per cpu, diverging and stalled configurations
+    # are stopped early
+    configs = grid(initializer=initializers, num_hidden_units=[num_hidden_units], num_hidden_layers=[num_hidden_layers])
+    statistics = SweepRunner().run(build, configs, data, method='dfa', num_passes=num_passes, batch_size=50,
+                                   early_stopping=EarlyStopping(patience=5))
 
+    for initializer, stats in zip(initializers, statistics):
         print("\n\n------------------------------------")
 
         print("Initialize: {}".format(initializer))
-
-        print("\nRun training:\n------------------------------------")
-
-        stats = model.train(data_set=data, method='dfa', num_passes=num_passes, batch_size=50)
-        loss, accuracy = model.cost(*data.test_set())
+        if stats['stop_reason'] is not None:
+            print("Stopped after epoch {}: {}".format(stats['stop_epoch'], stats['stop_reason']))
 
         print("\nResult:\n------------------------------------")
-        print('loss on test set: {}'.format(loss))
-        print('accuracy on test set: {}'.format(accuracy))
-
-        statistics.append(stats)
+        print('loss on test set: {}'.format(stats['test_loss']))
+        print('accuracy on test set: {}'.format(stats['test_accuracy']))
 
     plt.title('Loss')
     plt.xlabel('epoch')
@@ -0,0 +1,73 @@
+from multiprocessing import freeze_support
+
+import numpy as np
+
+import dataset.cifar10_dataset
+
+from network import activation
+from network.layers.conv_to_fully_connected import ConvToFullyConnected
+from network.layers.convolution_im2col import Convolution
+from network.layers.fully_connected import FullyConnected
+from network.model import Model
+from network.optimizer import GDMomentumOptimizer
+
+
+def fc_layers():
+    """ architecture of 00b_fc_newtork_train_performance.py """
+    return [
+        ConvToFullyConnected(),
+        FullyConnected(size=500, activation=activation.tanh),
+        FullyConnected(size=500, activation=activation.tanh),
+        FullyConnected(size=500, activation=activation.tanh),
+        FullyConnected(size=500, activation=activation.tanh),
+        FullyConnected(size=500, activation=activation.tanh),
+        FullyConnected(size=10, activation=None, last_layer=True)
+    ]
+
+
+def conv_layers():
+    """ architecture of 01_conv_network.py """
+    return [
+        Convolution((8, 3, 4, 4), stride=2, padding=2, dropout_rate=0, activation=activation.tanh),
+        Convolution((16, 8, 3, 3), stride=2, padding=1, dropout_rate=0, activation=activation.tanh),
+        Convolution((32, 16, 3, 3), stride=2, padding=1, dropout_rate=0, activation=activation.tanh),
+        ConvToFullyConnected(),
+        FullyConnected(size=64, activation=activation.tanh),
+        FullyConnected(size=10, activation=None, last_layer=True)
+    ]
+
+
+if __name__ == '__main__':
+    """
+    Goal: Compare training time and accuracy of float64 and float32 training (with float64 accumulation of loss and
+    regularization) for the fully connected and the convolutional network
+    """
+    freeze_support()
+
+    num_iteration = 3
+
+    for name, layers, lr in [('fc', fc_layers, 1e-3), ('conv', conv_layers, 1e-2)]:
+        for dtype in [np.float64, np.float32]:
+            data = dataset.cifar10_dataset.load(dtype=dtype)
+
+            for method in ['dfa', 'bp']:
+                np.random.seed(0)
+
+                model = Model(
+                    layers=layers(),
+                    num_classes=10,
+                    optimizer=GDMomentumOptimizer(lr=lr, mu=0.9),
+                    dtype=dtype
+                )
+
+                print("\nRun training ({}, {}, {}):\n------------------------------------".format(name, method, dtype.__name__))
+
+                stats = model.train(data_set=data, method=method, num_passes=num_iteration, batch_size=64, verbose=False)
+                loss, accuracy = model.cost(*data.test_set())
+
+                print('loss on test set: {}'.format(loss))
+                print('accuracy on test set: {}'.format(accuracy))
+                print("time spend during forward pass: {}".format(stats['forward_time']))
+                print("time spend during backward pass: {}".format(stats['backward_time']))
+                print("time spend during update pass: {}".format(stats['update_time']))
+                print("time spend in total: {}".format(stats['total_time']))
@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+
+from network.utils import im2col_backend
+from network.utils.im2col import im2col_indices, col2im_indices
+
+
+def benchmark(function, *args, repeat=5) -> float:
+    """ best time of repeat runs, after one warm-up run (numba compilation) """
+    function(*args)
+    best = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        function(*args)
+        best = min(best, time.time() - start)
+    return best
+
+
+if __name__ == '__main__':
+    """
+    Goal: Check that all im2col / col2im backends compute the same result as the fancy indexing reference and compare
+    their speed (with and without a preallocated column buffer) on the convolution layers of 01_conv_network.py
+    (batch size 64, CIFAR-10)
+    """
+    # (input shape, filter height, filter width, padding, stride)
+    configurations = [
+        ((64, 3, 32, 32), 4, 4, 2, 2),
+        ((64, 8, 17, 17), 3, 3, 1, 2),
+        ((64, 16, 9, 9), 3, 3, 1, 2),
+        ((64, 32, 16, 16), 3, 3, 1, 1),
+    ]
+
+    print("available backends: {} (auto: {})".format(
+        im2col_backend.available_backends(), im2col_backend.get_backend('auto')[0].__name__))
+
+    for dtype in [np.float64, np.float32]:
+        for shape, fh, fw, padding, stride in configurations:
+            N, C, H, W = shape
+            x = np.random.randn(*shape).astype(dtype)
+            reference_cols = im2col_indices(x, fh, fw, padding, stride)
+            reference_x = col2im_indices(reference_cols, shape, fh, fw, padding, stride)
+
+            print("\n{} {}, filter {}x{}, padding {}, stride {}:".format(dtype.__name__, shape, fh, fw, padding, stride))
+            for name in im2col_backend.available_backends():
+                im2col, col2im = im2col_backend.get_backend(name)
+                cols = im2col(x, fh, fw, padding, stride)
+                x_rec = col2im(cols, N, C, H, W, fh, fw, padding, stride)
+                assert cols.dtype == dtype and x_rec.dtype == dtype, "{}: wrong dtype".format(name)
+                error = max(np.max(np.abs(cols - reference_cols)), np.max(np.abs(x_rec - reference_x)))
+
+                out = np.empty_like(cols)
+                error = max(error, np.max(np.abs(im2col(x, fh, fw, padding, stride, out) - reference_cols)))
+
+                im2col_time = benchmark(im2col, x, fh, fw, padding, stride)
+                im2col_out_time = benchmark(im2col, x, fh, fw, padding, stride, out)
+                col2im_time = benchmark(col2im, cols, N, C, H, W, fh, fw, padding, stride)
+                print("    {:8s} im2col: {:8.3f} ms   im2col (buffer): {:8.3f} ms   col2im: {:8.3f} ms   "
+                      "max error: {:.1e}".format(name, im2col_time * 1000, im2col_out_time * 1000, col2im_time * 1000,
+                                                 error))
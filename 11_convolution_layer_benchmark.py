@@ -0,0 +1,148 @@
+import time
+
+import numpy as np
+
+from network import activation
+from network.layers import convolution, convolution_im2col
+
+
+class LoopConvolution(convolution.Convolution):
+    """ previous implementation of network.layers.convolution.Convolution with python loops over the output pixels """
+
+    def __pad(self, X: np.ndarray) -> np.ndarray:
+        p = self.padding
+        return np.pad(X, ((0, 0), (0, 0), (p, p), (p, p)), 'constant', constant_values=0)
+
+    def forward(self, X, mode='predict') -> np.ndarray:
+        n_in, c, h_in, w_in = X.shape
+        n_f, c, h_f, w_f = self.W.shape
+
+        z = np.zeros((n_in, n_f, self.h_out, self.w_out), dtype=X.dtype)
+        x_padded = self.__pad(X)
+
+        for h in range(self.h_out):
+            for w in range(self.w_out):
+                for j in range(n_f):
+                    z[:, j, h, w] = np.sum(
+                        x_padded[:, :, h * self.stride:h * self.stride + h_f, w * self.stride:w * self.stride + w_f] *
+                        self.W[j], axis=(1, 2, 3)) + self.b[j]
+
+        self.a_in = X
+        self.a_out = z if self.activation is None else self.activation.forward(z)
+        return self.a_out
+
+    def dfa_projected(self, E: np.ndarray) -> tuple:
+        E = E.reshape((-1,) + self.B.shape[1:])
+
+        n_f, c_f, h_f, w_f = self.W.shape
+        n_e, c_e, h_e, w_e = E.shape
+
+        delta = E * (self.a_out if self. activation is None else self.activation.gradient(self.a_out))
+        X_padded = self.__pad(self.a_in)
+
+        dW = np.zeros_like(self.W)
+        db = np.sum(E, axis=(0, 2, 3))
+
+        for h in range(h_e):
+            for w in range(w_e):
+                dW += np.tensordot(delta[:, :, h, w].T, X_padded[:, :, h * self.stride:h * self.stride + h_f,
+                                                        w * self.stride:w * self.stride + w_f], axes=([-1], [0]))
+
+        return dW, db
+
+    def back_prob(self, E: np.ndarray) -> tuple:
+        n_f, c_f, h_f, w_f = self.W.shape
+        n_e, c_e, h_e, w_e = E.shape
+        p = self.padding
+
+        dW = np.zeros_like(self.W)
+
+        delta = E * (self.a_out if self. activation is None else self.activation.gradient(self.a_out))
+        X_padded = self.__pad(self.a_in)
+        dX_padded = self.__pad(np.zeros_like(self.a_in))
+
+        for h in range(h_e):
+            for w in range(w_e):
+                curr_h = h * self.stride
+                curr_w = w * self.stride
+                dW += np.tensordot(
+                    delta[:, :, h, w].T,
+                    X_padded[:, :, curr_h:curr_h + h_f, curr_w:curr_w + w_f],
+                    axes=([-1], [0])
+                )
+                dX_padded[:, :, curr_h:curr_h + h_f, curr_w:curr_w + w_f] += np.einsum(
+                    'ij,jklm->iklm',
+                    delta[:, :, h, w],
+                    self.W
+                )
+
+        dX = dX_padded[:, :, p:p + self.a_in.shape[2], p:p + self.a_in.shape[3]]
+        db = np.sum(E, axis=(0, 2, 3))
+
+        return dX, dW, db
+
+
+def benchmark(function, repeat=3) -> float:
+    """ best time of repeat runs, after one warm-up run """
+    function()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        best = min(best, time.time() - start)
+    return best
+
+
+if __name__ == '__main__':
+    """
+    Goal: Compare the vectorized naive convolution layer (sliding windows + tensordot) with the previous loop
+    implementation and with the im2col convolution layer, on the convolution layers of 01_conv_network.py (batch size
+    64, CIFAR-10). The loop and the vectorized implementation have to give the same results.
+    """
+    num_classes = 10
+    # (input shape, filter shape, stride, padding)
+    configurations = [
+        ((64, 3, 32, 32), (8, 3, 4, 4), 2, 2),
+        ((64, 8, 17, 17), (16, 8, 3, 3), 2, 1),
+        ((64, 16, 9, 9), (32, 16, 3, 3), 2, 1),
+    ]
+
+    for input_shape, filter_shape, stride, padding in configurations:
+        print("\ninput {}, filter {}, stride {}, padding {}:".format(input_shape, filter_shape, stride, padding))
+        X = np.random.randn(*input_shape)
+
+        layers = {}
+        for name, layer_class in [('loops', LoopConvolution), ('vectorized', convolution.Convolution),
+                                  ('im2col', convolution_im2col.Convolution)]:
+            np.random.seed(0)
+            layer = layer_class(filter_shape, stride=stride, padding=padding, activation=activation.tanh)
+            layer.initialize(input_shape[1:], num_classes, 'bp')
+            layers[name] = layer
+
+        # same parameters for all layers, the im2col layer stores its feedback weights flattened
+        np.random.seed(1)
+        W = np.random.randn(*filter_shape) / np.sqrt(np.prod(filter_shape[1:]))
+        b = np.random.randn(filter_shape[0])
+        B = np.random.randn(num_classes, filter_shape[0], layers['loops'].h_out, layers['loops'].w_out)
+        E_out = np.random.randn(input_shape[0], num_classes)
+        E = np.random.randn(input_shape[0], filter_shape[0], layers['loops'].h_out, layers['loops'].w_out)
+        for name, layer in layers.items():
+            layer.W, layer.b = W.copy(), b.copy()
+            layer.B = B.reshape(num_classes, -1).copy() if name == 'im2col' else B.copy()
+
+        results = {}
+        for name, layer in layers.items():
+            out = layer.forward(X, mode='train')
+            dfa_dW, _ = layer.dfa(E_out)
+            dX, bp_dW, _ = layer.back_prob(E.copy())
+            results[name] = (out, dfa_dW, dX, bp_dW)
+
+            forward_time = benchmark(lambda: layer.forward(X, mode='train'))
+            dfa_time = benchmark(lambda: layer.dfa(E_out))
+            back_prob_time = benchmark(lambda: layer.back_prob(E.copy()))
+            print("    {:10s} forward: {:9.2f} ms   dfa: {:9.2f} ms   back_prob: {:9.2f} ms".format(
+                name, forward_time * 1000, dfa_time * 1000, back_prob_time * 1000))
+
+        for name in ['vectorized', 'im2col']:
+            error = max(np.max(np.abs(a - b)) for a, b in zip(results[name], results['loops']))
+            print("    max difference {} - loops: {:.1e}".format(name, error))
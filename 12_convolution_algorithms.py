@@ -0,0 +1,70 @@
+import time
+
+import numpy as np
+
+from network import activation
+from network.layers import convolution_im2col
+from network.layers.convolution_im2col import Convolution
+
+
+def benchmark(function, repeat=3) -> float:
+    """ best time of repeat runs, after one warm-up run """
+    function()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        best = min(best, time.time() - start)
+    return best
+
+
+if __name__ == '__main__':
+    """
+    Goal: Compare the im2col, Winograd and FFT convolution algorithms (forward pass, dfa weight gradient and bp
+    gradients) on the convolution layers of 01_conv_network.py and 02b_deep_conv_network.py (batch size 64, CIFAR-10)
+    and show which algorithm 'auto' picks
+    """
+    num_classes = 10
+    batch_size = 64
+    # (input shape, filter shape, stride, padding)
+    configurations = [
+        ((3, 32, 32), (8, 3, 4, 4), 2, 2),
+        ((8, 17, 17), (16, 8, 3, 3), 2, 1),
+        ((3, 32, 32), (16, 3, 3, 3), 1, 1),
+        ((16, 16, 16), (16, 16, 3, 3), 1, 1),
+        ((16, 8, 8), (32, 16, 3, 3), 1, 1),
+        ((6, 32, 32), (6, 6, 3, 3), 1, 1),
+    ]
+
+    for dtype in [np.float64, np.float32]:
+        for input_shape, filter_shape, stride, padding in configurations:
+            print("\n{} input {}, filter {}, stride {}, padding {}:".format(
+                dtype.__name__, input_shape, filter_shape, stride, padding))
+            X = np.random.randn(batch_size, *input_shape).astype(dtype)
+            E_out = np.random.randn(batch_size, num_classes).astype(dtype)
+
+            results = {}
+            for algorithm in convolution_im2col.ALGORITHMS:
+                try:
+                    layer = Convolution(filter_shape, stride=stride, padding=padding, activation=activation.tanh,
+                                        algorithm=algorithm)
+                except ValueError:
+                    continue
+                np.random.seed(0)
+                layer.initialize(input_shape, num_classes, 'dfa', dtype)
+                E = np.random.randn(batch_size, filter_shape[0], layer.h_out, layer.w_out).astype(dtype)
+
+                out = layer.forward(X, mode='train').copy()
+                dfa_dW, _ = layer.dfa(E_out)
+                dX, bp_dW, _ = layer.back_prob(E.copy())
+                results[algorithm] = (out, dfa_dW, dX, bp_dW)
+
+                forward_time = benchmark(lambda: layer.forward(X, mode='train'))
+                dfa_time = benchmark(lambda: layer.dfa(E_out))
+                back_prob_time = benchmark(lambda: layer.back_prob(E.copy()))
+                error = max(np.max(np.abs(a - b)) / max(np.max(np.abs(b)), 1e-30)
+                            for a, b in zip(results[algorithm], results['im2col']))
+                print("    {:8s} forward: {:8.2f} ms   dfa: {:8.2f} ms   back_prob: {:8.2f} ms   max rel. difference: "
+                      "{:.1e}".format(algorithm if algorithm != 'auto' else 'auto (' + (
+                          'im2col' if layer.engine is None else type(layer.engine).__name__) + ')',
+                          forward_time * 1000, dfa_time * 1000, back_prob_time * 1000, error))
@@ -0,0 +1,88 @@
+import time
+from multiprocessing import freeze_support
+
+import numpy as np
+
+import dataset.cifar10_dataset
+
+from network import activation
+from network.feedback import SpatialBroadcastFeedback, SparseFeedback, LowRankFeedback
+from network.layers.conv_to_fully_connected import ConvToFullyConnected
+from network.layers.convolution_im2col import Convolution
+from network.layers.fully_connected import FullyConnected
+from network.layers.max_pool import MaxPool
+from network.model import Model
+from network.optimizer import GDMomentumOptimizer
+
+
+def layers(feedback):
+    """ architecture of 06e_weight_init_evaluation_conv2.py, feedback creates the feedback structure of a layer """
+    return [
+        MaxPool(size=2, stride=2),
+        Convolution((8, 3, 3, 3), stride=1, padding=1, dropout_rate=0, activation=activation.tanh, feedback=feedback()),
+        MaxPool(size=2, stride=2),
+        Convolution((16, 8, 3, 3), stride=1, padding=1, dropout_rate=0, activation=activation.tanh, feedback=feedback()),
+        MaxPool(size=2, stride=2),
+        Convolution((32, 16, 3, 3), stride=1, padding=1, dropout_rate=0, activation=activation.tanh, feedback=feedback()),
+        MaxPool(size=2, stride=2),
+        ConvToFullyConnected(),
+        FullyConnected(size=64, activation=activation.tanh),
+        FullyConnected(size=10, activation=None, last_layer=True)
+    ]
+
+
+def projection_time(layer, batch_size=64, repeat=10) -> float:
+    E = np.random.randn(batch_size, 10).astype(layer.W.dtype)
+    start = time.time()
+    for _ in range(repeat):
+        if layer.feedback is None:
+            np.dot(E, layer.B)
+        else:
+            layer.feedback.project(E)
+    return (time.time() - start) / repeat
+
+
+if __name__ == '__main__':
+    """
+    Goal: Compare memory, projection time, backward time and accuracy of dense and structured dfa feedback weights
+    for the convolution layers
+    """
+    freeze_support()
+
+    num_passes = 5
+    data = dataset.cifar10_dataset.load()
+
+    structures = [
+        ('Dense', lambda: None),
+        ('SpatialBroadcast', lambda: SpatialBroadcastFeedback()),
+        ('Sparse(density=0.1)', lambda: SparseFeedback(density=0.1)),
+        ('Sparse(density=0.01)', lambda: SparseFeedback(density=0.01)),
+        ('LowRank(rank=1)', lambda: LowRankFeedback(rank=1)),
+        ('LowRank(rank=3)', lambda: LowRankFeedback(rank=3)),
+    ]
+
+    for name, feedback in structures:
+        np.random.seed(0)
+        model = Model(
+            layers=layers(feedback),
+            num_classes=10,
+            optimizer=GDMomentumOptimizer(lr=1e-2, mu=0.9),
+        )
+
+        print("\nRun training ({}):\n------------------------------------".format(name))
+
+        stats = model.train(data_set=data, method='dfa', num_passes=num_passes, batch_size=64, verbose=False)
+        loss, accuracy = model.cost(*data.test_set())
+
+        for i, layer in enumerate(model.layers):
+            if isinstance(layer, Convolution):
+                nbytes = layer.B.nbytes if layer.feedback is None else layer.feedback.nbytes
+                if layer.feedback is not None:
+                    E = np.random.randn(4, 10)
+                    assert np.allclose(layer.feedback.project(E), E.dot(layer.feedback.dense()))
+                print("layer {}: feedback memory {:8.1f} kB, projection time {:.3f} ms, backward time {:.2f} s".format(
+                    i, nbytes / 1024, projection_time(layer) * 1000, stats['layer_backward_time'][i]))
+        print('loss on test set: {}'.format(loss))
+        print('accuracy on test set: {}'.format(accuracy))
+        print("time spend during backward pass: {}".format(stats['backward_time']))
+        print("time spend in total: {}".format(stats['total_time']))
@@ -0,0 +1,33 @@
+import time
+
+import numpy as np
+
+from network.feedback import SeededFeedback
+from network.weight_initializer import RandomUniform
+
+
+if __name__ == '__main__':
+    """
+    Goal: Compare memory and projection time of stored dense feedback weights and seed-regenerated feedback weights
+    for increasingly wide layers (batch size 64, 10 classes)
+    """
+    num_classes = 10
+    batch_size = 64
+    E = np.random.randn(batch_size, num_classes)
+
+    for size in [1000, 10000, 100000, 1000000]:
+        initializer = RandomUniform(low=-1 / np.sqrt(size), high=1 / np.sqrt(size))
+        B = initializer.init((num_classes, size))
+        start = time.time()
+        np.dot(E, B)
+        dense_time = time.time() - start
+
+        feedback = SeededFeedback(initializer)
+        feedback.initialize(num_classes, (size,))
+        start = time.time()
+        feedback.project(E)
+        seeded_time = time.time() - start
+
+        print("size {:8d}:   dense: {:10.1f} kB {:8.2f} ms   seeded: {:3d} B (+{:.1f} kB per block) {:8.2f} ms".format(
+            size, B.nbytes / 1024, dense_time * 1000, feedback.nbytes,
+            num_classes * feedback.block_size * B.itemsize / 1024, seeded_time * 1000))
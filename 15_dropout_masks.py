@@ -0,0 +1,51 @@
+import time
+
+import numpy as np
+
+from network.utils.dropout_mask import DropoutMask
+
+
+def benchmark(function, repeat=5) -> float:
+    """ best time of repeat runs, after one warm-up run """
+    function()
+    best = np.inf
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        best = min(best, time.time() - start)
+    return best
+
+
+def binomial_mask(x, rate):
+    """ the previous float mask: drawn with np.random.binomial and applied by multiplication """
+    mask = np.random.binomial(size=x.shape, n=1, p=1 - rate)
+    x *= mask
+    return mask
+
+
+if __name__ == '__main__':
+    """
+    Goal: Compare generation time, application time and memory of float dropout masks drawn with np.random.binomial
+    and bit-packed dropout masks for the activations of fully connected and convolution layers (batch size 64)
+    """
+    batch_size = 64
+    rate = 0.5
+    shapes = [(500,), (1000,), (8, 32, 32), (16, 16, 16), (32, 8, 8)]
+
+    for shape in shapes:
+        x = np.random.randn(batch_size, *shape)
+
+        mask = binomial_mask(x.copy(), rate)
+        binomial_time = benchmark(lambda: binomial_mask(x.copy(), rate))
+        y = x.copy()
+        binomial_apply_time = benchmark(lambda: np.multiply(y, mask, out=y))
+
+        packed = DropoutMask(x.shape, rate)
+        packed_time = benchmark(lambda: DropoutMask(x.shape, rate))
+        packed_apply_time = benchmark(lambda: packed.apply(y))
+        keep_rate = np.count_nonzero(packed.unpack()) / packed.size
+
+        print("shape {:14s}   binomial: {:8.1f} kB {:7.2f} ms (apply {:6.2f} ms)   packed: {:7.1f} kB {:7.2f} ms "
+              "(apply {:6.2f} ms)   keep rate {:.3f}".format(
+                  str(x.shape[1:]), mask.nbytes / 1024, binomial_time * 1000, binomial_apply_time * 1000,
+                  packed.nbytes / 1024, packed_time * 1000, packed_apply_time * 1000, keep_rate))
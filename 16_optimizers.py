@@ -0,0 +1,67 @@
+from multiprocessing import freeze_support
+
+import matplotlib.pyplot as plt
+import numpy as np
+import scipy.ndimage.filters
+
+import dataset.mnist_dataset
+from network import activation
+from network.layers.conv_to_fully_connected import ConvToFullyConnected
+from network.layers.fully_connected import FullyConnected
+from network.model import Model
+from network.optimizer import GDMomentumOptimizer, NesterovOptimizer, RMSPropOptimizer, AdamOptimizer, \
+    AdamWOptimizer
+
+if __name__ == '__main__':
+    """
+    Goal: Compare the train loss over wall-clock time of the optimizers for dfa training of a fc network on MNIST
+    """
+    freeze_support()
+
+    num_passes = 5
+    data = dataset.mnist_dataset.load('dataset/mnist')
+
+    optimizers = [
+        ('Momentum', GDMomentumOptimizer(lr=1e-2, mu=0.9)),
+        ('Nesterov', NesterovOptimizer(lr=1e-2, mu=0.9)),
+        ('RMSProp', RMSPropOptimizer(lr=1e-4)),
+        ('Adam', AdamOptimizer(lr=1e-4)),
+        ('AdamW', AdamWOptimizer(lr=1e-4, weight_decay=1e-2)),
+    ]
+    statistics = []
+
+    for name, optimizer in optimizers:
+        np.random.seed(0)
+        model = Model(
+            layers=[
+                ConvToFullyConnected(),
+                FullyConnected(size=800, activation=activation.tanh),
+                FullyConnected(size=800, activation=activation.tanh),
+                FullyConnected(size=10, activation=None, last_layer=True)
+            ],
+            num_classes=10,
+            optimizer=optimizer
+        )
+
+        print("\nRun training ({}):\n------------------------------------".format(name))
+
+        stats = model.train(data_set=data, method='dfa', num_passes=num_passes, batch_size=64, verbose=False)
+        loss, accuracy = model.cost(*data.test_set())
+
+        print('loss on test set: {}'.format(loss))
+        print('accuracy on test set: {}'.format(accuracy))
+        print("time spend during update pass: {}".format(stats['update_time']))
+        print("time spend in total: {}".format(stats['total_time']))
+
+        statistics.append(stats)
+
+    plt.title('Loss function')
+    plt.xlabel('time [s]')
+    plt.ylabel('loss')
+    for stats in statistics:
+        # the steps are assumed to take equally long
+        time = np.linspace(0, stats['total_time'], len(stats['train_loss']))
+        plt.plot(time, scipy.ndimage.filters.gaussian_filter1d(stats['train_loss'], sigma=10), linestyle='-')
+    plt.legend(['{}, train loss dfa'.format(name) for name, _ in optimizers], loc='upper right')
+    plt.grid(True)
+    plt.show()
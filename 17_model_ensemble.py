@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+
+import dataset.mnist_dataset
+from network import activation, weight_initializer
+from network.ensemble import ModelEnsemble
+from network.layers.conv_to_fully_connected import ConvToFullyConnected
+from network.layers.fully_connected import FullyConnected
+from network.model import Model
+from network.optimizer import GDMomentumOptimizer
+
+
+def build(initializer) -> Model:
+    return Model(
+        layers=[
+            ConvToFullyConnected(),
+            FullyConnected(size=100, activation=activation.tanh, fb_weight_initializer=initializer),
+            FullyConnected(size=100, activation=activation.tanh, fb_weight_initializer=initializer),
+            FullyConnected(size=10, activation=None, last_layer=True)
+        ],
+        num_classes=10,
+        optimizer=GDMomentumOptimizer(lr=1e-3, mu=0.9)
+    )
+
+
+if __name__ == '__main__':
+    """
+    Goal: Compare the training time of a sweep over feedback weight initializers (small fc networks, dfa, MNIST) run
+    serially and as one ModelEnsemble
+    """
+    num_passes = 2
+    data = dataset.mnist_dataset.load('dataset/mnist')
+
+    initializers = [
+        weight_initializer.RandomUniform(-1, 1),
+        weight_initializer.RandomUniform(-1 / np.sqrt(100), 1 / np.sqrt(100)),
+        weight_initializer.RandomNormal(),
+        weight_initializer.RandomNormal(1 / np.sqrt(100)),
+    ] * 2
+
+    start = time.time()
+    serial = []
+    for initializer in initializers:
+        model = build(initializer)
+        model.train(data_set=data, method='dfa', num_passes=num_passes, batch_size=64, verbose=False)
+        serial.append(model.cost(*data.test_set())[1])
+    serial_time = time.time() - start
+
+    start = time.time()
+    models = [build(initializer) for initializer in initializers]
+    ensemble = ModelEnsemble(models)
+    ensemble.train(data_set=data, method='dfa', num_passes=num_passes, batch_size=64, verbose=False)
+    stacked = [accuracy for _, accuracy in ensemble.cost(*data.test_set())]
+    ensemble_time = time.time() - start
+
+    for initializer, serial_accuracy, stacked_accuracy in zip(initializers, serial, stacked):
+        print("{:50s} test accuracy serial: {:.4f}, ensemble: {:.4f}".format(
+            str(initializer), serial_accuracy, stacked_accuracy))
+    print("{} models: serial {:.1f} s, ensemble {:.1f} s".format(len(initializers), serial_time, ensemble_time))
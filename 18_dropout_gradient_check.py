@@ -0,0 +1,40 @@
+import numpy as np
+
+from network import activation
+from network.layers import convolution
+from network.layers.conv_to_fully_connected import ConvToFullyConnected
+from network.layers.convolution_im2col import Convolution
+from network.layers.fully_connected import FullyConnected
+from network.model import Model
+
+
+def check(name: str, layers: list, input_size: tuple) -> None:
+    np.random.seed(0)
+    model = Model(layers=layers, num_classes=3)
+    model.initialize(input_size, 'bp')
+    X = np.random.randn(8, *input_size)
+    y = np.random.randint(0, 3, 8)
+    print("\n{}:".format(name))
+    differences = model.gradient_check(X, y)
+    print("max relative difference: {:.2e}".format(max(differences)))
+
+
+if __name__ == '__main__':
+    """
+    Goal: Check the bp weight gradients of fully connected and convolution layers with dropout against central
+    differences, for the activation functions which take their derivative at the activations
+    """
+    for name, function in [('tanh', activation.tanh), ('sigmoid', activation.sigmoid), ('relu', activation.relu)]:
+        check('fully connected, {}, dropout 0.5'.format(name), [
+            ConvToFullyConnected(),
+            FullyConnected(size=6, activation=function, dropout_rate=0.5),
+            FullyConnected(size=5, activation=function, dropout_rate=0.5),
+            FullyConnected(size=3, activation=None, last_layer=True)
+        ], (1, 2, 2))
+
+    for name, layer in [('convolution', Convolution), ('naive convolution', convolution.Convolution)]:
+        check('{}, tanh, dropout 0.5'.format(name), [
+            layer((2, 1, 3, 3), stride=1, padding=1, dropout_rate=0.5, activation=activation.tanh),
+            ConvToFullyConnected(),
+            FullyConnected(size=3, activation=None, last_layer=True)
+        ], (1, 4, 4))
@@ -0,0 +1,93 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+"""
+On-disk cache of decoded data sets. Every array is stored as .npy file, so that it can be memory-mapped on load, next
+to a fingerprint (size and modification time) of the source files the cache was built from. If the source files
+change, the cache is discarded and rebuilt.
+"""
+
+META_FILE = 'meta.pkl'
+
+
+def fingerprint(files: list) -> list:
+    return [(os.path.basename(f), os.path.getsize(f), os.path.getmtime(f)) for f in files]
+
+
+def load(cache_dir: str, files: list) -> dict:
+    """ returns the cached arrays (memory-mapped, read-only) or None if the cache is missing or outdated """
+    meta_file = os.path.join(cache_dir, META_FILE)
+    try:
+        with open(meta_file, 'rb') as file:
+            meta = pickle.load(file)
+        if meta['fingerprint'] != fingerprint(files):
+            return None
+        return {key: np.load(os.path.join(cache_dir, key + '.npy'), mmap_mode='r') for key in meta['arrays']}
+    except FileNotFoundError:
+        # no cache, or it is just being replaced by another process
+        return None
+
+
+def store(cache_dir: str, files: list, arrays: dict) -> None:
+    """ writes the cache into a temporary directory which is then renamed to cache_dir. An outdated cache is renamed
+    out of the way first and removed afterwards, so readers either find a complete cache or none. If another process
+    has stored the cache in the meantime, its cache is kept """
+    tmp_dir = '{}.tmp{}'.format(cache_dir, os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for key, array in arrays.items():
+        np.save(os.path.join(tmp_dir, key + '.npy'), array)
+    with open(os.path.join(tmp_dir, META_FILE), 'wb') as file:
+        pickle.dump({'fingerprint': fingerprint(files), 'arrays': list(arrays.keys())}, file)
+
+    old_dir = '{}.old{}'.format(cache_dir, os.getpid())
+    try:
+        os.rename(cache_dir, old_dir)
+    except FileNotFoundError:
+        # no cache yet, or another process has moved it away
+        old_dir = None
+    try:
+        # fails if another process has stored its cache since the rename above
+        os.rename(tmp_dir, cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+        shutil.rmtree(tmp_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir)
+
+
+def statistics(cache_dir: str, images: np.ndarray, key: str, chunk_size: int=5000) -> tuple:
+    """ per-pixel mean and std of uint8 images, cached under the given key. The statistics are accumulated in
+    chunks, so no float copy of all images is needed """
+    file_name = os.path.join(cache_dir, 'statistics_{}.npz'.format(key)) if cache_dir is not None else None
+    if file_name is not None and os.path.exists(file_name):
+        with np.load(file_name) as stats:
+            return stats['mean'], stats['std']
+
+    n = images.shape[0]
+    total = np.zeros(images.shape[1:])
+    total_squared = np.zeros(images.shape[1:])
+    for start in range(0, n, chunk_size):
+        chunk = images[start:start + chunk_size].astype(np.float64)
+        total += chunk.sum(axis=0)
+        total_squared += np.square(chunk).sum(axis=0)
+    mean = total / n
+    std = np.sqrt(np.maximum(total_squared / n - np.square(mean), 0))
+
+    if file_name is not None:
+        # written under a temporary name, a concurrent reader never sees a partial file
+        tmp_name = '{}.tmp{}'.format(file_name, os.getpid())
+        try:
+            with open(tmp_name, 'wb') as file:
+                np.savez(file, mean=mean, std=std)
+            os.replace(tmp_name, file_name)
+        except OSError:
+            # the cache directory has been replaced in the meantime, the statistics are computed again next time
+            pass
+    return mean, std
+
@@ -1,7 +1,8 @@
 import os
 import numpy as np
 
-from dataset.dataset import DataSet
+import dataset.cache
+from dataset.dataset import DataSet, NormalizedImages, normalize
 
 train_files = 5
 test_files = 1
@@ -20,9 +21,9 @@ def unpickle(file_path: str) -> dict:
     return data
 
 
-def load_data(full_path):
+def load_data(full_path, dtype=np.float64):
     raw_data = unpickle(full_path)
-    float_data = np.array(raw_data[b'data'], dtype=float) / 255.0
+    float_data = np.array(raw_data[b'data'], dtype=dtype) / 255.0
     images = float_data.reshape([-1, channels, image_height, image_width])
     labels = np.array(raw_data[b'labels'])
     return images, labels
@@ -34,44 +35,60 @@ def load_test_set(self) -> (np.ndarray, np.ndarray):
     return images, labels
 
 
-def load(path: str='dataset/cifar10/cifar-10-batches-py', valid_size: int=5000, mean_subtraction=True, normalization=True):
-
-    images_train_valid = np.zeros(shape=(train_size, channels, image_height, image_width), dtype=float)
-    labels_train_valid = np.zeros(shape=train_size, dtype=int)
-
-    start = 0
-    for i in range(train_files):
-        images_batch, labels_batch = load_data(os.path.join(path, "data_batch_{}".format(i + 1)))
-        size = images_batch.shape[0]
-        images_train_valid[start:start + size] = images_batch
-        labels_train_valid[start:start + size] = labels_batch
-        start = start + size
-
-    images_valid = images_train_valid[:valid_size]
-    labels_valid = labels_train_valid[:valid_size]
-
-    images_train = images_train_valid[valid_size:]
-    labels_train = labels_train_valid[valid_size:]
-
-    images_test, labels_test = load_data(os.path.join(path, "test_batch"))
+def load_raw_data(full_path):
+    raw_data = unpickle(full_path)
+    images = np.asarray(raw_data[b'data'], dtype=np.uint8).reshape([-1, channels, image_height, image_width])
+    labels = np.array(raw_data[b'labels'], dtype=int)
+    return images, labels
 
-    # mean subtraction
-    if mean_subtraction:
-        train_mean = np.mean(images_train, axis=0)
-        images_train -= train_mean
-        images_valid -= train_mean
-        images_test -= train_mean
 
-    # normalization
-    if normalization:
-        train_std = np.std(images_train, axis=0)
+def load_raw(path: str='dataset/cifar10/cifar-10-batches-py', cache: bool=True) -> dict:
+    """ uint8 images and labels of the train and test files, read from the cache in path/.cache if it is up to date """
+    files = [os.path.join(path, "data_batch_{}".format(i + 1)) for i in range(train_files)]
+    files += [os.path.join(path, "test_batch")]
+    cache_dir = os.path.join(path, '.cache')
+
+    arrays = dataset.cache.load(cache_dir, files) if cache else None
+    if arrays is None:
+        images_train, labels_train = zip(*[load_raw_data(f) for f in files[:train_files]])
+        images_test, labels_test = load_raw_data(files[train_files])
+        arrays = {
+            'images_train': np.concatenate(images_train),
+            'labels_train': np.concatenate(labels_train),
+            'images_test': images_test,
+            'labels_test': labels_test,
+        }
+        if cache:
+            dataset.cache.store(cache_dir, files, arrays)
+    return arrays
+
+
+def load(path: str='dataset/cifar10/cifar-10-batches-py', valid_size: int=5000, mean_subtraction=True, normalization=True,
+         dtype=np.float64, cache: bool=True, lazy: bool=True):
+    """ with lazy=True the images are kept as uint8 and only normalized batch-wise when they are accessed """
+    arrays = load_raw(path, cache)
+
+    images_valid = arrays['images_train'][:valid_size]
+    labels_valid = np.array(arrays['labels_train'][:valid_size])
+
+    images_train = arrays['images_train'][valid_size:]
+    labels_train = np.array(arrays['labels_train'][valid_size:])
+
+    images_test = arrays['images_test']
+    labels_test = np.array(arrays['labels_test'])
+
+    # mean subtraction and normalization with the statistics of the train set
+    train_mean, train_std = dataset.cache.statistics(
+        os.path.join(path, '.cache') if cache else None, images_train, 'train_{}'.format(valid_size))
+    # the images are scaled to [0, 1]
+    train_mean = train_mean / 255.0 if mean_subtraction else None
+    train_std = train_std / 255.0 if normalization else None
+    if train_std is not None:
         train_std += (train_std == 0).astype(int)
-        images_train /= train_std
-        images_valid /= train_std
-        images_test /= train_std
 
+    convert = NormalizedImages if lazy else normalize
     return DataSet(
-        train=(images_train, labels_train),
-        validation=(images_valid, labels_valid),
-        test=(images_test, labels_test)
+        train=(convert(images_train, train_mean, train_std, dtype, scale=255.0), labels_train),
+        validation=(convert(images_valid, train_mean, train_std, dtype, scale=255.0), labels_valid),
+        test=(convert(images_test, train_mean, train_std, dtype, scale=255.0), labels_test)
     )
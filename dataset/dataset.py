@@ -1,3 +1,4 @@
+import numpy as np
 
 
 class DataSet(object):
@@ -18,3 +19,56 @@ class DataSet(object):
 
     def test_set(self):
         return self.test
+
+
+def normalize(images: np.ndarray, mean: np.ndarray, std: np.ndarray, dtype: type, scale: float=1.0) -> np.ndarray:
+    """ converts uint8 images to dtype, divides them by scale and normalizes them with the given statistics (either
+    of which may be None, both in units of the scaled images) """
+    result = images.astype(dtype)
+    if scale != 1.0:
+        result /= scale
+    if mean is not None:
+        result -= mean
+    if std is not None:
+        result /= std
+    return result
+
+
+class NormalizedImages(object):
+    """
+    Keeps the raw uint8 images and normalizes only the part that is accessed: X[indices] returns
+    normalize(images[indices], ...) as array of dtype. A data set of NormalizedImages needs a fraction of the memory
+    of its normalized float version and can be used in place of it by Model.train, Model.cost and the batch
+    iterators.
+    """
+    def __init__(self, images: np.ndarray, mean: np.ndarray, std: np.ndarray, dtype: type=np.float64,
+                 scale: float=1.0) -> None:
+        self.images = images
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.mean = mean
+        self.std = std
+
+    @property
+    def shape(self) -> tuple:
+        return self.images.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.images.ndim
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, index) -> np.ndarray:
+        return normalize(self.images[index], self.mean, self.std, self.dtype, self.scale)
+
+    def astype(self, dtype: type, copy: bool=True) -> 'NormalizedImages':
+        """ no data is copied, only the dtype of the normalized parts changes """
+        if np.dtype(dtype) == self.dtype and not copy:
+            return self
+        return NormalizedImages(self.images, self.mean, self.std, dtype, self.scale)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        result = self[:]
+        return result if dtype is None else result.astype(dtype)
@@ -3,7 +3,8 @@ import struct
 import numpy as np
 from array import array
 
-from dataset.dataset import DataSet
+import dataset.cache
+from dataset.dataset import DataSet, NormalizedImages, normalize
 
 train_images_filename = 'train-images-idx3-ubyte'
 train_labels_filename = 'train-labels-idx1-ubyte'
@@ -12,17 +13,16 @@ test_images_filename = 't10k-images-idx3-ubyte'
 test_labels_filename = 't10k-labels-idx1-ubyte'
 
 
-def load_images(full_path):
+def load_raw_images(full_path):
     with open(full_path, 'rb') as file:
         magic, size, rows, cols = struct.unpack(">IIII", file.read(16))
         if magic != 2051:
             raise ValueError('Invalid magic number in MNIST image file: expected {} got {}'.format(2051, magic))
-        raw_data = array("B", file.read())
-        images = np.zeros((size, 1, rows * cols))
-        image_size = rows * cols
-        for i in range(size):
-            images[i, 0, :] = raw_data[i * image_size:(i + 1) * image_size]
-        return images.reshape(size, 1, rows, cols)
+        return np.frombuffer(file.read(), dtype=np.uint8).reshape(size, 1, rows, cols)
+
+
+def load_images(full_path, dtype=np.float64):
+    return load_raw_images(full_path).astype(dtype)
 
 
 def load_labels(full_path):
@@ -34,36 +34,50 @@ def load_labels(full_path):
         return np.asarray(labels)
 
 
-def load(path: str='dataset/mnist', valid_size: int=5000, mean_subtraction=True, normalization=True):
-    images_train_valid = load_images(os.path.join(path, train_images_filename))
-    labels_train_valid = load_labels(os.path.join(path, train_labels_filename))
+def load_raw(path: str='dataset/mnist', cache: bool=True) -> dict:
+    """ uint8 images and labels of the train and test files, read from the cache in path/.cache if it is up to date """
+    files = [os.path.join(path, f) for f in
+             (train_images_filename, train_labels_filename, test_images_filename, test_labels_filename)]
+    cache_dir = os.path.join(path, '.cache')
+
+    arrays = dataset.cache.load(cache_dir, files) if cache else None
+    if arrays is None:
+        arrays = {
+            'images_train': load_raw_images(files[0]),
+            'labels_train': load_labels(files[1]),
+            'images_test': load_raw_images(files[2]),
+            'labels_test': load_labels(files[3]),
+        }
+        if cache:
+            dataset.cache.store(cache_dir, files, arrays)
+    return arrays
+
 
-    images_valid = images_train_valid[:valid_size]
-    labels_valid = labels_train_valid[:valid_size]
+def load(path: str='dataset/mnist', valid_size: int=5000, mean_subtraction=True, normalization=True, dtype=np.float64,
+         cache: bool=True, lazy: bool=True):
+    """ with lazy=True the images are kept as uint8 and only normalized batch-wise when they are accessed """
+    arrays = load_raw(path, cache)
 
-    images_train = images_train_valid[valid_size:]
-    labels_train = labels_train_valid[valid_size:]
+    images_valid = arrays['images_train'][:valid_size]
+    labels_valid = np.array(arrays['labels_train'][:valid_size])
 
-    images_test = load_images(os.path.join(path, test_images_filename))
-    labels_test = load_labels(os.path.join(path, test_labels_filename))
+    images_train = arrays['images_train'][valid_size:]
+    labels_train = np.array(arrays['labels_train'][valid_size:])
 
-    # mean subtraction
-    if mean_subtraction:
-        train_mean = np.mean(images_train, axis=0)
-        images_train -= train_mean
-        images_valid -= train_mean
-        images_test -= train_mean
+    images_test = arrays['images_test']
+    labels_test = np.array(arrays['labels_test'])
 
-    # normalization
-    if normalization:
-        train_std = np.std(images_train, axis=0)
+    # mean subtraction and normalization with the statistics of the train set
+    train_mean, train_std = dataset.cache.statistics(
+        os.path.join(path, '.cache') if cache else None, images_train, 'train_{}'.format(valid_size))
+    train_mean = train_mean if mean_subtraction else None
+    train_std = train_std if normalization else None
+    if train_std is not None:
         train_std += (train_std == 0).astype(int)
-        images_train /= train_std
-        images_valid /= train_std
-        images_test /= train_std
 
+    convert = NormalizedImages if lazy else normalize
     return DataSet(
-        train=(images_train, labels_train),
-        validation=(images_valid, labels_valid),
-        test=(images_test, labels_test)
+        train=(convert(images_train, train_mean, train_std, dtype), labels_train),
+        validation=(convert(images_valid, train_mean, train_std, dtype), labels_valid),
+        test=(convert(images_test, train_mean, train_std, dtype), labels_test)
     )
@@ -1,5 +1,96 @@
+import numba as nb
 import numpy as np
-from numba import jitclass
+
+"""
+Besides forward and gradient, which allocate their results, the activations provide fused in-place operations for
+the layers:
+
+    forward_inplace(z)       z = f(z)
+    backprop_into(E, a_out)  E *= f'(a_out), with the derivative expressed by the activations a_out = f(z)
+
+The element-wise activations run them as numba kernels over the rows of a 2d view of the arrays, so they work on
+contiguous arrays as well as on the transposed output of the im2col convolution. Arrays without such a view fall
+back to numpy.
+"""
+
+
+def _rows(x: np.ndarray) -> np.ndarray:
+    """ 2d view (x.shape[0], -1) of x, None if it requires a copy """
+    rows = x.view()
+    try:
+        rows.shape = (x.shape[0], -1) if x.ndim > 0 else (1, 1)
+    except (AttributeError, ValueError):
+        return None
+    return rows
+
+
+def _fused(kernel, *arrays) -> bool:
+    """ runs kernel on the 2d views of arrays, False if one of them has none """
+    rows = [_rows(x) for x in arrays]
+    if any(x is None for x in rows) or rows[0].size == 0:
+        return False
+    kernel(*rows)
+    return True
+
+
+@nb.njit(parallel=True, cache=True)
+def _tanh_forward(x):
+    for i in nb.prange(x.shape[0]):
+        for j in range(x.shape[1]):
+            x[i, j] = np.tanh(x[i, j])
+
+
+@nb.njit(parallel=True, cache=True)
+def _tanh_backprop(E, a):
+    for i in nb.prange(E.shape[0]):
+        for j in range(E.shape[1]):
+            E[i, j] *= 1 - a[i, j] * a[i, j]
+
+
+@nb.njit(parallel=True, cache=True)
+def _sigmoid_forward(x):
+    for i in nb.prange(x.shape[0]):
+        for j in range(x.shape[1]):
+            x[i, j] = 1 / (1 + np.exp(-x[i, j]))
+
+
+@nb.njit(parallel=True, cache=True)
+def _sigmoid_backprop(E, a):
+    for i in nb.prange(E.shape[0]):
+        for j in range(E.shape[1]):
+            E[i, j] *= a[i, j] * (1 - a[i, j])
+
+
+@nb.njit(parallel=True, cache=True)
+def _relu_forward(x):
+    for i in nb.prange(x.shape[0]):
+        for j in range(x.shape[1]):
+            if x[i, j] < 0:
+                x[i, j] = 0
+
+
+@nb.njit(parallel=True, cache=True)
+def _relu_backprop(E, a):
+    for i in nb.prange(E.shape[0]):
+        for j in range(E.shape[1]):
+            if a[i, j] <= 0:
+                E[i, j] = 0
+
+
+@nb.njit(parallel=True, cache=True)
+def _leaky_relu_forward(x):
+    for i in nb.prange(x.shape[0]):
+        for j in range(x.shape[1]):
+            if x[i, j] < 0:
+                x[i, j] *= 0.01
+
+
+@nb.njit(parallel=True, cache=True)
+def _leaky_relu_backprop(E, a):
+    for i in nb.prange(E.shape[0]):
+        for j in range(E.shape[1]):
+            if a[i, j] <= 0:
+                E[i, j] *= 0.01
 
 
 class Activation(object):
@@ -9,12 +100,18 @@ class Activation(object):
     def gradient(self, x: np.ndarray) -> np.ndarray:
         pass
 
+    def forward_inplace(self, z: np.ndarray) -> np.ndarray:
+        """ applies the activation to z in place and returns z """
+        z[...] = self.forward(z)
+        return z
 
-@jitclass([])
-class __TanH(Activation):
+    def backprop_into(self, E: np.ndarray, a_out: np.ndarray) -> np.ndarray:
+        """ multiplies the derivative at the activations a_out into E in place and returns E """
+        E *= self.gradient(a_out)
+        return E
 
-    def __init__(self) -> None:
-        pass
+
+class __TanH(Activation):
 
     def forward(self, x: np.ndarray) -> np.ndarray:
         return np.tanh(x)
@@ -23,12 +120,18 @@ class __TanH(Activation):
         # noinspection PyTypeChecker
         return 1 - np.power(x, 2)
 
+    def forward_inplace(self, z: np.ndarray) -> np.ndarray:
+        if not _fused(_tanh_forward, z):
+            np.tanh(z, out=z)
+        return z
 
-@jitclass([])
-class __Softmax(Activation):
+    def backprop_into(self, E: np.ndarray, a_out: np.ndarray) -> np.ndarray:
+        if not _fused(_tanh_backprop, E, a_out):
+            super().backprop_into(E, a_out)
+        return E
 
-    def __init__(self) -> None:
-        pass
+
+class __Softmax(Activation):
 
     def forward(self, x: np.ndarray) -> np.ndarray:
         exp = np.exp(x)
@@ -39,24 +142,32 @@ class __Softmax(Activation):
         raise Exception("Not yet implemented!")
 
 
-@jitclass([])
 class __Sigmoid(Activation):
 
-    def __init__(self) -> None:
-        pass
-
     def forward(self, x: np.ndarray) -> np.ndarray:
-        return 1.0 / (1.0 + np.exp(-x))
+        # written without float literals, which would promote float32 input to float64
+        out = np.exp(-x)
+        out += 1
+        return np.reciprocal(out)
 
     def gradient(self, x: np.ndarray) -> np.ndarray:
         return x * (1 - x)
 
+    def forward_inplace(self, z: np.ndarray) -> np.ndarray:
+        if not _fused(_sigmoid_forward, z):
+            np.negative(z, out=z)
+            np.exp(z, out=z)
+            z += 1
+            np.reciprocal(z, out=z)
+        return z
 
-@jitclass([])
-class __ReLU(Activation):
+    def backprop_into(self, E: np.ndarray, a_out: np.ndarray) -> np.ndarray:
+        if not _fused(_sigmoid_backprop, E, a_out):
+            super().backprop_into(E, a_out)
+        return E
 
-    def __init__(self) -> None:
-        pass
+
+class __ReLU(Activation):
 
     def forward(self, x: np.ndarray) -> np.ndarray:
         return np.maximum(x, 0, x)
@@ -64,18 +175,37 @@ class __ReLU(Activation):
     def gradient(self, x: np.ndarray) -> np.ndarray:
         return x > 0
 
+    def forward_inplace(self, z: np.ndarray) -> np.ndarray:
+        if not _fused(_relu_forward, z):
+            np.maximum(z, 0, out=z)
+        return z
 
-@jitclass([])
-class __LeakyReLU(Activation):
+    def backprop_into(self, E: np.ndarray, a_out: np.ndarray) -> np.ndarray:
+        if not _fused(_relu_backprop, E, a_out):
+            super().backprop_into(E, a_out)
+        return E
 
-    def __init__(self) -> None:
-        pass
+
+class __LeakyReLU(Activation):
 
     def forward(self, x: np.ndarray) -> np.ndarray:
         return np.maximum(x, 0.01 * x, x)
 
     def gradient(self, x: np.ndarray) -> np.ndarray:
-        return 0.01 + 0.99 * (x > 0)
+        out = (x > 0).astype(x.dtype)
+        out *= 0.99
+        out += 0.01
+        return out
+
+    def forward_inplace(self, z: np.ndarray) -> np.ndarray:
+        if not _fused(_leaky_relu_forward, z):
+            np.maximum(z, 0.01 * z, out=z)
+        return z
+
+    def backprop_into(self, E: np.ndarray, a_out: np.ndarray) -> np.ndarray:
+        if not _fused(_leaky_relu_backprop, E, a_out):
+            super().backprop_into(E, a_out)
+        return E
 
 
 tanh = __TanH()
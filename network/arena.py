@@ -0,0 +1,102 @@
+import numpy as np
+
+from network.layer import Layer
+
+"""
+Contiguous storage for the parameters of all layers with weights. W and b of every layer are replaced by views into
+one flat buffer, which holds all weights first and then all biases. The gradients are collected in a second flat
+buffer and optimizer state (e.g. the momentum) in further buffers of the same layout, so that an optimizer can update
+the whole model and L2 regularization can be applied to all weights in a few vectorized numpy calls.
+
+The layers get views of their part of the gradient buffer (layer.grad_W, layer.grad_b) and write their gradients
+into them directly where they can, otherwise the gradients are copied over.
+
+The optimizer state is exposed to the layers as (W, b) views in layer.params as well, so per-layer updates and
+checkpoints see the same values. Layer parameters which are replaced afterwards (e.g. by Model.load) are not part of
+the arena anymore, it has to be created again.
+"""
+
+
+def squared_sum(x: np.ndarray, dtype: type=np.float64, chunk_size: int=65536) -> float:
+    """ sum of the squares of the flat array x accumulated in dtype. If x has another dtype, it is converted in chunks
+    of chunk_size elements, so no temporary of the size of x is needed """
+    if x.dtype == dtype:
+        return np.dot(x, x)
+    buffer = np.empty(min(chunk_size, x.size), dtype=dtype)
+    total = np.dtype(dtype).type(0)
+    for start in range(0, x.size, chunk_size):
+        chunk = buffer[:min(chunk_size, x.size - start)]
+        chunk[...] = x[start:start + chunk_size]
+        total += np.dot(chunk, chunk)
+    return total
+
+
+class ParameterArena(object):
+    def __init__(self, layers: list, dtype: type=np.float64) -> None:
+        self.layers = [layer for layer in layers if layer.has_weights()]
+        self.num_weights = sum(layer.W.size for layer in self.layers)
+        size = self.num_weights + sum(layer.b.size for layer in self.layers)
+
+        self.params = np.empty(size, dtype=dtype)
+        self.grads = np.zeros(size, dtype=dtype)
+        self.states = {}
+
+        # per layer: slices of W and b in the flat buffers
+        self.slices = {}
+        w_start, b_start = 0, self.num_weights
+        for layer in self.layers:
+            w, b = slice(w_start, w_start + layer.W.size), slice(b_start, b_start + layer.b.size)
+            self.slices[id(layer)] = w, b
+            self.params[w] = layer.W.reshape(-1)
+            self.params[b] = layer.b.reshape(-1)
+            layer.W = self.params[w].reshape(layer.W.shape)
+            layer.b = self.params[b].reshape(layer.b.shape)
+            layer.grad_W, layer.grad_b = self.views(layer, self.grads)
+            w_start, b_start = w.stop, b.stop
+
+    @property
+    def weights(self) -> np.ndarray:
+        """ the weights of all layers, without the biases """
+        return self.params[:self.num_weights]
+
+    def views(self, layer: Layer, flat: np.ndarray) -> tuple:
+        """ the (W, b) parts of layer in one of the flat buffers """
+        w, b = self.slices[id(layer)]
+        return flat[w].reshape(layer.W.shape), flat[b].reshape(layer.b.shape)
+
+    def set_gradients(self, gradients: list) -> None:
+        """ copies the (layer, dW, db) gradients of the layers with weights into grads, gradients which the layers
+        have already written into their views of grads (layer.grad_W, layer.grad_b) are not copied """
+        for layer, dW, db in gradients:
+            if id(layer) in self.slices:
+                grad_W, grad_b = self.views(layer, self.grads)
+                if dW.base is not self.grads:
+                    grad_W[...] = dW
+                if db.base is not self.grads:
+                    grad_b[...] = db
+
+    def gradients(self) -> list:
+        """ (layer, dW, db) for all layers, dW and db are views of grads """
+        return [(layer,) + self.views(layer, self.grads) for layer in self.layers]
+
+    def state(self, key: str) -> np.ndarray:
+        """ flat buffer of the optimizer state key, zero initialized or taken over from the (W, b) tuples in the
+        params of the layers. The params of the layers are replaced by views of the buffer """
+        if key not in self.states:
+            state = np.zeros_like(self.params)
+            for layer in self.layers:
+                state_W, state_b = self.views(layer, state)
+                value = layer.get_param(key)
+                if value is not None:
+                    state_W[...], state_b[...] = value
+                layer.set_param(key, (state_W, state_b))
+            self.states[key] = state
+        return self.states[key]
+
+    def regularize(self, regularization: float) -> None:
+        """ adds the gradient of the L2 regularization term to the weight gradients """
+        self.grads[:self.num_weights] += regularization * self.weights
+
+    def squared_weights(self, dtype: type=np.float64) -> float:
+        """ sum of the squares of all weights (L2 regularization term) """
+        return squared_sum(self.weights, dtype)
@@ -0,0 +1,249 @@
+import time
+
+import numpy as np
+
+from dataset.dataset import DataSet
+from network.layer import Layer
+from network.layers.conv_to_fully_connected import ConvToFullyConnected
+from network.layers.fully_connected import FullyConnected
+from network.utils import data
+
+"""
+Trains M models with the same fully connected architecture at once, e.g. the configurations of a sweep over weight or
+feedback weight initializers. The weights of layer k of all models are stacked into tensors of shape (M, in, out),
+(M, out) and (M, num_classes, out), so that the forward pass, the dfa projections, the bp gradients and the updates
+run as one batched matrix multiplication (np.matmul) over all models on the same mini-batch.
+
+The layers of the models are initialized as usual, so each model draws its own (feedback) weights, and afterwards
+refer to their slice of the stacked tensors. Trained models can be evaluated, compiled and stored on their own.
+"""
+
+
+class StackedLayer(Layer):
+    """ the fully connected layers at the same position of all models, with weights (M, in, out) """
+    def __init__(self, layers: list) -> None:
+        super().__init__()
+        first = layers[0]
+        self.activation = first.activation
+        self.last_layer = first.last_layer
+
+        self.W = np.stack([layer.W for layer in layers])
+        self.b = np.stack([layer.b for layer in layers])
+        self.B = None if first.last_layer else np.stack([layer.B for layer in layers])
+        for m, layer in enumerate(layers):
+            layer.W = self.W[m]
+            layer.b = self.b[m]
+            if self.B is not None:
+                layer.B = self.B[m]
+
+    def forward(self, X: np.ndarray, mode='predict') -> np.ndarray:
+        """ X: the input of all models (M, n, in) or the input (n, in) shared by all of them """
+        self.a_in = X
+        z = np.matmul(X, self.W)
+        z += self.b[:, np.newaxis, :]
+        self.a_out = z if self.activation is None else self.activation.forward_inplace(z)
+        return self.a_out
+
+    def dfa(self, E: np.ndarray) -> tuple:
+        """ E: output errors of all models (M, n, num_classes) """
+        if not self.last_layer:
+            E = np.matmul(E, self.B)
+        return self.__gradients(E)
+
+    def back_prob(self, E: np.ndarray) -> tuple:
+        dW, db = self.__gradients(E)
+        dX = np.matmul(E, self.W.transpose(0, 2, 1))
+        return dX, dW, db
+
+    def __gradients(self, E: np.ndarray) -> tuple:
+        if self.activation is not None:
+            self.activation.backprop_into(E, self.a_out)
+        dW = np.matmul(np.swapaxes(self.a_in, -1, -2), E)
+        db = np.sum(E, axis=1)
+        return dW, db
+
+    def has_weights(self) -> bool:
+        return True
+
+
+class ModelEnsemble(object):
+    """
+    models: untrained models of the same architecture: an optional ConvToFullyConnected followed by FullyConnected
+    layers without dropout, structured and fused feedback. Their optimizers have to be equal, the one of the first
+    model is used for all of them. Loss and regularization are taken per model.
+    """
+    def __init__(self, models: list) -> None:
+        if len(models) == 0:
+            raise ValueError("An ensemble needs at least one model")
+        self.models = models
+        self.layers = []
+        self.statistics = {}
+        self.__check()
+
+    def __check(self) -> None:
+        first = self.models[0]
+        for model in self.models:
+            layers = model.layers[1:] if isinstance(model.layers[0], ConvToFullyConnected) else model.layers
+            if not all(isinstance(layer, FullyConnected) for layer in layers):
+                raise ValueError("Only fully connected models can be trained as ensemble")
+            if model.fused_feedback or any(layer.dropout_rate > 0 or layer.feedback is not None for layer in layers):
+                raise ValueError("Dropout, structured and fused feedback are not supported by the ensemble")
+            if [(type(layer), getattr(layer, 'size', None), getattr(layer, 'activation', None),
+                 getattr(layer, 'last_layer', False)) for layer in model.layers] != \
+                    [(type(layer), getattr(layer, 'size', None), getattr(layer, 'activation', None),
+                      getattr(layer, 'last_layer', False)) for layer in first.layers]:
+                raise ValueError("All models of an ensemble need the same architecture")
+            if type(model.optimizer) is not type(first.optimizer) or vars(model.optimizer) != vars(first.optimizer):
+                raise ValueError("All models of an ensemble need equal optimizers")
+            if (model.num_classes, model.dtype, model.lr_decay, model.lr_decay_interval) != \
+                    (first.num_classes, first.dtype, first.lr_decay, first.lr_decay_interval):
+                raise ValueError("All models of an ensemble need the same number of classes, dtype and lr decay")
+
+    def __initialize(self, input_size: tuple, method: str) -> None:
+        for model in self.models:
+            model.initialize(input_size, method)
+
+        offset = 1 if isinstance(self.models[0].layers[0], ConvToFullyConnected) else 0
+        self.layers = [StackedLayer([model.layers[k] for model in self.models])
+                       for k in range(offset, len(self.models[0].layers))]
+        self.regularization = np.array([model.regularization for model in self.models],
+                                       dtype=self.models[0].dtype)[:, np.newaxis, np.newaxis]
+
+    def __forward(self, X: np.ndarray) -> np.ndarray:
+        out = X.reshape((X.shape[0], -1))
+        for layer in self.layers:
+            out = layer.forward(out)
+        return out
+
+    def __squared_weights(self) -> np.ndarray:
+        """ per model: sum of the squares of all weights """
+        accumulate_dtype = self.models[0].accumulate_dtype
+        return sum(np.sum(np.square(layer.W), axis=(1, 2), dtype=accumulate_dtype) for layer in self.layers)
+
+    def cost(self, X, y, batch_size: int=None) -> list:
+        """ (loss, accuracy) of every model, like Model.cost """
+        n = X.shape[0]
+        batch_size = batch_size or self.models[0].eval_batch_size or n
+        total_loss = np.zeros(len(self.models))
+        correct = np.zeros(len(self.models), dtype=int)
+        for start in range(0, n, batch_size):
+            end = min(start + batch_size, n)
+            out = self.__forward(X[start:end].astype(self.models[0].dtype, copy=False))
+            for m, model in enumerate(self.models):
+                chunk_loss, _, chunk_correct = model.loss.evaluate(out[m], y[start:end], gradient=False)
+                total_loss[m] += chunk_loss * (end - start)
+                correct[m] += chunk_correct
+        loss = total_loss / n + self.__squared_weights() * self.regularization.reshape(-1) / 2. / n
+        return [(loss[m], correct[m] / n) for m in range(len(self.models))]
+
+    def train(self, data_set: DataSet, method: str, num_passes: int=20, batch_size: int=128,
+              verbose: bool=True) -> list:
+        """ trains all models on the same mini-batches, returns the statistics of every model. The loss and accuracy
+        entries are kept per model, the times are those of the whole ensemble (also in self.statistics) """
+        if method not in ('dfa', 'bp'):
+            raise ValueError("Invalid train method '{}'".format(method))
+
+        if verbose:
+            print(
+                '\ntrain method: {} (ensemble of {} models)'.format(method, len(self.models)),
+                '\nnum_passes: {}'.format(num_passes),
+                '\nbatch_size: {}\n'.format(batch_size)
+            )
+
+        start_total_time = time.time()
+
+        X_train, y_train = data_set.train_set()
+        X_valid, y_valid = data_set.validation_set()
+        X_train = X_train.astype(self.models[0].dtype, copy=False)
+
+        self.__initialize(X_train[0].shape, method)
+        optimizer = self.models[0].optimizer
+        first = self.models[0]
+
+        self.statistics = {key: 0 for key in ('forward_time', 'backward_time', 'regularization_time',
+                                               'update_time', 'total_time')}
+        delta = None
+
+        step = 0
+        for epoch in range(num_passes):
+
+            """ decay learning rate if necessary """
+            if first.lr_decay > 0 and epoch > 0 and (epoch % first.lr_decay_interval) == 0:
+                optimizer.decay_learning_rate(first.lr_decay)
+                if verbose:
+                    print("Decreased learning rate by {}".format(first.lr_decay))
+
+            for X_batch, y_batch in data.mini_batches(X_train, y_train, batch_size):
+                n = y_batch.shape[0]
+
+                """ forward pass """
+                start_forward_time = time.time()
+                out = self.__forward(X_batch)
+                self.statistics['forward_time'] += time.time() - start_forward_time
+
+                """ loss, per model """
+                if delta is None or delta.shape != out.shape:
+                    delta = np.empty_like(out)
+                losses = np.empty(len(self.models))
+                accuracies = np.empty(len(self.models))
+                for m, model in enumerate(self.models):
+                    losses[m], _, correct = model.loss.evaluate(out[m], y_batch, out=delta[m])
+                    accuracies[m] = correct / n
+
+                """ backward pass """
+                start_backward_time = time.time()
+                gradients = []
+                if method == 'dfa':
+                    # the last layer modifies the error in place, it is projected for all other layers first
+                    for layer in self.layers:
+                        if not layer.last_layer:
+                            gradients.append((layer,) + layer.dfa(delta))
+                    for layer in self.layers:
+                        if layer.last_layer:
+                            gradients.append((layer,) + layer.dfa(delta))
+                else:
+                    dX = delta
+                    for layer in reversed(self.layers):
+                        dX, dW, db = layer.back_prob(dX)
+                        gradients.append((layer, dW, db))
+                self.statistics['backward_time'] += time.time() - start_backward_time
+
+                """ regularization (L2) """
+                start_regularization_time = time.time()
+                if np.any(self.regularization > 0):
+                    for layer, dW, db in gradients:
+                        dW += self.regularization * layer.W
+                    losses += self.__squared_weights() * self.regularization.reshape(-1) / 2. / n
+                self.statistics['regularization_time'] += time.time() - start_regularization_time
+
+                """ update """
+                start_update_time = time.time()
+                for layer, dW, db in gradients:
+                    optimizer.update(layer, dW, db)
+                self.statistics['update_time'] += time.time() - start_update_time
+
+                """ log statistics """
+                for m, model in enumerate(self.models):
+                    model.statistics['train_loss'].append(losses[m])
+                    model.statistics['train_accuracy'].append(accuracies[m])
+
+                if (step % 10) == 0 and verbose:
+                    print("epoch {}, step {}, mean loss = {:07.5f}, mean accuracy = {}".format(
+                        epoch, step, np.mean(losses), np.mean(accuracies)))
+
+                step += 1
+
+            """ log statistics """
+            for model, (valid_loss, valid_accuracy) in zip(self.models, self.cost(X_valid, y_valid)):
+                model.statistics['valid_step'].append(step)
+                model.statistics['valid_loss'].append(valid_loss)
+                model.statistics['valid_accuracy'].append(valid_accuracy)
+
+            if verbose:
+                print("validation after epoch {}: best accuracy = {}".format(
+                    epoch, max(model.statistics['valid_accuracy'][-1] for model in self.models)))
+
+        self.statistics['total_time'] = time.time() - start_total_time
+        for model in self.models:
+            model.statistics.update(self.statistics)
+        return [model.statistics for model in self.models]
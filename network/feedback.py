@@ -0,0 +1,216 @@
+import numba as nb
+import numpy as np
+
+from network.weight_initializer import WeightInitializer
+
+"""
+Structured feedback weights for dfa. Instead of a dense B of shape (num_classes, size) a feedback structure stores
+a cheaper representation of B and projects the output error through it with a specialized kernel:
+
+    project(E) -> E.dot(B) of shape (n, size)
+
+where size is the number of outputs of the layer (the product of its output shape).
+
+SpatialBroadcast, Sparse and LowRank ignore the initializer of the host layer and are scaled like the default dense
+feedback of a convolution layer (uniform in +-1/sqrt(size)), so the projected errors have about the same magnitude.
+They are meant for convolution layers. SeededFeedback draws its weights with the initializer of the host layer, like
+its dense feedback, and can be used by fully connected layers as well.
+"""
+
+
+class Feedback(object):
+    def initialize(self, num_classes: int, output_shape: tuple, dtype: type=np.float64,
+                   initializer: WeightInitializer=None) -> None:
+        """ initializer: distribution of the dense feedback weights of the host layer """
+        raise NotImplementedError()
+
+    def project(self, E: np.ndarray) -> np.ndarray:
+        raise NotImplementedError()
+
+    def dense(self) -> np.ndarray:
+        """ the equivalent dense feedback matrix (num_classes, size), for inspection only """
+        raise NotImplementedError()
+
+    def arrays(self) -> dict:
+        """ the arrays the feedback consists of, by attribute name (used for checkpoints) """
+        raise NotImplementedError()
+
+    def set_arrays(self, arrays: dict) -> None:
+        for name, value in arrays.items():
+            setattr(self, name, value)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays().values())
+
+    def __str__(self):
+        raise NotImplementedError()
+
+
+class SpatialBroadcastFeedback(Feedback):
+    """
+    B[k, c, y, x] = B_channel[k, c] + B_spatial[k, y, x] for a convolution output of shape (channels, height, width):
+    a vector per class which is broadcast over all positions, plus a spatial map per class shared by all channels.
+    Memory and the matrix products of the projection scale with num_classes * (channels + height * width) instead
+    of num_classes * channels * height * width.
+    """
+    def initialize(self, num_classes: int, output_shape: tuple, dtype: type=np.float64,
+                   initializer: WeightInitializer=None) -> None:
+        assert len(output_shape) == 3, "invalid output shape: 3-tuple (channels, height, width) required"
+        self.output_shape = c, h, w = tuple(output_shape)
+        # the sum of both parts has the variance of the dense feedback
+        limit = 1 / np.sqrt(c * h * w) / np.sqrt(2)
+        self.B_channel = np.random.uniform(low=-limit, high=limit, size=(num_classes, c)).astype(dtype)
+        self.B_spatial = np.random.uniform(low=-limit, high=limit, size=(num_classes, h * w)).astype(dtype)
+
+    def project(self, E: np.ndarray) -> np.ndarray:
+        n = E.shape[0]
+        c, h, w = self.output_shape
+        out = np.empty((n, c, h * w), dtype=np.result_type(E, self.B_spatial))
+        out[...] = np.dot(E, self.B_spatial).reshape(n, 1, h * w)
+        out += np.dot(E, self.B_channel).reshape(n, c, 1)
+        return out.reshape(n, -1)
+
+    def dense(self) -> np.ndarray:
+        num_classes = self.B_channel.shape[0]
+        return (self.B_channel[:, :, np.newaxis] + self.B_spatial[:, np.newaxis, :]).reshape(num_classes, -1)
+
+    def arrays(self) -> dict:
+        return {'B_channel': self.B_channel, 'B_spatial': self.B_spatial}
+
+    def __str__(self):
+        return "SpatialBroadcast()"
+
+
+@nb.njit(parallel=True, cache=True)
+def sparse_project(E, indptr, indices, data, out):
+    """ out = E.dot(B) for B in compressed sparse column format (indptr, indices, data) """
+    for n in nb.prange(E.shape[0]):
+        for j in range(indptr.shape[0] - 1):
+            acc = 0.
+            for p in range(indptr[j], indptr[j + 1]):
+                acc += E[n, indices[p]] * data[p]
+            out[n, j] = acc
+    return out
+
+
+class SparseFeedback(Feedback):
+    """
+    Every entry of B is non-zero with probability density. B is stored in compressed sparse column format, the
+    projection costs n * density * num_classes * size multiply-adds.
+    """
+    def __init__(self, density: float=0.1) -> None:
+        assert 0 < density <= 1, "density has to be in (0, 1]"
+        self.density = density
+
+    def initialize(self, num_classes: int, output_shape: tuple, dtype: type=np.float64,
+                   initializer: WeightInitializer=None) -> None:
+        size = int(np.prod(output_shape))
+        # scaled up, so that the projection has the variance of the dense feedback
+        limit = 1 / np.sqrt(size) / np.sqrt(self.density)
+        mask = np.random.rand(size, num_classes) < self.density
+        columns, rows = np.nonzero(mask)
+        self.indptr = np.concatenate(([0], np.cumsum(np.sum(mask, axis=1)))).astype(np.int32)
+        self.indices = rows.astype(np.int32)
+        self.data = np.random.uniform(low=-limit, high=limit, size=rows.shape[0]).astype(dtype)
+        self.num_classes = num_classes
+
+    def project(self, E: np.ndarray) -> np.ndarray:
+        out = np.empty((E.shape[0], self.indptr.shape[0] - 1), dtype=np.result_type(E, self.data))
+        return sparse_project(np.ascontiguousarray(E), self.indptr, self.indices, self.data, out)
+
+    def dense(self) -> np.ndarray:
+        B = np.zeros((self.num_classes, self.indptr.shape[0] - 1), dtype=self.data.dtype)
+        columns = np.repeat(np.arange(B.shape[1]), np.diff(self.indptr))
+        B[self.indices, columns] = self.data
+        return B
+
+    def arrays(self) -> dict:
+        return {'indptr': self.indptr, 'indices': self.indices, 'data': self.data}
+
+    def __str__(self):
+        return "Sparse(density={})".format(self.density)
+
+
+class LowRankFeedback(Feedback):
+    """ B = U.dot(V) with U of shape (num_classes, rank) and V of shape (rank, size) """
+    def __init__(self, rank: int=2) -> None:
+        assert rank > 0, "rank has to be positive"
+        self.rank = rank
+
+    def initialize(self, num_classes: int, output_shape: tuple, dtype: type=np.float64,
+                   initializer: WeightInitializer=None) -> None:
+        size = int(np.prod(output_shape))
+        limit = 1 / np.sqrt(size)
+        # unit variance of the sum over the rank
+        self.U = (np.random.randn(num_classes, self.rank) / np.sqrt(self.rank)).astype(dtype)
+        self.V = np.random.uniform(low=-limit, high=limit, size=(self.rank, size)).astype(dtype)
+
+    def project(self, E: np.ndarray) -> np.ndarray:
+        return np.dot(np.dot(E, self.U), self.V)
+
+    def dense(self) -> np.ndarray:
+        return np.dot(self.U, self.V)
+
+    def arrays(self) -> dict:
+        return {'U': self.U, 'V': self.V}
+
+    def __str__(self):
+        return "LowRank(rank={})".format(self.rank)
+
+
+class SeededFeedback(Feedback):
+    """
+    B is never stored: only the key of a counter-based random generator (Philox) is kept and the projection
+    regenerates B in blocks of block_size columns, each directly followed by its matrix product. Block j is drawn
+    from the counter (0, j, 0, 0), so every block can be regenerated independently and the memory needed is
+    num_classes * block_size, independent of the layer size.
+
+    initializer: distribution of the feedback weights, by default the one of the dense feedback of the host layer
+    seed: key of the generator, drawn from the global random state at initialize if None
+    """
+    def __init__(self, initializer: WeightInitializer=None, seed: int=None, block_size: int=4096) -> None:
+        assert block_size > 0, "block size has to be positive"
+        self.initializer = initializer
+        self.seed = seed
+        self.block_size = block_size
+
+    def initialize(self, num_classes: int, output_shape: tuple, dtype: type=np.float64,
+                   initializer: WeightInitializer=None) -> None:
+        self.num_classes = num_classes
+        self.size = int(np.prod(output_shape))
+        self.dtype = dtype
+        self.block_initializer = self.initializer or initializer
+        if self.block_initializer is None:
+            raise ValueError("Seeded feedback needs an initializer if it is not used in a layer")
+        if self.seed is None:
+            self.key = np.random.randint(0, 2 ** 63, size=2, dtype=np.uint64)
+        else:
+            self.key = np.array([self.seed, 0], dtype=np.uint64)
+
+    def block(self, j: int) -> np.ndarray:
+        """ columns j * block_size .. (j + 1) * block_size of B """
+        start = j * self.block_size
+        size = min(self.block_size, self.size - start)
+        rng = np.random.Generator(np.random.Philox(key=self.key, counter=np.array([0, j, 0, 0], dtype=np.uint64)))
+        return self.block_initializer.init((self.num_classes, size), dtype=self.dtype, rng=rng)
+
+    def project(self, E: np.ndarray) -> np.ndarray:
+        out = np.empty((E.shape[0], self.size), dtype=np.result_type(E, self.dtype))
+        for j, start in enumerate(range(0, self.size, self.block_size)):
+            out[:, start:start + self.block_size] = np.dot(E, self.block(j))
+        return out
+
+    def dense(self) -> np.ndarray:
+        return np.concatenate([self.block(j) for j in range((self.size + self.block_size - 1) // self.block_size)],
+                              axis=1)
+
+    def arrays(self) -> dict:
+        return {'key': self.key}
+
+    def set_arrays(self, arrays: dict) -> None:
+        # the key may be memory-mapped from a checkpoint
+        self.key = np.array(arrays['key'], dtype=np.uint64)
+
+    def __str__(self):
+        return "Seeded(initializer={}, block_size={})".format(self.block_initializer, self.block_size)
@@ -0,0 +1,152 @@
+import numpy as np
+
+from network.activation import Activation
+from network.layer import Layer
+from network.layers.conv_to_fully_connected import ConvToFullyConnected
+from network.layers.convolution_im2col import Convolution
+from network.layers.dropout import Dropout
+from network.layers.fully_connected import FullyConnected
+from network.layers.max_pool import MaxPool
+
+
+def apply_activation(activation: Activation, x: np.ndarray) -> None:
+    """ applies the activation function in place """
+    if activation is not None:
+        activation.forward_inplace(x)
+
+
+class Stage(object):
+    """ inference step of a single layer, writes its result into a preallocated output buffer """
+    in_place = False
+
+    def __init__(self, layer: Layer, input_shape: tuple, output_shape: tuple) -> None:
+        self.layer = layer
+        self.input_shape = input_shape
+        self.output_shape = output_shape
+
+    def __call__(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class ReshapeStage(Stage):
+    in_place = True
+
+    def __call__(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        return x.reshape((x.shape[0],) + self.output_shape)
+
+
+class FullyConnectedStage(Stage):
+    def __call__(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        np.dot(x, self.layer.W, out=out)
+        out += self.layer.b
+        apply_activation(self.layer.activation, out)
+        return out
+
+
+class ConvolutionStage(Stage):
+    def __init__(self, layer: Layer, input_shape: tuple, output_shape: tuple) -> None:
+        super().__init__(layer, input_shape, output_shape)
+        self.scratch = None
+        self.cols = None
+
+    def __call__(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        layer = self.layer
+        n = x.shape[0]
+        n_f, c_f, h_f, w_f = layer.W.shape
+        num_columns = n * layer.h_out * layer.w_out
+
+        if self.cols is None or self.cols.size < c_f * h_f * w_f * num_columns or self.cols.dtype != x.dtype:
+            self.cols = np.empty(c_f * h_f * w_f * num_columns, dtype=x.dtype)
+        x_cols = layer.im2col(x, h_f, w_f, layer.padding, layer.stride,
+                              self.cols[:c_f * h_f * w_f * num_columns].reshape(c_f * h_f * w_f, num_columns))
+        if self.scratch is None or self.scratch.size < n_f * num_columns or self.scratch.dtype != out.dtype:
+            self.scratch = np.empty(n_f * num_columns, dtype=out.dtype)
+        z = self.scratch[:n_f * num_columns].reshape(n_f, -1)
+        np.dot(layer.W.reshape((n_f, -1)), x_cols, out=z)
+        z += layer.b.reshape(-1, 1)
+        apply_activation(layer.activation, z)
+        out[...] = z.reshape(n_f, layer.h_out, layer.w_out, n).transpose(3, 0, 1, 2)
+        return out
+
+
+class MaxPoolStage(Stage):
+    def __call__(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        n, c, h_in, w_in = x.shape
+        size = self.layer.size
+        np.max(x.reshape(n, c, h_in // size, size, w_in // size, size), axis=(3, 5), out=out)
+        return out
+
+
+class LayerStage(Stage):
+    """ fallback for layers without a dedicated inference implementation """
+    def __call__(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        out[...] = self.layer.forward(x, mode='predict')
+        return out
+
+
+class InferenceEngine(object):
+    """
+    Forward pass for inference only. Layers run in predict mode without caching any activations, bias and activation
+    are applied in place and the outputs of consecutive layers alternate between two preallocated buffers, so the
+    memory needed is bounded by batch_size times the largest layer output.
+    """
+    def __init__(self, layers: list, input_size: tuple, dtype: type=np.float64, batch_size: int=1000) -> None:
+        self.dtype = dtype
+        self.batch_size = batch_size
+        self.input_size = tuple(np.atleast_1d(input_size))
+        self.stages = []
+
+        shape = self.input_size
+        for layer in layers:
+            if isinstance(layer, Dropout):
+                continue
+            elif isinstance(layer, ConvToFullyConnected):
+                stage = ReshapeStage(layer, shape, (int(np.prod(shape)),))
+            elif isinstance(layer, FullyConnected):
+                stage = FullyConnectedStage(layer, shape, (layer.size,))
+            elif isinstance(layer, Convolution):
+                stage = ConvolutionStage(layer, shape, (layer.filter_shape[0], layer.h_out, layer.w_out))
+            elif isinstance(layer, MaxPool):
+                stage = MaxPoolStage(layer, shape, (shape[0], layer.h_out, layer.w_out))
+            else:
+                output = layer.forward(np.zeros((1,) + shape, dtype=dtype), mode='predict')
+                stage = LayerStage(layer, shape, output.shape[1:])
+            self.stages.append(stage)
+            shape = stage.output_shape
+
+        self.output_shape = shape
+        size = max([int(np.prod(stage.output_shape)) for stage in self.stages if not stage.in_place] + [0])
+        self.buffers = [np.empty(batch_size * size, dtype=dtype), np.empty(batch_size * size, dtype=dtype)]
+
+    def __forward(self, X: np.ndarray) -> np.ndarray:
+        """ forward pass of at most batch_size samples, the result is a view of one of the buffers """
+        n = X.shape[0]
+        x = X.astype(self.dtype, copy=False)
+        current = 0
+        for stage in self.stages:
+            out = None
+            if not stage.in_place:
+                out = self.buffers[current][:n * int(np.prod(stage.output_shape))].reshape((n,) + stage.output_shape)
+                current = 1 - current
+            x = stage(x, out)
+        return x
+
+    def chunks(self, X: np.ndarray):
+        """ forward pass in chunks of batch_size samples, yields (start, end, output). The output is a view of one of
+        the buffers, it is only valid until the next chunk is computed """
+        n = X.shape[0]
+        for start in range(0, n, self.batch_size):
+            end = min(start + self.batch_size, n)
+            yield start, end, self.__forward(X[start:end])
+
+    def logits(self, X: np.ndarray) -> np.ndarray:
+        result = np.empty((X.shape[0],) + self.output_shape, dtype=self.dtype)
+        for start, end, out in self.chunks(X):
+            result[start:end] = out
+        return result
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        result = np.empty(X.shape[0], dtype=int)
+        for start, end, out in self.chunks(X):
+            result[start:end] = np.argmax(out, axis=1)
+        return result
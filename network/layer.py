@@ -8,8 +8,13 @@ class Layer:
     def __init__(self) -> None:
         super().__init__()
         self.params = defaultdict(lambda: None)
+        # views of the gradients in the parameter arena (see network.arena), set when the layer is added to one
+        self.grad_W = None
+        self.grad_b = None
 
-    def initialize(self, input_size: tuple, num_classes: int, train_method: str) -> tuple:
+    def initialize(self, input_size: tuple, num_classes: int, train_method: str, dtype: type=np.float64,
+                   draw_weights: bool=True) -> tuple:
+        """ draw_weights: False only allocates the weights, which are overwritten afterwards (e.g. by Model.load) """
         pass
 
     def forward(self, X: np.ndarray, mode='predict') -> np.ndarray:
@@ -18,9 +23,19 @@ class Layer:
     def dfa(self, E: np.ndarray) -> tuple:
         pass
 
+    def dfa_projected(self, E: np.ndarray) -> tuple:
+        # same as dfa, but E has already been projected through the feedback weights B
+        pass
+
     def back_prob(self, E: np.ndarray) -> tuple:
         pass
 
+    def gradient_buffers(self, dtype: type) -> tuple:
+        """ (dW, db) buffers the gradients of dtype are written into, (None, None) to allocate new ones """
+        if self.grad_W is None or self.grad_W.dtype != dtype or self.grad_W.shape != self.W.shape:
+            return None, None
+        return self.grad_W, self.grad_b
+
     def reset_params(self) -> None:
         self.params.clear()
 
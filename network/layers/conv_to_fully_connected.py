@@ -5,7 +5,8 @@ from network.layer import Layer
 
 class ConvToFullyConnected(Layer):
 
-    def initialize(self, input_size: tuple, num_classes: int, train_method: str):
+    def initialize(self, input_size: tuple, num_classes: int, train_method: str, dtype: type=np.float64,
+                   draw_weights: bool=True):
         return np.prod(input_size)
 
     def forward(self, X: np.ndarray, mode='predict') -> np.ndarray:
@@ -2,6 +2,7 @@ import numpy as np
 
 from network.activation import Activation
 from network.layer import Layer
+from network.utils.dropout_mask import dropout
 
 
 def tanh_d(x):
@@ -21,7 +22,7 @@ class Convolution(Layer):
         self.activation = activation
         self.last_layer = last_layer
 
-    def initialize(self, input_size, num_classes, train_method) -> tuple:
+    def initialize(self, input_size, num_classes, train_method, dtype=np.float64, draw_weights=True) -> tuple:
         assert np.size(input_size) == 3, \
             "invalid input size: 3-tuple required for convolution layer"
 
@@ -38,102 +39,104 @@ class Convolution(Layer):
         self.h_out = ((h_in - h_f + 2 * self.padding) // self.stride) + 1
         self.w_out = ((w_in - w_f + 2 * self.padding) // self.stride) + 1
 
-        self.W = np.zeros(self.filter_shape)
-        self.b = np.ones(f)
+        self.W = np.zeros(self.filter_shape, dtype=dtype)
+        self.b = np.ones(f, dtype=dtype)
 
         if train_method == 'dfa':
-            self.B = np.ndarray((num_classes, f, self.h_out, self.w_out))
-            for i in range(f):
-                b = np.random.uniform(low=0.0, high=2.0, size=(num_classes, self.h_out, self.w_out))
-                self.B[:, i] = b - np.mean(b)
+            self.B = np.ndarray((num_classes, f, self.h_out, self.w_out), dtype=dtype)
+            if draw_weights:
+                for i in range(f):
+                    b = np.random.uniform(low=0.0, high=2.0, size=(num_classes, self.h_out, self.w_out))
+                    self.B[:, i] = b - np.mean(b)
         elif train_method == 'bp':
-            for i in range(f):
-                self.W[i] = np.random.randn(c_f, h_f, w_f) / np.sqrt(h_f)
+            if draw_weights:
+                for i in range(f):
+                    self.W[i] = np.random.randn(c_f, h_f, w_f) / np.sqrt(h_f)
         else:
             raise "invalid train method '{}'".format(train_method)
 
         return f, self.h_out, self.w_out
 
-    def forward(self, X, mode='predict') -> np.ndarray:
-        n_in, c, h_in, w_in = X.shape
-        n_f, c, h_f, w_f = self.W.shape
+    def __pad(self, X: np.ndarray) -> np.ndarray:
+        if self.padding == 0:
+            return X
+        p = self.padding
+        return np.pad(X, ((0, 0), (0, 0), (p, p), (p, p)), 'constant', constant_values=0)
+
+    def __windows(self, X_padded: np.ndarray) -> np.ndarray:
+        """ strided view (n, c, h_out, w_out, h_f, w_f) of the receptive fields, no data is copied """
+        n_f, c_f, h_f, w_f = self.W.shape
+        windows = np.lib.stride_tricks.sliding_window_view(X_padded, (h_f, w_f), axis=(2, 3))
+        return windows[:, :, ::self.stride, ::self.stride]
 
-        z = np.zeros((n_in, n_f, self.h_out, self.w_out))
+    def __delta(self, E: np.ndarray) -> np.ndarray:
+        """ multiplies the derivative of the activation into E in place """
+        if self.activation is None:
+            E *= self.a_out
+            return E
+        return self.activation.backprop_into(E, self.a_out)
 
-        x_padded = np.lib.pad(X, ((0, 0), (0, 0), (self.padding, self.padding), (self.padding, self.padding)),
-                              'constant', constant_values=0)
+    def forward(self, X, mode='predict') -> np.ndarray:
+        windows = self.__windows(self.__pad(X))
 
-        for h in range(self.h_out):
-            for w in range(self.w_out):
-                for j in range(n_f):
-                    z[:, j, h, w] = np.sum(
-                        x_padded[:, :, h * self.stride:h * self.stride + h_f, w * self.stride:w * self.stride + w_f] *
-                        self.W[j], axis=(1, 2, 3)) + self.b[j]
+        # (n, h_out, w_out, n_f)
+        z = np.tensordot(windows, self.W, axes=([1, 4, 5], [1, 2, 3]))
+        z += self.b
+        if self.activation is not None:
+            self.activation.forward_inplace(z)
 
         self.a_in = X
-        self.a_out = z if self.activation is None else self.activation.forward(z)
+        # contiguous, so that the fused kernel of the activation can multiply its derivative into E
+        self.a_out = np.ascontiguousarray(z.transpose(0, 3, 1, 2))
         if mode == 'train' and self.dropout_rate > 0:
-            self.dropout_mask = (np.random.rand(*self.a_out.shape) > self.dropout_rate).astype(int)
-            self.a_out *= self.dropout_mask
+            # a_out keeps the activations without dropout, the derivative of the activation is taken at them
+            out = np.copy(self.a_out)
+            self.dropout_mask = dropout(out, self.dropout_rate)
+            return out
         return self.a_out
 
     def dfa(self, E: np.ndarray) -> tuple:
-        E = np.einsum('ij,jklm->iklm', E, self.B)
-
-        if self.dropout_rate > 0:
-            E *= self.dropout_mask
+        return self.dfa_projected(np.einsum('ij,jklm->iklm', E, self.B))
 
-        n_f, c_f, h_f, w_f = self.W.shape
-        n_e, c_e, h_e, w_e = E.shape
+    def dfa_projected(self, E: np.ndarray) -> tuple:
+        E = E.reshape((-1,) + self.B.shape[1:])
 
-        delta = E * (self.a_out if self. activation is None else self.activation.gradient(self.a_out))
-        X_padded = np.lib.pad(self.a_in, ((0, 0), (0, 0), (self.padding, self.padding), (self.padding, self.padding)),
-                              'constant', constant_values=0)
+        if self.dropout_rate > 0:
+            self.dropout_mask.apply(E)
 
-        dW = np.zeros(self.W.shape)
+        # the bias gradient is taken before the derivative of the activation is multiplied into E
         db = np.sum(E, axis=(0, 2, 3))
+        delta = self.__delta(E)
+        windows = self.__windows(self.__pad(self.a_in))
 
-        for h in range(h_e):
-            for w in range(w_e):
-                dW += np.tensordot(delta[:, :, h, w].T, X_padded[:, :, h * self.stride:h * self.stride + h_f,
-                                                        w * self.stride:w * self.stride + w_f], axes=([-1], [0]))
+        dW = np.tensordot(delta, windows, axes=([0, 2, 3], [0, 2, 3]))
 
         return dW, db
 
     def back_prob(self, E: np.ndarray) -> tuple:
 
         if self.dropout_rate > 0:
-            E *= self.dropout_mask
+            self.dropout_mask.apply(E)
 
         n_f, c_f, h_f, w_f = self.W.shape
         n_e, c_e, h_e, w_e = E.shape
+        n_in, c_in, h_in, w_in = self.a_in.shape
+        p, s = self.padding, self.stride
 
-        dX = np.zeros(self.a_in.shape)
-        dW = np.zeros(self.W.shape)
-
-        delta = E * (self.a_out if self. activation is None else self.activation.gradient(self.a_out))
-        X_padded = np.lib.pad(self.a_in, ((0, 0), (0, 0), (self.padding, self.padding), (self.padding, self.padding)),
-                              'constant', constant_values=0)
-        dX_padded = np.lib.pad(dX, ((0, 0), (0, 0), (self.padding, self.padding), (self.padding, self.padding)),
-                               'constant', constant_values=0)
-
-        for h in range(h_e):
-            for w in range(w_e):
-                curr_h = h * self.stride
-                curr_w = w * self.stride
-                dW += np.tensordot(
-                    delta[:, :, h, w].T,
-                    X_padded[:, :, curr_h:curr_h + h_f, curr_w:curr_w + w_f],
-                    axes=([-1], [0])
-                )
-                dX_padded[:, :, curr_h:curr_h + h_f, curr_w:curr_w + w_f] += np.einsum(
-                    'ij,jklm->iklm',
-                    delta[:, :, h, w],
-                    self.W
-                )
-
-        dX = dX_padded[:, :, self.padding:-self.padding, self.padding:-self.padding]
         db = np.sum(E, axis=(0, 2, 3))
+        delta = self.__delta(E)
+        windows = self.__windows(self.__pad(self.a_in))
+
+        dW = np.tensordot(delta, windows, axes=([0, 2, 3], [0, 2, 3]))
+
+        # gradient of every receptive field (n, c, h_f, w_f, h_out, w_out), then summed up per filter position
+        dX_windows = np.tensordot(self.W, delta, axes=([0], [1])).transpose(3, 0, 1, 2, 4, 5)
+        dX_padded = np.zeros((n_in, c_in, h_in + 2 * p, w_in + 2 * p), dtype=dX_windows.dtype)
+        for i in range(h_f):
+            for j in range(w_f):
+                dX_padded[:, :, i:i + s * h_e:s, j:j + s * w_e:s] += dX_windows[:, :, i, j]
+
+        dX = dX_padded[:, :, p:p + h_in, p:p + w_in]
 
         return dX, dW, db
 
@@ -1,15 +1,33 @@
+import time
+from collections import OrderedDict
+
 import numpy as np
 
+from network import weight_initializer
 from network.activation import Activation
+from network.feedback import Feedback
 from network.layer import Layer
-from network.utils.im2col_cython import im2col_cython, col2im_cython
+from network.utils.dropout_mask import dropout
+from network.utils import im2col_backend
+from network.utils.convolution_engines import ENGINES
+
+ALGORITHMS = ['im2col', 'winograd', 'fft', 'auto']
+
+# winner of the 'auto' benchmark per layer configuration, so that layers of the same shape are benchmarked only once
+AUTO_ALGORITHMS = {}
 
 
 class Convolution(Layer):
     def __init__(self, filter_shape, stride, padding, dropout_rate: float = 0, activation: Activation = None,
-                 last_layer=False, weight_initializer=None, fb_weight_initializer=None) -> None:
+                 last_layer=False, weight_initializer=None, fb_weight_initializer=None, backend: str='auto',
+                 algorithm: str='im2col', feedback: Feedback=None) -> None:
         assert len(filter_shape) == 4, \
             "invalid filter shape: 4-tuple required, {}-tuple given".format(len(filter_shape))
+        if algorithm not in ALGORITHMS:
+            raise ValueError("Invalid convolution algorithm '{}', expected one of {}".format(algorithm, ALGORITHMS))
+        if algorithm in ENGINES and not ENGINES[algorithm].supports(filter_shape, stride, padding):
+            raise ValueError("Convolution algorithm '{}' does not support filter shape {} with stride {}".format(
+                algorithm, filter_shape, stride))
         super().__init__()
         self.filter_shape = filter_shape
         self.stride = stride
@@ -19,8 +37,23 @@ class Convolution(Layer):
         self.last_layer = last_layer
         self.weight_initializer = weight_initializer
         self.fb_weight_initializer = fb_weight_initializer
+        self.backend = backend
+        self.im2col, self.col2im = im2col_backend.get_backend(backend)
+        # buffers per input shape and dtype, see __buffers
+        self.buffer_cache = OrderedDict()
+        self.buffer_cache_size = 2
+        # number of buffer sets used in rotation, has to be raised if the cached activations of older forward passes
+        # are still needed (e.g. by the pipelined trainer)
+        self.num_buffer_sets = 1
+        self.algorithm = algorithm
+        # structured feedback weights (see network.feedback) instead of the dense B, seeded feedback is drawn with
+        # fb_weight_initializer like the dense B, the other structures ignore it and use the default scale
+        self.feedback = feedback
+        # None for im2col, otherwise one of network.utils.convolution_engines
+        self.engine = None
+        self.engine_cache = None
 
-    def initialize(self, input_size, num_classes, train_method) -> tuple:
+    def initialize(self, input_size, num_classes, train_method, dtype=np.float64, draw_weights=True) -> tuple:
         assert np.size(input_size) == 3, \
             "invalid input size: 3-tuple required for convolution layer"
 
@@ -38,71 +71,177 @@ class Convolution(Layer):
         self.w_out = ((w_in - w_f + 2 * self.padding) // self.stride) + 1
 
         # initialize weights
-        if self.weight_initializer is None:
+        if not draw_weights:
+            self.W = np.empty(self.filter_shape, dtype=dtype)
+        elif self.weight_initializer is None:
             sqrt_fan_in = np.sqrt(c_in * h_in * w_in)
-            self.W = np.random.uniform(low=-1 / sqrt_fan_in, high=1 / sqrt_fan_in, size=self.filter_shape)
+            self.W = np.random.uniform(low=-1 / sqrt_fan_in, high=1 / sqrt_fan_in, size=self.filter_shape).astype(dtype)
         else:
-            self.W = self.weight_initializer.init(dim=(f, c_f, h_f, w_f))
+            self.W = self.weight_initializer.init(dim=(f, c_f, h_f, w_f), dtype=dtype)
 
         # initialize feedback weights
-        if self.fb_weight_initializer is None:
-            sqrt_fan_out = np.sqrt(f * self.h_out * self.w_out)
+        sqrt_fan_out = np.sqrt(f * self.h_out * self.w_out)
+        if self.feedback is not None:
+            self.feedback.initialize(num_classes, (f, self.h_out, self.w_out), dtype, self.fb_weight_initializer or
+                                     weight_initializer.RandomUniform(low=-1 / sqrt_fan_out, high=1 / sqrt_fan_out))
+            self.B = None
+        elif not draw_weights:
+            self.B = np.empty((num_classes, f * self.h_out * self.w_out), dtype=dtype)
+        elif self.fb_weight_initializer is None:
             # self.B = np.random.uniform(low=-1 / sqrt_fan_out, high=1 / sqrt_fan_out, size=(num_classes, f, self.h_out, self.w_out))
-            self.B = np.random.uniform(low=-1 / sqrt_fan_out, high=1 / sqrt_fan_out, size=(num_classes, f * self.h_out * self.w_out))
+            self.B = np.random.uniform(low=-1 / sqrt_fan_out, high=1 / sqrt_fan_out, size=(num_classes, f * self.h_out * self.w_out)).astype(dtype)
         else:
             # self.B = self.fb_weight_initializer.init(dim=(num_classes, f, self.h_out, self.w_out))
-            self.B = self.fb_weight_initializer.init(dim=(num_classes, f * self.h_out * self.w_out))
+            self.B = self.fb_weight_initializer.init(dim=(num_classes, f * self.h_out * self.w_out), dtype=dtype)
 
         # initialize bias units
-        self.b = np.zeros(f)
+        self.b = np.zeros(f, dtype=dtype)
+
+        self.buffer_cache.clear()
+
+        algorithm = self.algorithm
+        if algorithm == 'auto':
+            key = (tuple(input_size), tuple(self.filter_shape), self.stride, self.padding, np.dtype(dtype).str,
+                   train_method)
+            if key not in AUTO_ALGORITHMS:
+                AUTO_ALGORITHMS[key] = self.__benchmark_algorithms(input_size, num_classes, train_method, dtype)
+            algorithm = AUTO_ALGORITHMS[key]
+        self.engine = ENGINES[algorithm](self) if algorithm in ENGINES else None
 
         return f, self.h_out, self.w_out
 
+    def __benchmark_algorithms(self, input_size, num_classes, train_method, dtype, batch_size=64) -> str:
+        """ times forward and backward pass of a batch with every applicable algorithm, returns the fastest """
+        rng_state = np.random.get_state()
+        X = np.random.randn(batch_size, *input_size).astype(dtype)
+        E = np.random.randn(batch_size, num_classes).astype(dtype)
+        E_layer = np.random.randn(batch_size, self.filter_shape[0], self.h_out, self.w_out).astype(dtype)
+
+        def step():
+            self.forward(X, mode='train')
+            if train_method == 'bp':
+                self.back_prob(E_layer.copy())
+            else:
+                self.dfa(E)
+
+        times = {}
+        for algorithm in ['im2col'] + [name for name, engine in ENGINES.items()
+                                       if engine.supports(self.filter_shape, self.stride, self.padding)]:
+            self.engine = ENGINES[algorithm](self) if algorithm in ENGINES else None
+            step()  # warm-up
+            times[algorithm] = np.inf
+            for _ in range(2):
+                start = time.time()
+                step()
+                times[algorithm] = min(times[algorithm], time.time() - start)
+
+        np.random.set_state(rng_state)
+        self.buffer_cache.clear()
+        return min(times, key=times.get)
+
+    def __buffers(self, input_shape: tuple, dtype) -> dict:
+        """ returns the next set of column and output buffers for the given input shape. The buffers of the
+        buffer_cache_size most recently used shapes are kept, so the training batches (and the last, smaller batch of
+        an epoch) don't have to allocate them in every step """
+        key = (input_shape, np.dtype(dtype).str)
+        if key in self.buffer_cache:
+            self.buffer_cache.move_to_end(key)
+        else:
+            self.buffer_cache[key] = {'sets': [], 'next': 0, 'dX_cols': None}
+            while len(self.buffer_cache) > self.buffer_cache_size:
+                self.buffer_cache.popitem(last=False)
+        entry = self.buffer_cache[key]
+
+        if len(entry['sets']) < self.num_buffer_sets:
+            n_in, c_in, h_in, w_in = input_shape
+            n_f, c_f, h_f, w_f = self.W.shape
+            num_columns = n_in * self.h_out * self.w_out
+            buffers = {
+                'x_cols': np.empty((c_f * h_f * w_f, num_columns), dtype=dtype),
+                'z': np.empty((n_f, num_columns), dtype=np.result_type(self.W.dtype, dtype))
+            }
+            entry['sets'].append(buffers)
+        else:
+            buffers = entry['sets'][entry['next'] % len(entry['sets'])]
+        entry['next'] += 1
+        return buffers
+
+    def __dX_cols_buffer(self, input_shape: tuple, dtype) -> np.ndarray:
+        """ the columns of dX are turned into dX right away, so a single buffer per shape is enough """
+        entry = self.buffer_cache.get((input_shape, np.dtype(dtype).str))
+        if entry is None:
+            return None
+        if entry['dX_cols'] is None:
+            entry['dX_cols'] = np.empty_like(entry['sets'][0]['x_cols'])
+        return entry['dX_cols']
+
+    def __weight_gradient(self, delta_reshaped: np.ndarray, grad_W: np.ndarray) -> np.ndarray:
+        """ dW of the error columns (n_f, n * h_out * w_out), written into grad_W unless it is None """
+        if grad_W is None:
+            return delta_reshaped.dot(self.x_cols.T).reshape(self.W.shape)
+        np.dot(delta_reshaped, self.x_cols.T, out=grad_W.reshape(delta_reshaped.shape[0], -1))
+        return grad_W
+
     def forward(self, X, mode='predict') -> np.ndarray:
         n_in, c, h_in, w_in = X.shape
         n_f, c, h_f, w_f = self.W.shape
 
-        self.x_cols = im2col_cython(X, h_f, w_f, self.padding, self.stride)  # <->
-        z = self.W.reshape((n_f, -1)).dot(self.x_cols)
-        z += self.b.reshape(-1, 1)  # +
-        z = z.reshape(n_f, self.h_out, self.w_out, n_in).transpose(3, 0, 1, 2)
+        if self.engine is None:
+            buffers = self.__buffers(X.shape, X.dtype)
+            self.x_cols = self.im2col(X, h_f, w_f, self.padding, self.stride, buffers['x_cols'])  # <->
+            z = np.dot(self.W.reshape((n_f, -1)), self.x_cols, out=buffers['z'])
+            z += self.b.reshape(-1, 1)  # +
+            z = z.reshape(n_f, self.h_out, self.w_out, n_in).transpose(3, 0, 1, 2)
+        else:
+            z, self.engine_cache = self.engine.forward(X)
+            z += self.b.reshape(1, -1, 1, 1)
 
         self.a_in = X
 
         if self.activation is None:
             self.a_out = z
         else:
-            self.a_out = self.activation.forward(z)
+            self.a_out = self.activation.forward_inplace(z)
 
         if mode == 'train' and self.dropout_rate > 0:
-            # self.dropout_mask = np.random.binomial(size=self.a_out.shape, n=1, p=1 - self.dropout_rate)
-            self.dropout_mask = (np.random.rand(*self.a_out.shape) > self.dropout_rate).astype(int)
-            self.a_out *= self.dropout_mask
+            # a_out keeps the activations without dropout, the derivative of the activation is taken at them
+            out = np.copy(self.a_out)
+            self.dropout_mask = dropout(out, self.dropout_rate)
+            return out
 
         return self.a_out
 
     def dfa(self, E: np.ndarray) -> tuple:
         # E = np.einsum('ij,jklm->iklm', E, self.B)
+        if self.feedback is not None:
+            return self.dfa_projected(self.feedback.project(E))
+        return self.dfa_projected(np.dot(E, self.B))
 
+    def dfa_projected(self, E: np.ndarray) -> tuple:
         n_f, c_f, h_f, w_f = self.W.shape
 
-        E = np.dot(E, self.B).reshape((-1, n_f, self.h_out, self.w_out))
+        E = E.reshape((-1, n_f, self.h_out, self.w_out))
         if self.dropout_rate > 0:
-            E *= self.dropout_mask
+            self.dropout_mask.apply(E)
 
         if self.activation is None:
             E *= self.a_out
         else:
-            E *= self.activation.gradient(self.a_out)
+            self.activation.backprop_into(E, self.a_out)
 
-        dW = E.transpose((1, 2, 3, 0)).reshape(n_f, -1).dot(self.x_cols.T).reshape(self.W.shape)
-        db = np.sum(E, axis=(0, 2, 3))
+        grad_W, grad_b = self.gradient_buffers(np.result_type(self.a_in, E))
+        if self.engine is None:
+            delta_reshaped = E.transpose((1, 2, 3, 0)).reshape(n_f, -1)
+            dW = self.__weight_gradient(delta_reshaped, grad_W)
+        else:
+            dW = self.engine.weight_gradient(E, self.engine_cache)
+        db = np.sum(E, axis=(0, 2, 3), out=grad_b)
 
         return dW, db
 
     def back_prob(self, E: np.ndarray) -> tuple:
         if self.dropout_rate > 0:
-            E *= self.dropout_mask
+            self.dropout_mask.apply(E)
 
         n_in, c_in, h_in, w_in = self.a_in.shape
         n_f, c_f, h_f, w_f = self.W.shape
@@ -110,13 +249,20 @@ class Convolution(Layer):
         if self.activation is None:
             E *= self.a_out
         else:
-            E *= self.activation.gradient(self.a_out)
-        delta_reshaped = E.transpose((1, 2, 3, 0)).reshape(n_f, -1)
+            self.activation.backprop_into(E, self.a_out)
 
-        dX_cols = self.W.reshape(n_f, -1).T.dot(delta_reshaped)
-        dX = col2im_cython(dX_cols, n_in, c_in, h_in, w_in, h_f, w_f, self.padding, self.stride)
-        dW = delta_reshaped.dot(self.x_cols.T).reshape(self.W.shape)
-        db = np.sum(E, axis=(0, 2, 3))
+        grad_W, grad_b = self.gradient_buffers(np.result_type(self.a_in, E))
+        if self.engine is None:
+            delta_reshaped = E.transpose((1, 2, 3, 0)).reshape(n_f, -1)
+
+            dX_cols = self.__dX_cols_buffer(self.a_in.shape, np.result_type(self.W, delta_reshaped))
+            dX_cols = np.dot(self.W.reshape(n_f, -1).T, delta_reshaped, out=dX_cols)
+            dX = self.col2im(dX_cols, n_in, c_in, h_in, w_in, h_f, w_f, self.padding, self.stride)
+            dW = self.__weight_gradient(delta_reshaped, grad_W)
+        else:
+            dX = self.engine.input_gradient(E, self.engine_cache)
+            dW = self.engine.weight_gradient(E, self.engine_cache)
+        db = np.sum(E, axis=(0, 2, 3), out=grad_b)
 
         return dX, dW, db
 
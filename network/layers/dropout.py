@@ -1,6 +1,7 @@
 import numpy as np
 
 from network.layer import Layer
+from network.utils.dropout_mask import dropout
 
 
 class Dropout(Layer):
@@ -9,13 +10,14 @@ class Dropout(Layer):
         super().__init__()
         self.rate = rate
 
-    def initialize(self, input_size, out_layer_size, train_method) -> tuple:
+    def initialize(self, input_size, out_layer_size, train_method, dtype=np.float64, draw_weights=True) -> tuple:
         return input_size
 
     def forward(self, X, mode='predict') -> np.ndarray:
         if mode == 'train':
-            self.dropout_mask = np.random.binomial(size=X.shape, n=1, p=1 - self.rate)
-            return X * self.dropout_mask
+            out = np.array(X)
+            self.dropout_mask = dropout(out, self.rate)
+            return out
         else:
             return X
 
@@ -23,7 +25,7 @@ class Dropout(Layer):
         return 0, 0
 
     def back_prob(self, E: np.ndarray) -> tuple:
-        return E * self.dropout_mask, 0, 0
+        return self.dropout_mask.apply(np.array(E)), 0, 0
 
 
 
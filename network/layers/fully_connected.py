@@ -3,7 +3,9 @@ import numba as nb
 
 from network import weight_initializer
 from network.activation import Activation
+from network.feedback import Feedback, SeededFeedback
 from network.layer import Layer
+from network.utils.dropout_mask import dropout
 
 @nb.jit(nopython=True)
 def forward(X: np.ndarray, W: np.ndarray, b: np.ndarray) -> np.ndarray:
@@ -14,7 +16,7 @@ def forward(X: np.ndarray, W: np.ndarray, b: np.ndarray) -> np.ndarray:
 
 class FullyConnected(Layer):
     def __init__(self, size: int, dropout_rate: float=0, batch_norm: bool=False, activation: Activation=None,
-                 last_layer=False, weight_initializer=None, fb_weight_initializer=None):
+                 last_layer=False, weight_initializer=None, fb_weight_initializer=None, feedback: Feedback=None):
         super().__init__()
         self.size = size
         self.dropout_rate = dropout_rate
@@ -23,56 +25,79 @@ class FullyConnected(Layer):
         self.last_layer = last_layer
         self.weight_initializer = weight_initializer
         self.fb_weight_initializer = fb_weight_initializer
+        # seeded feedback weights (see network.feedback) instead of the dense B, they are drawn like the dense B
+        if feedback is not None and not isinstance(feedback, SeededFeedback):
+            # the other structures are scaled like the dense B of a convolution layer
+            raise ValueError("Invalid feedback: {}, only SeededFeedback is supported by fully connected layers"
+                             .format(feedback))
+        self.feedback = feedback
 
-    def initialize(self, input_size: int, num_classes: int, train_method: str) -> int:
+    def initialize(self, input_size: int, num_classes: int, train_method: str, dtype: type=np.float64,
+                   draw_weights: bool=True) -> int:
         assert np.size(input_size) == 1, \
             "invalid input size: scalar required for fully connected layer"
 
         # initialize weights
-        if self.weight_initializer is None:
+        if not draw_weights:
+            self.W = np.empty((input_size, self.size), dtype=dtype)
+        elif self.weight_initializer is None:
             # self.W = np.random.uniform(low=-1 / np.sqrt(input_size), high=1 / np.sqrt(input_size), size=(input_size, self.size))
-            self.W = np.random.randn(input_size, self.size) * (1 / np.sqrt(input_size))
+            self.W = (np.random.randn(input_size, self.size) * (1 / np.sqrt(input_size))).astype(dtype)
         else:
-            self.W = self.weight_initializer.init(dim=(input_size, self.size))
+            self.W = self.weight_initializer.init(dim=(input_size, self.size), dtype=dtype)
 
         # initialize feedback weights
-        if self.fb_weight_initializer is None:
-            self.B = np.random.uniform(low=-1, high=1, size=(num_classes, self.size))
+        if self.feedback is not None:
+            self.feedback.initialize(num_classes, (self.size,), dtype,
+                                     self.fb_weight_initializer or weight_initializer.RandomUniform(low=-1, high=1))
+            self.B = None
+        elif not draw_weights:
+            self.B = np.empty((num_classes, self.size), dtype=dtype)
+        elif self.fb_weight_initializer is None:
+            self.B = np.random.uniform(low=-1, high=1, size=(num_classes, self.size)).astype(dtype)
         else:
-            self.B = self.fb_weight_initializer.init(dim=(num_classes, self.size))
+            self.B = self.fb_weight_initializer.init(dim=(num_classes, self.size), dtype=dtype)
 
         # initialize bias units
-        self.b = np.zeros(self.size)
+        self.b = np.zeros(self.size, dtype=dtype)
 
         return self.size
 
     def forward(self, X: np.ndarray, mode='predict') -> np.ndarray:
         self.a_in = X
         z = forward(X, self.W, self.b)  # self.a_in.dot(self.W) + self.b
-        self.a_out = z if self.activation is None else self.activation.forward(z)
+        self.a_out = z if self.activation is None else self.activation.forward_inplace(z)
         if mode == 'train' and self.dropout_rate > 0:
-            self.dropout_mask = np.random.binomial(size=self.a_out.shape, n=1, p=1 - self.dropout_rate)
-            self.a_out *= self.dropout_mask
+            # a_out keeps the activations without dropout, the derivative of the activation is taken at them
+            out = np.copy(self.a_out)
+            self.dropout_mask = dropout(out, self.dropout_rate)
+            return out
         return self.a_out
 
     def dfa(self, E: np.ndarray) -> tuple:
-        E = E if self.last_layer else E.dot(self.B)
+        if not self.last_layer:
+            E = E.dot(self.B) if self.feedback is None else self.feedback.project(E)
+        return self.dfa_projected(E)
+
+    def dfa_projected(self, E: np.ndarray) -> tuple:
         if self.dropout_rate > 0:
-            E *= self.dropout_mask
+            self.dropout_mask.apply(E)
         if self.activation is not None:
-            E *= self.activation.gradient(self.a_out)
-        dW = np.dot(self.a_in.T, E)
-        db = np.sum(E, axis=0)
+            self.activation.backprop_into(E, self.a_out)
+        grad_W, grad_b = self.gradient_buffers(np.result_type(self.a_in, E))
+        dW = np.dot(self.a_in.T, E, out=grad_W)
+        db = np.sum(E, axis=0, out=grad_b)
         return dW, db
 
     def back_prob(self, E: np.ndarray) -> tuple:
         if self.dropout_rate > 0:
-            E *= self.dropout_mask
+            self.dropout_mask.apply(E)
         if self.activation is not None:
-            E *= self.activation.gradient(self.a_out)
+            self.activation.backprop_into(E, self.a_out)
         dX = np.dot(E, self.W.T)
-        dW = np.dot(self.a_in.T, E)
-        db = np.sum(E, axis=0)
+        grad_W, grad_b = self.gradient_buffers(np.result_type(self.a_in, E))
+        dW = np.dot(self.a_in.T, E, out=grad_W)
+        db = np.sum(E, axis=0, out=grad_b)
         return dX, dW, db
 
     def has_weights(self) -> bool:
@@ -10,7 +10,8 @@ class MaxPool(Layer):
         self.stride = stride
         self.a_in = None
 
-    def initialize(self, input_size: tuple, num_classes: int, train_method: str) -> tuple:
+    def initialize(self, input_size: tuple, num_classes: int, train_method: str, dtype: type=np.float64,
+                   draw_weights: bool=True) -> tuple:
         assert np.size(input_size) == 3
 
         c, h_in, w_in = input_size
@@ -36,7 +37,7 @@ class MaxPool(Layer):
         return 0, 0
 
     def back_prob(self, E: np.ndarray) -> tuple:
-        dX = (self.a_in_reshaped == self.a_out[:, :, :, np.newaxis, :, np.newaxis]).astype(float)
+        dX = (self.a_in_reshaped == self.a_out[:, :, :, np.newaxis, :, np.newaxis]).astype(E.dtype)
         dX *= E[:, :, :, np.newaxis, :, np.newaxis]
         dX = dX.reshape(self.a_in.shape)
         return dX, 0, 0
@@ -1,27 +1,66 @@
+import numba as nb
 import numpy as np
 
 
+@nb.njit(parallel=True, cache=True)
+def softmax_cross_entropy(x, y, delta, gradient):
+    """ mean cross entropy of softmax(x) and the labels y and the number of rows whose maximum is at y, in one pass
+    over the rows of x. The row maximum is subtracted before exponentiating, so large logits can not overflow. If
+    gradient is True the gradient of the mean loss with respect to x is written into delta """
+    n, k = x.shape
+    loss = 0.
+    correct = 0
+    for i in nb.prange(n):
+        # the position of the row maximum is the prediction, ties go to the first one like np.argmax
+        m = x[i, 0]
+        prediction = 0
+        for j in range(1, k):
+            if x[i, j] > m:
+                m = x[i, j]
+                prediction = j
+        s = 0.
+        if gradient:
+            for j in range(k):
+                delta[i, j] = np.exp(x[i, j] - m)
+                s += delta[i, j]
+            for j in range(k):
+                delta[i, j] /= s * n
+            delta[i, y[i]] -= 1 / n
+        else:
+            for j in range(k):
+                s += np.exp(x[i, j] - m)
+        loss += np.log(s) - (x[i, y[i]] - m)
+        if prediction == y[i]:
+            correct += 1
+    return loss / n, correct
+
+
 class Loss(object):
     def calculate(self, x: np.ndarray, y: np.ndarray) -> tuple:
         pass
 
+    def evaluate(self, x: np.ndarray, y: np.ndarray, out: np.ndarray=None, gradient: bool=True) -> tuple:
+        """ (loss, gradient, number of correct predictions). The gradient is written into out if it fits, it is None
+        if gradient is False """
+        loss, delta = self.calculate(x, y)
+        return loss, delta if gradient else None, int((np.argmax(x, axis=1) == y).sum())
+
 
 class SoftmaxCrossEntropyLoss(Loss):
+    def __init__(self, accumulate_dtype: type=np.float64) -> None:
+        # the loss is returned in accumulate_dtype (None: dtype of x), the kernel always sums it up in float64
+        self.accumulate_dtype = accumulate_dtype
+
     def calculate(self, x: np.ndarray, y: np.ndarray) -> tuple:
-        n = x.shape[0]
-
-        # threshold = 30
-        # abs_x = np.abs(x)
-        # larget_than_threshold = (abs_x > threshold)
-        # x *= (np.abs(larget_than_threshold - 1)) + (larget_than_threshold * threshold / abs_x)
-
-        # print("min: {}, max: {}".format(np.min(x), np.max(x)))
-
-        exp = np.exp(x)
-        probs = exp / np.sum(exp, axis=1, keepdims=True)
-        correct_logprobs = -np.log(probs[range(n), y])
-        loss = np.sum(correct_logprobs) / n
-        delta = probs
-        delta[range(n), y] -= 1
-        delta /= float(n)
-        return loss, delta
\ No newline at end of file
+        loss, delta, _ = self.evaluate(x, y)
+        return loss, delta
+
+    def evaluate(self, x: np.ndarray, y: np.ndarray, out: np.ndarray=None, gradient: bool=True) -> tuple:
+        if not gradient:
+            delta = np.empty((0, 0), dtype=x.dtype)
+        elif out is not None and out.shape == x.shape and out.dtype == x.dtype and out.flags.c_contiguous:
+            delta = out
+        else:
+            delta = np.empty_like(x, order='C')
+        loss, correct = softmax_cross_entropy(x, y, delta, gradient)
+        return (self.accumulate_dtype or x.dtype.type)(loss), delta if gradient else None, correct
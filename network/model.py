@@ -1,13 +1,19 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable
 
 import numpy as np
 import time
 
 from dataset.dataset import DataSet
+from network.arena import ParameterArena, squared_sum
+from network.utils import checkpoint as ckpt
 from network.utils import data
 from network.layer import Layer
 from network.loss import SoftmaxCrossEntropyLoss, Loss
 from network.optimizer import GDOptimizer, Optimizer
+from network.schedule import EarlyStopping
+from network.validation import ValidationPolicy, ValidationResult
 
 
 class UpdateLayer(object):
@@ -22,16 +28,55 @@ class UpdateLayer(object):
             return layer
 
 
+class DFALayer(object):
+    """ computes the dfa gradients of a single layer and optionally applies regularization and the update right
+    away, so that layers can be processed independently of each other """
+    def __init__(self, model: 'Model', delta: np.ndarray, errors: dict, update: bool, copy_delta: bool) -> None:
+        self.model = model
+        self.delta = delta
+        self.errors = errors
+        self.update = update
+        self.copy_delta = copy_delta
+        self.reg_terms = [0] * len(model.layers)
+
+    def __call__(self, item: tuple) -> tuple:
+        i, layer = item
+        start_time = time.time()
+
+        if id(layer) in self.errors:
+            dW, db = layer.dfa_projected(self.errors[id(layer)])
+        elif self.copy_delta and getattr(layer, 'last_layer', False):
+            # the last layer may modify the error in place, which is shared with all other layers
+            dW, db = layer.dfa(self.delta.copy())
+        else:
+            dW, db = layer.dfa(self.delta)
+
+        if self.update:
+            if self.model.regularization > 0 and layer.has_weights():
+                dW += self.model.regularization * layer.W
+                self.reg_terms[i] = squared_sum(layer.W.reshape(-1), self.model.accumulate_dtype)
+            layer = UpdateLayer(self.model.optimizer)((layer, dW, db))
+
+        self.model.statistics['layer_backward_time'][i] += time.time() - start_time
+        return layer, dW, db
+
+
 class Model(object):
     def __init__(
             self,
             layers: Iterable[Layer],
             num_classes: int,
-            loss: Loss=SoftmaxCrossEntropyLoss(),
+            loss: Loss=None,
             optimizer: Optimizer=GDOptimizer(),
             lr_decay: float=0,
             lr_decay_interval: int=0,
             regularization: float=0,
+            fused_feedback: bool=False,
+            num_workers: int=0,
+            parallel_update: bool=False,
+            dtype: type=np.float64,
+            accumulate_dtype: type=np.float64,
+            eval_batch_size: int=1000,
     ) -> None:
         self.layers = layers
         self.num_classes = num_classes
@@ -39,7 +84,23 @@ class Model(object):
         self.lr_decay = lr_decay
         self.lr_decay_interval = lr_decay_interval
         self.regularization = regularization
-        self.loss = loss
+        # the default loss reports in the accumulate_dtype of the model
+        self.loss = loss if loss is not None else SoftmaxCrossEntropyLoss(accumulate_dtype)
+        self.fused_feedback = fused_feedback
+        self.B = None
+        self.fused_layers = []
+        self.num_workers = num_workers
+        self.parallel_update = parallel_update
+        self.dtype = dtype
+        self.accumulate_dtype = accumulate_dtype
+        self.eval_batch_size = eval_batch_size
+        self.input_size = None
+        self.method = None
+        # contiguous parameters of all layers during training, created by train
+        self.arena = None
+        # inference engine of cost and predict, created on first use
+        self.engine = None
+        self.engine_key = None
         self.statistics = {}
         self.__init_statistics()
 
@@ -50,57 +111,115 @@ class Model(object):
             'backward_time': 0,
             'update_time': 0,
             'total_time': 0,
+            'data_time': 0,
+            'layer_backward_time': [],
             'train_loss': [],
             'train_accuracy': [],
             'valid_step': [],
             'valid_loss': [],
             'valid_accuracy': [],
+            'valid_subset_step': [],
+            'valid_subset_loss': [],
+            'valid_subset_accuracy': [],
+            'stop_reason': None,
+            'stop_epoch': None,
+            'best_epoch': None,
         }
 
-    def cost(self, X, y):
-        n = X.shape[0]
-
-        """ forward pass """
+    def __fuse_feedback(self):
+        """ concatenate the feedback weights of all hidden layers into one contiguous buffer (num_classes, sum of
+        layer widths) and replace each layer's B by a view of its slice, so that the error can be projected with a
+        single matrix multiplication """
+        self.fused_layers = []
+        width = 0
         for layer in self.layers:
-            X = layer.forward(X)
+            if layer.has_weights() and not getattr(layer, 'last_layer', False) and getattr(layer, 'B', None) is not None:
+                size = layer.B.size // self.num_classes
+                self.fused_layers.append((layer, width, width + size))
+                width += size
+
+        self.B = np.empty((self.num_classes, width), dtype=self.dtype)
+        for layer, start, end in self.fused_layers:
+            self.B[:, start:end] = layer.B.reshape((self.num_classes, -1))
+            layer.B = self.B[:, start:end].reshape(layer.B.shape)
+
+    def __engine(self, X: np.ndarray, batch_size: int=None) -> 'InferenceEngine':
+        """ the inference engine of cost and predict. It is kept between the calls, so its output buffers are reused
+        and the caches of the layers used for training are not touched, and is rebuilt if the layers, the input size,
+        the dtype or the batch size change """
+        batch_size = batch_size or self.eval_batch_size or X.shape[0]
+        key = (tuple(id(layer) for layer in self.layers), self.input_size, np.dtype(self.dtype), batch_size)
+        if self.engine is None or self.engine_key != key:
+            self.engine = self.compile_inference(batch_size)
+            self.engine_key = key
+        return self.engine
+
+    def cost(self, X, y, batch_size: int=None):
+        n = X.shape[0]
 
-        """ loss """
-        loss, _ = self.loss.calculate(X, y)
-        accuracy = (np.argmax(X, axis=1) == y).sum() / y.shape[0]
+        """ forward pass and loss, accumulated over chunks """
+        total_loss = 0
+        correct = 0
+        for start, end, out in self.__engine(X, batch_size).chunks(X):
+            chunk_loss, _, chunk_correct = self.loss.evaluate(out, y[start:end], gradient=False)
+            total_loss += chunk_loss * (end - start)
+            correct += chunk_correct
+        loss = total_loss / n
+        accuracy = correct / n
 
         """ regularization (L2) """
         if self.regularization > 0:
             total_weights = 0
             for layer in self.layers:
                 if layer.has_weights():
-                    total_weights += np.sum(np.square(layer.W))
+                    total_weights += squared_sum(layer.W.reshape(-1), self.accumulate_dtype)
             loss += (total_weights * self.regularization / 2.) / n
 
         return loss, accuracy
 
-    def predict(self, X):
+    def predict(self, X, batch_size: int=None):
+        predictions = np.empty(X.shape[0], dtype=int)
+        for start, end, out in self.__engine(X, batch_size).chunks(X):
+            predictions[start:end] = np.argmax(out, axis=1)
+        return predictions
+
+    def compile_inference(self, batch_size: int=None) -> 'InferenceEngine':
+        """ returns an inference engine for the current layers, which computes logits and class ids without
+        keeping any training caches alive """
+        from network.inference import InferenceEngine
+        if self.input_size is None:
+            raise ValueError("Model has to be trained or loaded before it can be compiled for inference")
+        return InferenceEngine(self.layers, self.input_size, self.dtype, batch_size or self.eval_batch_size or 1000)
+
+    def __train_loss(self, x, y, rng_state: tuple):
+        """ loss of a forward pass in train mode, the dropout masks are drawn from rng_state """
+        np.random.set_state(rng_state)
         for layer in self.layers:
-            X = layer.forward(X, mode='train')
-        return np.argmax(X, axis=1)
+            x = layer.forward(x, mode='train')
+        return self.loss.evaluate(x, y, gradient=False)[0]
 
-    def gradient_check(self, x, y):
-        x_in = x
+    def gradient_check(self, x, y, epsilon: float=1e-4) -> list:
+        """ compares the bp weight gradients of all layers with central differences of the loss (without
+        regularization). Every forward pass draws the same dropout masks, so layers with dropout are checked as well.
+        Returns the relative differences per layer with weights, from the last to the first layer """
+        x = x.astype(self.dtype, copy=False)
+        rng_state = np.random.get_state()
 
         """ forward pass """
+        out = x
         for layer in self.layers:
-            x = layer.forward(x, mode='train')
+            out = layer.forward(out, mode='train')
 
         """ loss """
-        loss, delta = self.loss.calculate(x, y)
+        _, delta, _ = self.loss.evaluate(out, y)
 
         """ check gradients pass """
-        # FIXME: hacky hack hack!
+        differences = []
         dX = delta
-        epsilon = 0.0001
         for layer in reversed(self.layers):
             dX, dW, _ = layer.back_prob(dX)
             if layer.has_weights():
-                W_orig = layer.W.copy()
+                W_orig = layer.W
                 W_unrolled = np.reshape(layer.W, -1)
                 dW_unrolled = dW.reshape(-1)
                 dW_approx = np.zeros(dW_unrolled.shape)
@@ -108,17 +227,41 @@ class Model(object):
                     wPlus = W_unrolled.copy()
                     wPlus[i] += epsilon
                     layer.W = wPlus.reshape(W_orig.shape)
-                    costPlus, _ = self.cost(x_in, y)
+                    costPlus = self.__train_loss(x, y, rng_state)
                     wMinus = W_unrolled.copy()
                     wMinus[i] -= epsilon
                     layer.W = wMinus.reshape(W_orig.shape)
-                    costMinus, _ = self.cost(x_in, y)
+                    costMinus = self.__train_loss(x, y, rng_state)
                     dW_approx[i] = (costPlus - costMinus) / (2. * epsilon)
                 layer.W = W_orig
                 diff = np.linalg.norm(dW_approx - dW_unrolled)/np.linalg.norm(dW_approx + dW_unrolled)
+                differences.append(diff)
                 print("layer '{}', relative difference: {}".format(type(layer), diff))
+        return differences
 
-    def train(self, data_set: DataSet, method: str, num_passes: int=20, batch_size: int=128, verbose: bool=True):
+    def initialize(self, input_size: tuple, method: str, draw_weights: bool=True) -> None:
+        """ initializes the layers for inputs of shape input_size and the train method, used by every trainer. With
+        draw_weights=False the weights are only allocated, for loading them afterwards """
+        self.input_size = input_size
+        self.method = method
+        for layer in self.layers:
+            input_size = layer.initialize(input_size, self.num_classes, method, self.dtype, draw_weights)
+            layer.reset_params()
+
+        if method == 'dfa' and self.fused_feedback:
+            self.__fuse_feedback()
+
+    def train(self, data_set: DataSet, method: str, num_passes: int=20, batch_size: int=128, verbose: bool=True,
+              checkpoint: str=None, checkpoint_interval: int=0, batch_loader: data.BatchLoader=None,
+              schedulers: list=None, early_stopping: EarlyStopping=None, validation: ValidationPolicy=None):
+        """ if checkpoint is given and exists, training is resumed from it. With checkpoint_interval > 0 a checkpoint
+        is written every checkpoint_interval steps in the background. If a batch_loader is given, the mini-batches
+        are taken from it (converted to the model's dtype) instead of data.mini_batches. The schedulers (see
+        network.schedule) adapt the learning rate on top of lr_decay, early_stopping may end the training before
+        num_passes, the reason and epoch are recorded in statistics['stop_reason'] and statistics['stop_epoch'].
+        validation decides when and how the model is validated (see network.validation), by default on the full
+        validation set after every epoch. The schedulers and early_stopping see the full validations only, the
+        validations on a subset are logged as valid_subset_step, valid_subset_loss and valid_subset_accuracy """
 
         if verbose:
             print(
@@ -131,98 +274,336 @@ class Model(object):
 
         X_train, y_train = data_set.train_set()
         X_valid, y_valid = data_set.validation_set()
+        if batch_loader is None:
+            X_train = X_train.astype(self.dtype, copy=False)
 
         """ initalize layers """
-        input_size = X_train[0].shape
-        for layer in self.layers:
-            input_size = layer.initialize(input_size, self.num_classes, method)
-            layer.reset_params()
-
-        step = 0
-        for epoch in range(num_passes):
-
-            """ decay learning rate if necessary """
-            if self.lr_decay > 0 and epoch > 0 and (epoch % self.lr_decay_interval) == 0:
-                self.optimizer.decay_learning_rate(self.lr_decay)
-                if verbose:
-                    print("Decreased learning rate by {}".format(self.lr_decay))
-
-            for batch in data.mini_batches(X_train, y_train, batch_size):
-                X_batch, y_batch = batch
-
-                """ forward pass """
-                start_forward_time = time.time()
-                for layer in self.layers:
-                    X_batch = layer.forward(X_batch, mode='train')
-                self.statistics['forward_time'] += time.time() - start_forward_time
-
-                """ loss """
-                loss, delta = self.loss.calculate(X_batch, y_batch)
-
-                """ backward pass """
-                gradients = []
-                start_backward_time = time.time()
-                if method == 'dfa':
-                    for layer in self.layers:
-                        dW, db = layer.dfa(delta)
-                        gradients.append((layer, dW, db))
-                elif method == 'bp':
-                    dX = delta
-                    for layer in reversed(self.layers):
-                        dX, dW, db = layer.back_prob(dX)
-                        gradients.append((layer, dW, db))
-                    gradients.reverse()
+        position = None
+        if checkpoint is not None and os.path.exists(checkpoint):
+            position = self.load(checkpoint)
+            if self.method != method:
+                raise ValueError("Checkpoint '{}' can not be resumed with train method '{}'".format(checkpoint, method))
+            if verbose and position is not None:
+                print("Resumed from checkpoint '{}' at epoch {}, step {}".format(checkpoint, position['epoch'], position['step']))
+        else:
+            self.initialize(X_train[0].shape, method)
+        self.arena = ParameterArena(self.layers, self.dtype)
+
+        """ schedulers and early stopping continue from the state in the checkpoint, the learning rate of the optimizer
+        already includes the factors of the schedulers """
+        schedulers = schedulers or []
+        saved = None if position is None else position.get('schedulers')
+        if saved is not None and len(saved) != len(schedulers):
+            raise ValueError("Checkpoint '{}' was written with {} schedulers, not {}".format(
+                checkpoint, len(saved), len(schedulers)))
+        for i, scheduler in enumerate(schedulers):
+            if saved is None:
+                scheduler.start(self.optimizer)
+            else:
+                scheduler.set_state(saved[i])
+        if early_stopping is not None:
+            if position is None or position.get('early_stopping') is None:
+                early_stopping.start(self)
+            else:
+                early_stopping.set_state(position['early_stopping'],
+                                         position['arrays'].get('early_stopping/best_params'))
+        # the reason to stop and the epoch it refers to (of the validation that triggered it)
+        stop_reason, stop_epoch = None, None
+        validation = validation or ValidationPolicy()
+
+        writer = None
+        executor = None
+        batches = None
+        try:
+            if checkpoint is not None and checkpoint_interval > 0:
+                writer = ckpt.CheckpointWriter()
+
+            self.statistics['layer_backward_time'] = [0] * len(self.layers)
+
+            """ dfa gradients of different layers are independent, they can be computed in parallel """
+            if method == 'dfa' and self.num_workers > 1:
+                executor = ThreadPoolExecutor(max_workers=self.num_workers)
+            updated = False
+            delta = None
+
+            validation.start(self, X_valid, y_valid)
+
+            step = 0 if position is None else position['step']
+            for epoch in range(0 if position is None else position['epoch'], num_passes):
+                resumed = position is not None and epoch == position['epoch']
+
+                """ decay learning rate if necessary """
+                if self.lr_decay > 0 and epoch > 0 and (epoch % self.lr_decay_interval) == 0 and not resumed:
+                    self.optimizer.decay_learning_rate(self.lr_decay)
+                    if verbose:
+                        print("Decreased learning rate by {}".format(self.lr_decay))
+
+                """ the shuffling of an interrupted epoch is reproduced from the rng state at its start """
+                epoch_rng_state = position['epoch_rng_state'] if resumed else np.random.get_state()
+                np.random.set_state(epoch_rng_state)
+                if batch_loader is None:
+                    batches = data.mini_batches(X_train, y_train, batch_size)
                 else:
-                    raise ValueError("Invalid train method '{}'".format(method))
-                self.statistics['backward_time'] += time.time() - start_backward_time
-
-                """ regularization (L2) """
-                start_regularization_time = time.time()
-                if self.regularization > 0:
-                    reg_term = 0
-                    for layer, dW, db in gradients:
-                        if layer.has_weights():
-                            dW += self.regularization * layer.W
-                            reg_term += np.sum(np.square(layer.W))
-                    reg_term *= self.regularization / 2.
-                    reg_term /= y_batch.shape[0]
-                    loss += reg_term
-                self.statistics['regularization_time'] += time.time() - start_regularization_time
-
-                """ update """
-                start_update_time = time.time()
-                update = UpdateLayer(self.optimizer)
-                self.layers = [update(x) for x in gradients]
-                self.statistics['update_time'] += time.time() - start_update_time
-
-                """ log statistics """
-                accuracy = (np.argmax(X_batch, axis=1) == y_batch).sum() / y_batch.shape[0]
-                self.statistics['train_loss'].append(loss)
-                self.statistics['train_accuracy'].append(accuracy)
-
-                if (step % 10) == 0 and verbose:
-                    print("epoch {}, step {}, loss = {:07.5f}, accuracy = {}".format(epoch, step, loss, accuracy))
-
-                step += 1
-
-            """ log statistics """
-            valid_loss, valid_accuracy = self.cost(X_valid, y_valid)
-            self.statistics['valid_step'].append(step)
-            self.statistics['valid_loss'].append(valid_loss)
-            self.statistics['valid_accuracy'].append(valid_accuracy)
-
+                    batches = batch_loader.batches(X_train, y_train, batch_size, dtype=self.dtype)
+                batch_index = 0
+                if resumed:
+                    for _ in range(position['batch']):
+                        next(batches)
+                    batch_index = position['batch']
+                    np.random.set_state(position['rng_state'])
+
+                start_data_time = time.time()
+                for batch in batches:
+                    X_batch, y_batch = batch
+                    self.statistics['data_time'] += time.time() - start_data_time
+
+                    """ forward pass """
+                    start_forward_time = time.time()
+                    for layer in self.layers:
+                        X_batch = layer.forward(X_batch, mode='train')
+                    self.statistics['forward_time'] += time.time() - start_forward_time
+
+                    """ loss """
+                    # the gradient buffer of the previous step is not referenced anymore and can be reused
+                    loss, delta, correct = self.loss.evaluate(X_batch, y_batch, out=delta)
+
+                    """ backward pass """
+                    gradients = []
+                    start_backward_time = time.time()
+                    if method == 'dfa':
+                        errors = {}
+                        if self.fused_feedback:
+                            E = delta.dot(self.B)
+                            errors = {id(layer): E[:, start:end] for layer, start, end in self.fused_layers}
+                        updated = executor is not None and self.parallel_update
+                        backward = DFALayer(self, delta, errors, update=updated, copy_delta=executor is not None)
+                        if executor is None:
+                            gradients = [backward(x) for x in enumerate(self.layers)]
+                        else:
+                            gradients = list(executor.map(backward, enumerate(self.layers)))
+                        if updated:
+                            self.layers = [layer for layer, _, _ in gradients]
+                            if self.regularization > 0:
+                                loss += sum(backward.reg_terms) * self.regularization / 2. / y_batch.shape[0]
+                        else:
+                            self.arena.set_gradients(gradients)
+                    elif method == 'bp':
+                        dX = delta
+                        for layer in reversed(self.layers):
+                            dX, dW, db = layer.back_prob(dX)
+                            gradients.append((layer, dW, db))
+                        self.arena.set_gradients(gradients)
+                    else:
+                        raise ValueError("Invalid train method '{}'".format(method))
+                    self.statistics['backward_time'] += time.time() - start_backward_time
+
+                    """ regularization (L2) """
+                    start_regularization_time = time.time()
+                    if self.regularization > 0 and not updated:
+                        self.arena.regularize(self.regularization)
+                        reg_term = self.arena.squared_weights(self.accumulate_dtype)
+                        reg_term *= self.regularization / 2.
+                        reg_term /= y_batch.shape[0]
+                        loss += reg_term
+                    self.statistics['regularization_time'] += time.time() - start_regularization_time
+
+                    """ update """
+                    start_update_time = time.time()
+                    if not updated:
+                        self.optimizer.update_arena(self.arena)
+                    self.statistics['update_time'] += time.time() - start_update_time
+
+                    """ log statistics """
+                    accuracy = correct / y_batch.shape[0]
+                    self.statistics['train_loss'].append(loss)
+                    self.statistics['train_accuracy'].append(accuracy)
+
+                    if (step % 10) == 0 and verbose:
+                        print("epoch {}, step {}, loss = {:07.5f}, accuracy = {}".format(epoch, step, loss, accuracy))
+
+                    """ schedules and divergence """
+                    for scheduler in schedulers:
+                        scheduler.on_step(self.optimizer, step, self.statistics)
+                    if early_stopping is not None:
+                        stop_reason, stop_epoch = early_stopping.on_step(self, step, self.statistics), epoch
+
+                    step += 1
+                    batch_index += 1
+
+                    if stop_reason is None:
+                        for result in validation.on_step(step, epoch):
+                            if stop_reason is None:
+                                stop_reason = self.__validated(result, schedulers, early_stopping, verbose)
+                                stop_epoch = result.epoch
+
+                    if writer is not None and (step % checkpoint_interval) == 0:
+                        arrays, state = self.__checkpoint(copy=True)
+                        state['position'] = {
+                            'epoch': epoch,
+                            'batch': batch_index,
+                            'step': step,
+                            'epoch_rng_state': epoch_rng_state,
+                            'rng_state': np.random.get_state(),
+                            'schedulers': [scheduler.state() for scheduler in schedulers],
+                            'early_stopping': None if early_stopping is None else early_stopping.state(),
+                        }
+                        if early_stopping is not None and early_stopping.best_params is not None:
+                            # best_params is replaced, never modified, it can be written in the background
+                            arrays['train/early_stopping/best_params'] = early_stopping.best_params
+                        writer.write(checkpoint, arrays, state)
+
+                    if stop_reason is not None:
+                        break
+
+                    start_data_time = time.time()
+
+                # stops the prefetching of the batch loader if the epoch has been left early
+                batches.close()
+
+                if stop_reason is None:
+                    for result in validation.on_epoch(step, epoch, last=epoch == num_passes - 1):
+                        if stop_reason is None:
+                            stop_reason = self.__validated(result, schedulers, early_stopping, verbose)
+                            stop_epoch = result.epoch
+
+                if stop_reason is not None:
+                    break
+
+            """ outstanding asynchronous validations """
+            for result in validation.finish():
+                if stop_reason is None:
+                    stop_reason = self.__validated(result, schedulers, early_stopping, verbose)
+                    stop_epoch = result.epoch
+        finally:
+            # also when training is stopped early or fails: the prefetching thread of the batch loader, the
+            # thread pools and the checkpoint writer are shut down
+            if batches is not None:
+                batches.close()
+            validation.close()
+            if executor is not None:
+                executor.shutdown()
+            if writer is not None:
+                writer.close()
+
+        if stop_reason is not None:
+            self.statistics['stop_reason'] = stop_reason
+            self.statistics['stop_epoch'] = stop_epoch
             if verbose:
-                print("validation after epoch {}: loss = {:07.5f}, accuracy = {}".format(epoch, valid_loss, valid_accuracy))
+                print("Stopped training after epoch {}: {}".format(stop_epoch, stop_reason))
+
+        if early_stopping is not None:
+            early_stopping.restore(self)
+            self.statistics['best_epoch'] = early_stopping.best_epoch
 
         self.statistics['total_time'] = time.time() - start_total_time
         return self.statistics
 
-    @staticmethod
-    def store(self, model: 'Model', file_name: str) -> None:
-        # TODO
-        pass
+    def __validated(self, result: ValidationResult, schedulers: list, early_stopping: EarlyStopping,
+                    verbose: bool) -> str:
+        """ logs a validation result, full validations drive the schedulers and early stopping. Returns the reason
+        to stop or None """
+        prefix = 'valid_subset_' if result.subset else 'valid_'
+        self.statistics[prefix + 'step'].append(result.step)
+        self.statistics[prefix + 'loss'].append(result.loss)
+        self.statistics[prefix + 'accuracy'].append(result.accuracy)
+        if result.subset:
+            if verbose:
+                print("validation on subset after step {}: loss = {:07.5f}, accuracy = {}".format(
+                    result.step, result.loss, result.accuracy))
+            return None
 
-    @staticmethod
-    def load(self, file_name: str) -> 'Model':
-        # TODO
-        pass
\ No newline at end of file
+        if verbose:
+            print("validation after epoch {}: loss = {:07.5f}, accuracy = {}".format(result.epoch, result.loss, result.accuracy))
+
+        """ schedules and early stopping """
+        for scheduler in schedulers:
+            scheduler.on_epoch(self.optimizer, result.epoch, self.statistics)
+        if early_stopping is not None:
+            return early_stopping.on_epoch(self, result.epoch, self.statistics, params=result.params)
+        return None
+
+    def __checkpoint(self, copy: bool) -> tuple:
+        """ collects weights, feedback weights and optimizer state of all layers """
+        arrays = {}
+        params = []
+        for i, layer in enumerate(self.layers):
+            for name in ('W', 'b', 'B'):
+                if isinstance(getattr(layer, name, None), np.ndarray):
+                    arrays['{}/{}'.format(i, name)] = getattr(layer, name)
+            if getattr(layer, 'feedback', None) is not None:
+                for name, value in layer.feedback.arrays().items():
+                    arrays['{}/feedback/{}'.format(i, name)] = value
+            layer_params = {}
+            for key, value in layer.get_params().items():
+                if isinstance(value, tuple):
+                    layer_params[key] = len(value)
+                    for j, v in enumerate(value):
+                        arrays['{}/params/{}/{}'.format(i, key, j)] = v
+                elif isinstance(value, np.ndarray):
+                    layer_params[key] = None
+                    arrays['{}/params/{}'.format(i, key)] = value
+            params.append(layer_params)
+
+        if copy:
+            arrays = {key: np.array(value) for key, value in arrays.items()}
+
+        state = {
+            'input_size': self.input_size,
+            'method': self.method,
+            'dtype': np.dtype(self.dtype).str,
+            'params': params,
+            'optimizer': {key: value for key, value in vars(self.optimizer).items() if np.isscalar(value)},
+            'statistics': self.statistics,
+            'rng_state': np.random.get_state(),
+            'position': None,
+        }
+        if copy:
+            state['statistics'] = {key: list(value) if isinstance(value, list) else value
+                                   for key, value in self.statistics.items()}
+        return arrays, state
+
+    def store(self, file_name: str) -> None:
+        """ stores the trained model, it can be restored into a model with the same layer configuration """
+        arrays, state = self.__checkpoint(copy=False)
+        ckpt.save(file_name, arrays, state)
+
+    def load(self, file_name: str) -> dict:
+        """ restores a checkpoint written by store or during training, the weights are memory-mapped from the file.
+        Returns the training position stored in the checkpoint (None if it was written by store), with the further
+        arrays of the training state (stored with the prefix 'train/') in position['arrays'] """
+        arrays, state = ckpt.load(file_name)
+
+        self.dtype = np.dtype(state['dtype']).type
+        # the weights are replaced by the arrays of the checkpoint, there is no need to draw them
+        self.initialize(state['input_size'], state['method'], draw_weights=False)
+
+        fused = {id(layer) for layer, _, _ in self.fused_layers} if self.fused_feedback else set()
+        for i, layer in enumerate(self.layers):
+            for name in ('W', 'b', 'B'):
+                key = '{}/{}'.format(i, name)
+                if key in arrays:
+                    if name == 'B' and id(layer) in fused:
+                        # keep the fused feedback buffer, only copy the values
+                        layer.B[...] = arrays[key]
+                    else:
+                        setattr(layer, name, arrays[key])
+            if getattr(layer, 'feedback', None) is not None:
+                prefix = '{}/feedback/'.format(i)
+                layer.feedback.set_arrays({key[len(prefix):]: value for key, value in arrays.items()
+                                           if key.startswith(prefix)})
+            for key, size in state['params'][i].items():
+                if size is None:
+                    layer.set_param(key, arrays['{}/params/{}'.format(i, key)])
+                else:
+                    layer.set_param(key, tuple(arrays['{}/params/{}/{}'.format(i, key, j)] for j in range(size)))
+
+        for key, value in state['optimizer'].items():
+            setattr(self.optimizer, key, value)
+        self.statistics = state['statistics']
+        np.random.set_state(state['rng_state'])
+
+        position = state['position']
+        if position is not None:
+            position = dict(position, arrays={key[len('train/'):]: value for key, value in arrays.items()
+                                              if key.startswith('train/')})
+        return position
\ No newline at end of file
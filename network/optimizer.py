@@ -1,13 +1,82 @@
 import numpy as np
 import numba as nb
 
+from network.arena import ParameterArena
 from network.layer import Layer
 
+"""
+The update kernels work on flat arrays and read every gradient element once, updating the optimizer state and the
+parameter in the same pass. They are applied to W and b of a single layer by update, or to the flat buffers of all
+layers at once by update_arena. Scalars are passed in the dtype of the parameters, so float32 models are updated in
+float32 arithmetic.
+"""
+
+
+@nb.njit(parallel=True, cache=True)
+def momentum_kernel(w, g, v, lr, mu):
+    for i in nb.prange(w.shape[0]):
+        v[i] = mu * v[i] - lr * g[i]
+        w[i] += v[i]
+
+
+@nb.njit(parallel=True, cache=True)
+def nesterov_kernel(w, g, v, lr, mu):
+    for i in nb.prange(w.shape[0]):
+        v_prev = v[i]
+        v[i] = mu * v[i] - lr * g[i]
+        w[i] += (1 + mu) * v[i] - mu * v_prev
+
+
+@nb.njit(parallel=True, cache=True)
+def rmsprop_kernel(w, g, s, lr, rho, eps):
+    for i in nb.prange(w.shape[0]):
+        s[i] = rho * s[i] + (1 - rho) * g[i] * g[i]
+        w[i] -= lr * g[i] / (np.sqrt(s[i]) + eps)
+
+
+@nb.njit(parallel=True, cache=True)
+def adam_kernel(w, g, m, v, lr, beta1, beta2, eps, c1, c2, weight_decay):
+    """ c1, c2: bias corrections 1 / (1 - beta ** t) of the first and second moment """
+    for i in nb.prange(w.shape[0]):
+        m[i] = beta1 * m[i] + (1 - beta1) * g[i]
+        v[i] = beta2 * v[i] + (1 - beta2) * g[i] * g[i]
+        w[i] -= lr * (m[i] * c1 / (np.sqrt(v[i] * c2) + eps) + weight_decay * w[i])
+
+
+def _flat(x: np.ndarray) -> np.ndarray:
+    """ flat view of a parameter or state array, which is updated in place """
+    assert x.flags.c_contiguous, "parameters and optimizer state have to be contiguous"
+    return x.reshape(-1)
+
+
+def _state(layer: Layer, key: str) -> tuple:
+    """ the (W, b) optimizer state key of layer, zero initialized """
+    state = layer.get_param(key)
+    if state is None:
+        state = (np.zeros_like(layer.W), np.zeros_like(layer.b))
+        layer.set_param(key, state)
+    return state
+
+
+def _step(layer: Layer) -> int:
+    """ counts the updates of layer, kept as array so that it is stored in checkpoints """
+    step = layer.get_param('step')
+    if step is None:
+        step = np.zeros(1, dtype=np.int64)
+        layer.set_param('step', step)
+    step += 1
+    return int(step[0])
+
 
 class Optimizer(object):
     def update(self, layer: Layer, dW: np.ndarray, db: np.ndarray) -> Layer:
         pass
 
+    def update_arena(self, arena: ParameterArena) -> None:
+        """ updates all layers of the arena with the gradients in arena.grads, which may be modified """
+        for layer, dW, db in arena.gradients():
+            self.update(layer, dW, db)
+
     def decay_learning_rate(self, factor: float) -> None:
         pass
 
@@ -23,6 +92,10 @@ class GDOptimizer(Optimizer):
 
         return layer
 
+    def update_arena(self, arena: ParameterArena) -> None:
+        arena.grads *= -self.lr
+        arena.params += arena.grads
+
     def decay_learning_rate(self, factor: float) -> None:
         self.lr *= factor
 
@@ -33,33 +106,109 @@ class GDMomentumOptimizer(Optimizer):
         self.mu = mu
 
     def update(self, layer: Layer, dW: np.ndarray, db: np.ndarray) -> Layer:
+        for w, g, v in zip((layer.W, layer.b), (dW, db), _state(layer, 'mv')):
+            self.__update(w, g, v)
+        return layer
+
+    def update_arena(self, arena: ParameterArena) -> None:
+        self.__update(arena.params, arena.grads, arena.state('mv'))
+
+    def __update(self, w: np.ndarray, g: np.ndarray, v: np.ndarray) -> None:
+        # v = mu * v - lr * g, w += v
+        dtype = w.dtype.type
+        momentum_kernel(_flat(w), _flat(np.ascontiguousarray(g)), _flat(v), dtype(self.lr), dtype(self.mu))
+
+    def decay_learning_rate(self, factor: float) -> None:
+        self.lr *= factor
+
+
+class NesterovOptimizer(Optimizer):
+    def __init__(self, lr: float=0.001, mu: float=0.9) -> None:
+        self.lr = lr
+        self.mu = mu
+
+    def update(self, layer: Layer, dW: np.ndarray, db: np.ndarray) -> Layer:
+        for w, g, v in zip((layer.W, layer.b), (dW, db), _state(layer, 'mv')):
+            self.__update(w, g, v)
+        return layer
 
-        mv = layer.get_param('mv')
+    def update_arena(self, arena: ParameterArena) -> None:
+        self.__update(arena.params, arena.grads, arena.state('mv'))
 
-        if mv is None:
-            mv = (np.zeros(dW.shape), np.zeros(db.shape))
-            layer.set_param('mv', mv)
+    def __update(self, w: np.ndarray, g: np.ndarray, v: np.ndarray) -> None:
+        # v = mu * v - lr * g, w += (1 + mu) * v - mu * v_prev (the momentum step is looked ahead)
+        dtype = w.dtype.type
+        nesterov_kernel(_flat(w), _flat(np.ascontiguousarray(g)), _flat(v), dtype(self.lr), dtype(self.mu))
 
-        # v_dW, v_db = mv#
-        # v_dW = self.mu * v_dW - self.lr * dW
-        # v_db = self.mu * v_db - self.lr * db
+    def decay_learning_rate(self, factor: float) -> None:
+        self.lr *= factor
 
-        v_dW, v_db = mv
 
-        dW *= self.lr
-        db *= self.lr
+class RMSPropOptimizer(Optimizer):
+    def __init__(self, lr: float=0.001, rho: float=0.9, eps: float=1e-8) -> None:
+        self.lr = lr
+        self.rho = rho
+        self.eps = eps
 
-        v_dW *= self.mu
-        v_dW -= dW
-        v_db *= self.mu
-        v_db -= db
+    def update(self, layer: Layer, dW: np.ndarray, db: np.ndarray) -> Layer:
+        for w, g, s in zip((layer.W, layer.b), (dW, db), _state(layer, 'ms')):
+            self.__update(w, g, s)
+        return layer
+
+    def update_arena(self, arena: ParameterArena) -> None:
+        self.__update(arena.params, arena.grads, arena.state('ms'))
+
+    def __update(self, w: np.ndarray, g: np.ndarray, s: np.ndarray) -> None:
+        # s = rho * s + (1 - rho) * g^2, w -= lr * g / (sqrt(s) + eps)
+        dtype = w.dtype.type
+        rmsprop_kernel(_flat(w), _flat(np.ascontiguousarray(g)), _flat(s), dtype(self.lr), dtype(self.rho),
+                       dtype(self.eps))
 
-        layer.W += v_dW
-        layer.b += v_db
+    def decay_learning_rate(self, factor: float) -> None:
+        self.lr *= factor
 
-        layer.set_param('mv', (v_dW, v_db))
 
+class AdamOptimizer(Optimizer):
+    def __init__(self, lr: float=0.001, beta1: float=0.9, beta2: float=0.999, eps: float=1e-8) -> None:
+        self.lr = lr
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        # decoupled weight decay (see AdamWOptimizer), only applied to the weights
+        self.weight_decay = 0.
+
+    def update(self, layer: Layer, dW: np.ndarray, db: np.ndarray) -> Layer:
+        t = _step(layer)
+        m_W, m_b = _state(layer, 'm1')
+        v_W, v_b = _state(layer, 'm2')
+        self.__update(layer.W, dW, m_W, v_W, t, self.weight_decay)
+        self.__update(layer.b, db, m_b, v_b, t, 0.)
         return layer
 
+    def update_arena(self, arena: ParameterArena) -> None:
+        # all layers of the arena are updated together, their step counts agree
+        t = max([_step(layer) for layer in arena.layers], default=1)
+        m, v = arena.state('m1'), arena.state('m2')
+        n = arena.num_weights
+        self.__update(arena.params[:n], arena.grads[:n], m[:n], v[:n], t, self.weight_decay)
+        self.__update(arena.params[n:], arena.grads[n:], m[n:], v[n:], t, 0.)
+
+    def __update(self, w: np.ndarray, g: np.ndarray, m: np.ndarray, v: np.ndarray, t: int,
+                 weight_decay: float) -> None:
+        # m = beta1 * m + (1 - beta1) * g, v = beta2 * v + (1 - beta2) * g^2,
+        # w -= lr * (m_hat / (sqrt(v_hat) + eps) + weight_decay * w) with the bias corrected moments m_hat, v_hat
+        dtype = w.dtype.type
+        adam_kernel(_flat(w), _flat(np.ascontiguousarray(g)), _flat(m), _flat(v), dtype(self.lr), dtype(self.beta1),
+                    dtype(self.beta2), dtype(self.eps), dtype(1 / (1 - self.beta1 ** t)),
+                    dtype(1 / (1 - self.beta2 ** t)), dtype(weight_decay))
+
     def decay_learning_rate(self, factor: float) -> None:
         self.lr *= factor
+
+
+class AdamWOptimizer(AdamOptimizer):
+    """ Adam with weight decay decoupled from the gradient (Loshchilov & Hutter), use instead of L2 regularization """
+    def __init__(self, lr: float=0.001, beta1: float=0.9, beta2: float=0.999, eps: float=1e-8,
+                 weight_decay: float=0.01) -> None:
+        super().__init__(lr, beta1, beta2, eps)
+        self.weight_decay = weight_decay
@@ -0,0 +1,170 @@
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dataset.dataset import DataSet
+from network.arena import squared_sum
+from network.layer import Layer
+from network.model import Model, UpdateLayer
+from network.utils import data
+
+
+class LayerUpdate(object):
+    """ dfa gradient and update of a single layer for a single batch, computed on a snapshot of the layer taken right
+    after its forward pass """
+    def __init__(self, model: Model, layer: Layer, snapshot: Layer, delta: np.ndarray) -> None:
+        self.model = model
+        self.layer = layer
+        self.snapshot = snapshot
+        self.delta = delta
+
+    def __call__(self) -> tuple:
+        start_backward_time = time.time()
+        if getattr(self.layer, 'last_layer', False):
+            # the last layer may modify the error in place, which is shared with all other layers
+            dW, db = self.snapshot.dfa(self.delta.copy())
+        else:
+            dW, db = self.snapshot.dfa(self.delta)
+        backward_time = time.time() - start_backward_time
+
+        start_update_time = time.time()
+        if self.model.regularization > 0 and self.layer.has_weights():
+            dW += self.model.regularization * self.layer.W
+        UpdateLayer(self.model.optimizer)((self.layer, dW, db))
+        update_time = time.time() - start_update_time
+
+        return backward_time, update_time
+
+
+class PipelinedTrainer(object):
+    """
+    Trains a model with dfa while overlapping the layer updates of batch t - staleness with the forward pass of
+    batch t. Since the dfa update of a layer only depends on its own cached activations and the output error, the
+    update of layer k can run in the background as soon as the forward pass of the current batch has passed layer k.
+
+    The schedule is deterministic: the forward pass of batch t through layer k always sees exactly the updates of
+    batches 0 .. t - 1 - staleness. With staleness=0 training is equivalent to Model.train(method='dfa').
+    """
+    def __init__(self, model: Model, staleness: int=1, num_workers: int=None) -> None:
+        assert staleness >= 0, "staleness has to be non-negative"
+        self.model = model
+        self.staleness = staleness
+        self.num_workers = num_workers
+
+    def __flush(self, pending: list) -> None:
+        """ wait for all scheduled updates, the order per layer is preserved by __wait """
+        for k in range(len(pending)):
+            self.__wait(pending, k)
+
+    def __wait(self, pending: list, k: int) -> None:
+        future = pending[k]
+        if future is not None:
+            backward_time, update_time = future.result()
+            self.model.statistics['backward_time'] += backward_time
+            self.model.statistics['update_time'] += update_time
+            pending[k] = None
+
+    def train(self, data_set: DataSet, num_passes: int=20, batch_size: int=128, verbose: bool=True) -> dict:
+        model = self.model
+        layers = model.layers
+        s = self.staleness
+
+        if verbose:
+            print(
+                '\ntrain method: dfa (pipelined, staleness {})'.format(s),
+                '\nnum_passes: {}'.format(num_passes),
+                '\nbatch_size: {}\n'.format(batch_size)
+            )
+
+        start_total_time = time.time()
+
+        X_train, y_train = data_set.train_set()
+        X_valid, y_valid = data_set.validation_set()
+        X_train = X_train.astype(model.dtype, copy=False)
+
+        """ initalize layers """
+        model.initialize(X_train[0].shape, 'dfa')
+        for layer in layers:
+            # the snapshots of the batches in flight refer to the cached activations, which must not be overwritten
+            # by the forward passes in between
+            if hasattr(layer, 'num_buffer_sets'):
+                layer.num_buffer_sets = s + 1
+
+        executor = ThreadPoolExecutor(max_workers=self.num_workers or len(layers))
+        # per layer: the update that has been scheduled but not yet waited for
+        pending = [None] * len(layers)
+        # per batch in flight: (snapshots of all layers, output error)
+        in_flight = []
+
+        step = 0
+        for epoch in range(num_passes):
+
+            """ decay learning rate if necessary """
+            if model.lr_decay > 0 and epoch > 0 and (epoch % model.lr_decay_interval) == 0:
+                model.optimizer.decay_learning_rate(model.lr_decay)
+                if verbose:
+                    print("Decreased learning rate by {}".format(model.lr_decay))
+
+            for batch in data.mini_batches(X_train, y_train, batch_size):
+                X_batch, y_batch = batch
+
+                """ forward pass, interleaved with the updates of batch t - staleness """
+                oldest = in_flight[0] if len(in_flight) == s and s > 0 else None
+                snapshots = []
+                reg_term = 0
+                start_forward_time = time.time()
+                for k, layer in enumerate(layers):
+                    self.__wait(pending, k)
+                    X_batch = layer.forward(X_batch, mode='train')
+                    snapshots.append(copy.copy(layer))
+                    if model.regularization > 0 and layer.has_weights():
+                        reg_term += squared_sum(layer.W.reshape(-1), model.accumulate_dtype)
+                    if oldest is not None:
+                        pending[k] = executor.submit(LayerUpdate(model, layer, oldest[0][k], oldest[1]))
+                model.statistics['forward_time'] += time.time() - start_forward_time
+                if oldest is not None:
+                    in_flight.pop(0)
+
+                """ loss """
+                loss, delta, correct = model.loss.evaluate(X_batch, y_batch)
+                loss += reg_term * model.regularization / 2. / y_batch.shape[0]
+                in_flight.append((snapshots, delta))
+
+                if s == 0:
+                    snapshots, delta = in_flight.pop(0)
+                    for k, layer in enumerate(layers):
+                        pending[k] = executor.submit(LayerUpdate(model, layer, snapshots[k], delta))
+
+                """ log statistics """
+                accuracy = correct / y_batch.shape[0]
+                model.statistics['train_loss'].append(loss)
+                model.statistics['train_accuracy'].append(accuracy)
+
+                if (step % 10) == 0 and verbose:
+                    print("epoch {}, step {}, loss = {:07.5f}, accuracy = {}".format(epoch, step, loss, accuracy))
+
+                step += 1
+
+            """ apply all outstanding updates before validation """
+            while len(in_flight) > 0:
+                snapshots, delta = in_flight.pop(0)
+                for k, layer in enumerate(layers):
+                    self.__wait(pending, k)
+                    pending[k] = executor.submit(LayerUpdate(model, layer, snapshots[k], delta))
+            self.__flush(pending)
+
+            """ log statistics """
+            valid_loss, valid_accuracy = model.cost(X_valid, y_valid)
+            model.statistics['valid_step'].append(step)
+            model.statistics['valid_loss'].append(valid_loss)
+            model.statistics['valid_accuracy'].append(valid_accuracy)
+
+            if verbose:
+                print("validation after epoch {}: loss = {:07.5f}, accuracy = {}".format(epoch, valid_loss, valid_accuracy))
+
+        executor.shutdown()
+
+        model.statistics['total_time'] = time.time() - start_total_time
+        return model.statistics
@@ -0,0 +1,167 @@
+import numpy as np
+
+"""
+Learning rate schedulers and early stopping for Model.train. They are driven by the statistics of the model:
+train_loss after every step and valid_loss after the validation at the end of every epoch.
+
+A scheduler keeps a factor on the learning rate and changes the learning rate through
+Optimizer.decay_learning_rate(new factor / old factor), so several schedulers (and the step decay of the model) can
+be combined and their factors multiply. The factors are always positive.
+
+The state of the schedulers and early stopping is stored in the checkpoints of Model.train. When training is resumed
+it is restored instead of calling start, since the learning rate in the checkpoint already includes the factors.
+"""
+
+
+class Scheduler(object):
+    def __init__(self) -> None:
+        self.factor = 1.
+
+    def start(self, optimizer) -> None:
+        """ called before the first step """
+        self.factor = 1.
+
+    def on_step(self, optimizer, step: int, statistics: dict) -> None:
+        """ called after the update of step """
+        pass
+
+    def state(self) -> dict:
+        """ the picklable state for checkpoints """
+        return {'factor': self.factor}
+
+    def set_state(self, state: dict) -> None:
+        """ restores a state returned by state, the learning rate of the optimizer is not changed """
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def on_epoch(self, optimizer, epoch: int, statistics: dict) -> None:
+        """ called after the full validation of epoch """
+        pass
+
+    def _set_factor(self, optimizer, factor: float) -> None:
+        assert factor > 0, "learning rate factors have to be positive"
+        if factor != self.factor:
+            optimizer.decay_learning_rate(factor / self.factor)
+            self.factor = factor
+
+
+class ReduceOnPlateau(Scheduler):
+    """ multiplies the learning rate by factor when the validation loss has not improved by more than min_delta for
+    patience epochs, at most down to min_factor times the initial learning rate """
+    def __init__(self, factor: float=0.1, patience: int=2, min_delta: float=0., min_factor: float=1e-4) -> None:
+        super().__init__()
+        assert 0 < factor < 1, "factor has to be in (0, 1)"
+        self.reduce_factor = factor
+        self.patience = patience
+        self.min_delta = min_delta
+        self.min_factor = min_factor
+
+    def start(self, optimizer) -> None:
+        super().start(optimizer)
+        self.best = np.inf
+        self.wait = 0
+
+    def state(self) -> dict:
+        return dict(super().state(), best=self.best, wait=self.wait)
+
+    def on_epoch(self, optimizer, epoch: int, statistics: dict) -> None:
+        loss = statistics['valid_loss'][-1]
+        if loss < self.best - self.min_delta:
+            self.best = loss
+            self.wait = 0
+            return
+        self.wait += 1
+        if self.wait > self.patience:
+            self._set_factor(optimizer, max(self.factor * self.reduce_factor, self.min_factor))
+            self.wait = 0
+
+
+class CosineAnnealing(Scheduler):
+    """ anneals the learning rate of epoch e from the initial learning rate down to min_factor times of it:
+    factor = min_factor + (1 - min_factor) * (1 + cos(pi * e / num_epochs)) / 2 """
+    def __init__(self, num_epochs: int, min_factor: float=0.) -> None:
+        super().__init__()
+        assert num_epochs > 0, "num_epochs has to be positive"
+        self.num_epochs = num_epochs
+        self.min_factor = min_factor
+
+    def on_epoch(self, optimizer, epoch: int, statistics: dict) -> None:
+        # the factor of the next epoch, the last annealed epoch is num_epochs - 1 so that the factor stays positive
+        e = min(epoch + 1, self.num_epochs - 1)
+        cosine = (1 + np.cos(np.pi * e / self.num_epochs)) / 2
+        self._set_factor(optimizer, self.min_factor + (1 - self.min_factor) * cosine)
+
+
+class Warmup(Scheduler):
+    """ increases the learning rate linearly from start_factor times the initial learning rate to the initial
+    learning rate during the first num_steps steps """
+    def __init__(self, num_steps: int, start_factor: float=0.1) -> None:
+        super().__init__()
+        assert num_steps > 0, "num_steps has to be positive"
+        assert 0 < start_factor <= 1, "start_factor has to be in (0, 1]"
+        self.num_steps = num_steps
+        self.start_factor = start_factor
+
+    def start(self, optimizer) -> None:
+        super().start(optimizer)
+        self._set_factor(optimizer, self.start_factor)
+
+    def on_step(self, optimizer, step: int, statistics: dict) -> None:
+        progress = min(step + 1, self.num_steps) / self.num_steps
+        self._set_factor(optimizer, self.start_factor + (1 - self.start_factor) * progress)
+
+
+class EarlyStopping(object):
+    """
+    Stops the training
+        - when the validation loss has not improved by more than min_delta for patience epochs
+        - right away when the train loss diverges: it is not finite or exceeds divergence_threshold (if given)
+    With restore_best the weights of the epoch with the lowest validation loss are restored when training stops
+    (and at the end of training otherwise), the optimizer state is kept.
+    """
+    def __init__(self, patience: int=5, min_delta: float=0., divergence_threshold: float=None,
+                 restore_best: bool=True) -> None:
+        self.patience = patience
+        self.min_delta = min_delta
+        self.divergence_threshold = divergence_threshold
+        self.restore_best = restore_best
+
+    def start(self, model) -> None:
+        self.best = np.inf
+        self.best_epoch = None
+        self.best_params = None
+        self.wait = 0
+
+    def state(self) -> dict:
+        """ the state for checkpoints, best_params is stored as array of the checkpoint """
+        return {'best': self.best, 'best_epoch': self.best_epoch, 'wait': self.wait}
+
+    def set_state(self, state: dict, best_params: np.ndarray=None) -> None:
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.best_params = None if best_params is None else np.array(best_params)
+
+    def on_step(self, model, step: int, statistics: dict) -> str:
+        """ the reason to stop or None """
+        loss = statistics['train_loss'][-1]
+        if not np.isfinite(loss) or (self.divergence_threshold is not None and loss > self.divergence_threshold):
+            return 'divergence'
+        return None
+
+    def on_epoch(self, model, epoch: int, statistics: dict, params: np.ndarray=None) -> str:
+        """ params: the validated arena parameters if they differ from the current ones (asynchronous validation) """
+        loss = statistics['valid_loss'][-1]
+        if loss < self.best - self.min_delta:
+            self.best = loss
+            self.best_epoch = epoch
+            self.wait = 0
+            if self.restore_best:
+                # the arena holds the weights and biases of all layers
+                self.best_params = np.copy(model.arena.params if params is None else params)
+            return None
+        self.wait += 1
+        return 'early_stopping' if self.wait >= self.patience else None
+
+    def restore(self, model) -> None:
+        if self.restore_best and self.best_params is not None:
+            model.arena.params[...] = self.best_params
@@ -0,0 +1,149 @@
+import itertools
+import multiprocessing
+import os
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from dataset.dataset import DataSet, NormalizedImages
+
+"""
+Runs the trainings of a hyperparameter sweep concurrently in a pool of worker processes. The arrays of the data set
+are copied once into shared memory and mapped without copying by every worker (data sets of NormalizedImages share
+their uint8 images and are still normalized per batch). The workers are spawned with the BLAS and numba thread counts
+limited to blas_threads, so num_workers * blas_threads threads share the machine.
+
+Every configuration is passed as keyword arguments to build, which returns the untrained Model. build and the
+configurations are sent to the workers, so build has to be a module level function (the __main__ module of a script
+works if the sweep is started under if __name__ == '__main__').
+"""
+
+THREAD_VARIABLES = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                    'NUMEXPR_NUM_THREADS', 'NUMBA_NUM_THREADS']
+
+
+def grid(**axes) -> list:
+    """ all combinations of the values of axes as list of dicts, the last axis varies fastest:
+    grid(a=[1, 2], b=[3, 4]) -> [{'a': 1, 'b': 3}, {'a': 1, 'b': 4}, {'a': 2, 'b': 3}, {'a': 2, 'b': 4}] """
+    names = list(axes.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+@contextmanager
+def limited_threads(num_threads: int):
+    """ sets the thread count variables of the BLAS libraries and numba for processes started in the context """
+    previous = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    os.environ.update({name: str(num_threads) for name in THREAD_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+class SharedArrays(object):
+    """ copies arrays into shared memory blocks, which are released by close """
+    def __init__(self) -> None:
+        self.blocks = []
+
+    def share(self, array: np.ndarray) -> tuple:
+        """ returns the description (name, shape, dtype) with which attach maps the array """
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self.blocks.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def close(self) -> None:
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def share_data_set(data_set: DataSet, arrays: SharedArrays) -> tuple:
+    """ picklable description of data_set with its arrays in shared memory, see attach_data_set """
+    def share(X):
+        if isinstance(X, NormalizedImages):
+            return 'normalized', arrays.share(X.images), X.mean, X.std, X.dtype.str, X.scale
+        return 'array', arrays.share(X)
+    return tuple((share(X), share(y)) for X, y in (data_set.train_set(), data_set.validation_set(),
+                                                   data_set.test_set()))
+
+
+# shared memory blocks attached by the worker, they have to stay open as long as the data set is used
+_blocks = []
+_data_set = None
+
+
+def _attach(description: tuple) -> np.ndarray:
+    name, shape, dtype = description
+    block = shared_memory.SharedMemory(name=name)
+    _blocks.append(block)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    array.flags.writeable = False
+    return array
+
+
+def attach_data_set(description: tuple) -> DataSet:
+    def attach(X):
+        if X[0] == 'normalized':
+            _, images, mean, std, dtype, scale = X
+            return NormalizedImages(_attach(images), mean, std, np.dtype(dtype), scale)
+        return _attach(X[1])
+    return DataSet(*[(attach(X), attach(y)) for X, y in description])
+
+
+def _init_worker(description: tuple) -> None:
+    global _data_set
+    _data_set = attach_data_set(description)
+
+
+def _run_trial(trial: tuple) -> dict:
+    build, config, seed, train_args, evaluate_test = trial
+    if seed is not None:
+        np.random.seed(seed)
+    model = build(**config)
+    statistics = model.train(data_set=_data_set, **train_args)
+    if evaluate_test:
+        statistics['test_loss'], statistics['test_accuracy'] = model.cost(*_data_set.test_set())
+    return statistics
+
+
+class SweepRunner(object):
+    """
+    num_workers: number of worker processes (cpu count / blas_threads if None)
+    blas_threads: threads of BLAS and numba per worker
+    """
+    def __init__(self, num_workers: int=None, blas_threads: int=1) -> None:
+        assert blas_threads > 0, "blas_threads has to be positive"
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 1) // blas_threads)
+        self.blas_threads = blas_threads
+
+    def run(self, build, configs: list, data_set: DataSet, method: str='dfa', num_passes: int=20,
+            batch_size: int=128, seed: int=None, evaluate_test: bool=True, **train_args) -> list:
+        """ trains build(**config) for every config and returns the statistics of the models in the order of
+        configs. With evaluate_test the loss and accuracy on the test set are added as 'test_loss' and
+        'test_accuracy'. If seed is given, the trial i is run with the random seed seed + i. Further keyword
+        arguments are passed to Model.train """
+        train_args.update(method=method, num_passes=num_passes, batch_size=batch_size)
+        train_args.setdefault('verbose', False)
+        trials = [(build, config, None if seed is None else seed + i, train_args, evaluate_test)
+                  for i, config in enumerate(configs)]
+
+        arrays = SharedArrays()
+        try:
+            description = share_data_set(data_set, arrays)
+            context = multiprocessing.get_context('spawn')
+            with limited_threads(self.blas_threads):
+                pool = context.Pool(min(self.num_workers, max(len(trials), 1)), initializer=_init_worker,
+                                    initargs=(description,))
+            with pool:
+                # one trial per task, the trials take long and differ in length
+                return pool.map(_run_trial, trials, chunksize=1)
+        finally:
+            arrays.close()
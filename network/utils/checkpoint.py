@@ -0,0 +1,91 @@
+import os
+import pickle
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+"""
+Checkpoint file layout:
+
+    magic (8 bytes) | header length (8 bytes) | pickled header | arrays (each aligned to 64 bytes)
+
+The header holds the dtype, shape and offset of every array plus an arbitrary picklable state. Arrays are stored
+raw, so that they can be memory-mapped on load instead of being read into memory.
+"""
+
+MAGIC = b'DFACKPT1'
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save(file_name: str, arrays: dict, state: dict) -> None:
+    """ writes the checkpoint to a temporary file and atomically replaces file_name with it """
+    arrays = {key: np.require(array, requirements='C') for key, array in arrays.items()}
+
+    index = {}
+    offset = 0
+    for key, array in arrays.items():
+        offset = _align(offset)
+        index[key] = (array.dtype.str, array.shape, offset)
+        offset += array.nbytes
+
+    header = pickle.dumps({'arrays': index, 'state': state})
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    tmp_file_name = '{}.tmp{}'.format(file_name, os.getpid())
+    with open(tmp_file_name, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<Q', len(header)))
+        file.write(header)
+        for key, array in arrays.items():
+            file.seek(data_start + index[key][2])
+            file.write(array.data)
+        file.truncate(data_start + offset)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_file_name, file_name)
+
+
+def load(file_name: str, mmap_mode: str='c') -> tuple:
+    """ returns (arrays, state), the arrays are memory-mapped (copy-on-write by default, so they can be trained
+    further without modifying the file) """
+    with open(file_name, 'rb') as file:
+        magic = file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError("Invalid checkpoint file '{}'".format(file_name))
+        header_size, = struct.unpack('<Q', file.read(8))
+        header = pickle.loads(file.read(header_size))
+    data_start = _align(len(MAGIC) + 8 + header_size)
+
+    arrays = {}
+    for key, (dtype, shape, offset) in header['arrays'].items():
+        if np.prod(shape) == 0:
+            arrays[key] = np.empty(shape, dtype=dtype)
+        else:
+            mapped = np.memmap(file_name, dtype=dtype, mode=mmap_mode, offset=data_start + offset, shape=shape)
+            arrays[key] = np.asarray(mapped)
+    return arrays, header['state']
+
+
+class CheckpointWriter(object):
+    """ writes checkpoints on a background thread, at most one write is in flight at a time """
+    def __init__(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+
+    def write(self, file_name: str, arrays: dict, state: dict) -> None:
+        self.wait()
+        self.future = self.executor.submit(save, file_name, arrays, state)
+
+    def wait(self) -> None:
+        if self.future is not None:
+            self.future.result()
+            self.future = None
+
+    def close(self) -> None:
+        self.wait()
+        self.executor.shutdown()
@@ -0,0 +1,198 @@
+import numpy as np
+
+"""
+Alternative convolution algorithms for network.layers.convolution_im2col.Convolution. An engine computes the
+convolution (without bias), the gradient with respect to the filters and the gradient with respect to the input:
+
+    forward(X) -> (z, cache)                with z of shape (n, n_f, h_out, w_out)
+    weight_gradient(delta, cache) -> dW
+    input_gradient(delta, cache) -> dX
+
+The cache holds the transformed input of the forward pass. It is returned instead of being stored in the engine, so
+that the layer (and copies of the layer) can keep the cache of their own forward pass.
+"""
+
+
+class ConvolutionEngine(object):
+    def __init__(self, layer) -> None:
+        self.layer = layer
+
+    @staticmethod
+    def supports(filter_shape: tuple, stride: int, padding: int) -> bool:
+        return True
+
+    def forward(self, X: np.ndarray) -> tuple:
+        raise NotImplementedError()
+
+    def weight_gradient(self, delta: np.ndarray, cache: tuple) -> np.ndarray:
+        raise NotImplementedError()
+
+    def input_gradient(self, delta: np.ndarray, cache: tuple) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class FFTEngine(ConvolutionEngine):
+    """
+    Convolution in the frequency domain of the padded input. Per frequency the sum over the input channels is a
+    matrix product, so all three passes are one batched matmul between two transforms. A stride larger than 1 is
+    computed as stride 1 followed by subsampling (and by dilating the error for the gradients), so the engine pays off
+    for stride 1 and larger filters.
+    """
+
+    def __fft_shape(self, X_shape: tuple) -> tuple:
+        p = self.layer.padding
+        return X_shape[2] + 2 * p, X_shape[3] + 2 * p
+
+    def __to_matrices(self, a: np.ndarray) -> np.ndarray:
+        """ (i, j, h, w) -> (h * w, i, j) """
+        return a.transpose(2, 3, 0, 1).reshape(-1, a.shape[0], a.shape[1])
+
+    def __from_matrices(self, a: np.ndarray, fft_shape: tuple) -> np.ndarray:
+        """ (h * w, i, j) -> (i, j, h, w) """
+        return a.reshape(fft_shape[0], -1, a.shape[1], a.shape[2]).transpose(2, 3, 0, 1)
+
+    def __dilated_error(self, delta: np.ndarray, fft_shape: tuple) -> np.ndarray:
+        """ transform of the error, spread out by the stride, as (h * w, n, n_f) """
+        s = self.layer.stride
+        if s > 1:
+            n, n_f, h_out, w_out = delta.shape
+            dilated = np.zeros((n, n_f, s * (h_out - 1) + 1, s * (w_out - 1) + 1), dtype=delta.dtype)
+            dilated[:, :, ::s, ::s] = delta
+            delta = dilated
+        return self.__to_matrices(np.fft.rfft2(delta, s=fft_shape))
+
+    def forward(self, X: np.ndarray) -> tuple:
+        layer = self.layer
+        n_f, c_f, h_f, w_f = layer.W.shape
+        fft_shape = self.__fft_shape(X.shape)
+        p, s = layer.padding, layer.stride
+
+        X_padded = np.pad(X, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant') if p > 0 else X
+        X_freq = self.__to_matrices(np.fft.rfft2(X_padded, s=fft_shape))
+        # cross-correlation = convolution with the flipped filters
+        W_freq = self.__to_matrices(np.fft.rfft2(layer.W[:, :, ::-1, ::-1], s=fft_shape).transpose(1, 0, 2, 3))
+
+        z_freq = self.__from_matrices(np.matmul(X_freq, W_freq), fft_shape)
+        z = np.fft.irfft2(z_freq, s=fft_shape)
+        z = z[:, :, h_f - 1:h_f - 1 + s * (layer.h_out - 1) + 1:s, w_f - 1:w_f - 1 + s * (layer.w_out - 1) + 1:s]
+        return z.astype(X.dtype, copy=False), (X.shape, X_freq)
+
+    def weight_gradient(self, delta: np.ndarray, cache: tuple) -> np.ndarray:
+        n_f, c_f, h_f, w_f = self.layer.W.shape
+        X_shape, X_freq = cache
+        fft_shape = self.__fft_shape(X_shape)
+
+        delta_freq = self.__dilated_error(delta, fft_shape)
+        dW_freq = self.__from_matrices(np.matmul(np.conj(delta_freq).transpose(0, 2, 1), X_freq), fft_shape)
+        dW = np.fft.irfft2(dW_freq, s=fft_shape)[:, :, :h_f, :w_f]
+        return np.ascontiguousarray(dW, dtype=delta.dtype)
+
+    def input_gradient(self, delta: np.ndarray, cache: tuple) -> np.ndarray:
+        layer = self.layer
+        X_shape, X_freq = cache
+        n, c, h_in, w_in = X_shape
+        fft_shape = self.__fft_shape(X_shape)
+        p = layer.padding
+
+        delta_freq = self.__dilated_error(delta, fft_shape)
+        W_freq = self.__to_matrices(np.fft.rfft2(layer.W, s=fft_shape))
+        dX_freq = self.__from_matrices(np.matmul(delta_freq, W_freq), fft_shape)
+        dX = np.fft.irfft2(dX_freq, s=fft_shape)[:, :, p:p + h_in, p:p + w_in]
+        return np.ascontiguousarray(dX, dtype=delta.dtype)
+
+
+class WinogradEngine(ConvolutionEngine):
+    """
+    Winograd F(2x2, 3x3) for 3x3 filters with stride 1: every 2x2 output tile is computed from a 4x4 input tile with
+    16 instead of 36 multiplications per channel pair. The 16 element-wise products (summed over the channels) are
+    batched matrix products. The gradients are the exact transposes of the forward transforms:
+
+        forward:  Y  = A^T [(G W G^T) * (B^T d B)] A
+        dW:       dW = G^T [sum over tiles (A dY A^T) * (B^T d B)] G
+        dX:       dd = B [(G W G^T) * (A dY A^T)] B^T   (overlapping tiles are summed up)
+    """
+    B_T = np.array([[1, 0, -1, 0], [0, 1, 1, 0], [0, -1, 1, 0], [0, 1, 0, -1]], dtype=np.float64)
+    G = np.array([[1, 0, 0], [0.5, 0.5, 0.5], [0.5, -0.5, 0.5], [0, 0, 1]], dtype=np.float64)
+    A_T = np.array([[1, 1, 1, 0], [0, 1, -1, -1]], dtype=np.float64)
+
+    @staticmethod
+    def supports(filter_shape: tuple, stride: int, padding: int) -> bool:
+        return tuple(filter_shape[2:]) == (3, 3) and stride == 1
+
+    def __num_tiles(self) -> tuple:
+        return (self.layer.h_out + 1) // 2, (self.layer.w_out + 1) // 2
+
+    def __transformed_filters(self, dtype) -> np.ndarray:
+        """ G W G^T as (16, n_f, c) """
+        G = self.G.astype(dtype)
+        U = np.tensordot(np.tensordot(G, self.layer.W, axes=([1], [2])), G, axes=([3], [1]))
+        return U.transpose(0, 3, 1, 2).reshape(16, U.shape[1], U.shape[2])
+
+    def __transformed_error(self, delta: np.ndarray) -> np.ndarray:
+        """ A dY A^T of every output tile as (16, n_f, n * tiles) """
+        n, n_f, h_out, w_out = delta.shape
+        t_h, t_w = self.__num_tiles()
+        if (2 * t_h, 2 * t_w) != (h_out, w_out):
+            # the outputs of the incomplete tiles are cropped, so they get no error
+            delta = np.pad(delta, ((0, 0), (0, 0), (0, 2 * t_h - h_out), (0, 2 * t_w - w_out)), mode='constant')
+        tiles = delta.reshape(n, n_f, t_h, 2, t_w, 2).transpose(3, 5, 1, 0, 2, 4)
+        A_T = self.A_T.astype(delta.dtype)
+        dM = np.tensordot(A_T, np.tensordot(A_T, tiles, axes=([0], [1])), axes=([0], [1]))
+        return dM.reshape(16, n_f, -1)
+
+    def forward(self, X: np.ndarray) -> tuple:
+        layer = self.layer
+        n, c, h_in, w_in = X.shape
+        n_f = layer.W.shape[0]
+        p = layer.padding
+        t_h, t_w = self.__num_tiles()
+
+        # pad to complete 4x4 input tiles with a step of 2
+        X_padded = np.pad(X, ((0, 0), (0, 0), (p, 2 * t_h + 2 - h_in - p), (p, 2 * t_w + 2 - w_in - p)),
+                          mode='constant')
+        s_n, s_c, s_h, s_w = X_padded.strides
+        tiles = np.lib.stride_tricks.as_strided(X_padded, shape=(n, c, t_h, t_w, 4, 4),
+                                                strides=(s_n, s_c, 2 * s_h, 2 * s_w, s_h, s_w), writeable=False)
+
+        B_T = self.B_T.astype(X.dtype)
+        V = np.tensordot(np.tensordot(B_T, tiles, axes=([1], [4])), B_T, axes=([5], [1]))
+        # (4, n, c, t_h, t_w, 4) -> (16, c, n * tiles)
+        V = V.transpose(0, 5, 2, 1, 3, 4).reshape(16, c, -1)
+
+        M = np.matmul(self.__transformed_filters(X.dtype), V)
+        A_T = self.A_T.astype(X.dtype)
+        Y = np.tensordot(A_T, np.tensordot(A_T, M.reshape(4, 4, n_f, n, t_h, t_w), axes=([1], [0])), axes=([1], [1]))
+        # (2 columns, 2 rows, n_f, n, t_h, t_w) -> (n, n_f, t_h, 2 rows, t_w, 2 columns)
+        z = Y.transpose(3, 2, 4, 1, 5, 0).reshape(n, n_f, 2 * t_h, 2 * t_w)
+        return z[:, :, :layer.h_out, :layer.w_out], (X.shape, V)
+
+    def weight_gradient(self, delta: np.ndarray, cache: tuple) -> np.ndarray:
+        X_shape, V = cache
+        dU = np.matmul(self.__transformed_error(delta), V.transpose(0, 2, 1))
+        G = self.G.astype(delta.dtype)
+        dU = dU.reshape(4, 4, dU.shape[1], dU.shape[2])
+        dW = np.tensordot(G, np.tensordot(G, dU, axes=([0], [0])), axes=([0], [1]))
+        # (3, 3, n_f, c) -> (n_f, c, 3, 3)
+        return np.ascontiguousarray(dW.transpose(2, 3, 1, 0))
+
+    def input_gradient(self, delta: np.ndarray, cache: tuple) -> np.ndarray:
+        X_shape, V = cache
+        n, c, h_in, w_in = X_shape
+        p = self.layer.padding
+        t_h, t_w = self.__num_tiles()
+
+        dV = np.matmul(self.__transformed_filters(delta.dtype).transpose(0, 2, 1), self.__transformed_error(delta))
+        B_T = self.B_T.astype(delta.dtype)
+        d_tiles = np.tensordot(B_T, np.tensordot(B_T, dV.reshape(4, 4, c, n, t_h, t_w), axes=([0], [0])),
+                               axes=([0], [1]))
+        # (4 columns, 4 rows, c, n, t_h, t_w): the tiles overlap by 2, so each 2x2 block of the tiles is added
+        # separately
+        dX_padded = np.zeros((n, c, 2 * t_h + 2, 2 * t_w + 2), dtype=delta.dtype)
+        for i in range(2):
+            for j in range(2):
+                block = d_tiles[2 * j:2 * j + 2, 2 * i:2 * i + 2].transpose(3, 2, 4, 1, 5, 0)
+                dX_padded[:, :, 2 * i:2 * i + 2 * t_h, 2 * j:2 * j + 2 * t_w] += block.reshape(n, c, 2 * t_h, 2 * t_w)
+        return np.ascontiguousarray(dX_padded[:, :, p:p + h_in, p:p + w_in])
+
+
+ENGINES = {'fft': FFTEngine, 'winograd': WinogradEngine}
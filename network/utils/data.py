@@ -1,3 +1,6 @@
+import queue
+import threading
+
 import numpy as np
 
 
@@ -7,4 +10,121 @@ def mini_batches(X, y, batch_size, shuffle=True):
         np.random.shuffle(indices)
     for i in range(0, X.shape[0] - batch_size + 1, batch_size):
         curr_indices = indices[i:i + batch_size]
-        yield X[curr_indices], y[curr_indices]
\ No newline at end of file
+        yield X[curr_indices], y[curr_indices]
+
+
+class BatchLoader(object):
+    """
+    Mini-batch iterator factory that gathers the next num_prefetch batches on a background thread into a ring of
+    preallocated buffers. Optionally the batches are converted to another dtype and normalized on the fly:
+    (X - mean) / std.
+
+    The buffers are reused, a batch returned by the iterator is only valid until the next batch is requested.
+    Unlike mini_batches the last, partial batch is kept unless drop_last is set.
+    """
+    def __init__(self, num_prefetch: int=2, shuffle: bool=True, drop_last: bool=False, mean: np.ndarray=None,
+                 std: np.ndarray=None) -> None:
+        assert num_prefetch > 0, "num_prefetch has to be positive"
+        self.num_prefetch = num_prefetch
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.mean = mean
+        self.std = std
+
+    def batches(self, X: np.ndarray, y: np.ndarray, batch_size: int, dtype: type=None) -> 'PrefetchIterator':
+        return PrefetchIterator(self, X, y, batch_size, X.dtype if dtype is None else dtype)
+
+
+class PrefetchIterator(object):
+    def __init__(self, loader: BatchLoader, X: np.ndarray, y: np.ndarray, batch_size: int, dtype: type) -> None:
+        self.loader = loader
+        self.X = X
+        self.y = y
+
+        # the shuffling happens on the calling thread, so that it is reproducible from the global rng state
+        n = X.shape[0]
+        self.indices = np.arange(n)
+        if loader.shuffle:
+            np.random.shuffle(self.indices)
+        end = n - batch_size + 1 if loader.drop_last else n
+        self.starts = [(i, min(i + batch_size, n)) for i in range(0, end, batch_size)]
+
+        # one buffer more than prefetched batches: the one currently in use by the consumer
+        self.slots = [
+            (np.empty((batch_size,) + X.shape[1:], dtype=dtype), np.empty(batch_size, dtype=y.dtype))
+            for _ in range(loader.num_prefetch + 1)
+        ]
+        self.free = queue.Queue()
+        for i in range(len(self.slots)):
+            self.free.put(i)
+        self.ready = queue.Queue()
+        self.current = None
+        self.finished = False
+        self.stopped = threading.Event()
+
+        self.thread = threading.Thread(target=self.__produce, daemon=True)
+        self.thread.start()
+
+    def __gather(self, slot: int, start: int, end: int) -> None:
+        X_buffer, y_buffer = self.slots[slot]
+        indices = self.indices[start:end]
+        size = end - start
+        mean, std = self.loader.mean, self.loader.std
+
+        if mean is None and std is None and isinstance(self.X, np.ndarray) and X_buffer.dtype == self.X.dtype:
+            np.take(self.X, indices, axis=0, out=X_buffer[:size])
+        elif mean is None:
+            X_buffer[:size] = self.X[indices]
+        else:
+            np.subtract(self.X[indices], mean, out=X_buffer[:size], casting='same_kind')
+        if std is not None:
+            X_buffer[:size] /= std
+        np.take(self.y, indices, out=y_buffer[:size])
+
+    def __produce(self) -> None:
+        try:
+            for start, end in self.starts:
+                slot = None
+                while slot is None:
+                    if self.stopped.is_set():
+                        return
+                    try:
+                        slot = self.free.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                self.__gather(slot, start, end)
+                self.ready.put((slot, end - start))
+            self.ready.put(None)
+        except Exception as e:
+            self.ready.put(e)
+
+    def __iter__(self) -> 'PrefetchIterator':
+        return self
+
+    def __next__(self) -> tuple:
+        if self.current is not None:
+            self.free.put(self.current)
+            self.current = None
+
+        if self.finished:
+            raise StopIteration()
+        item = self.ready.get()
+        if item is None:
+            self.finished = True
+            raise StopIteration()
+        if isinstance(item, Exception):
+            raise item
+
+        self.current, size = item
+        X_buffer, y_buffer = self.slots[self.current]
+        return X_buffer[:size], y_buffer[:size]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def __del__(self) -> None:
+        self.stopped.set()
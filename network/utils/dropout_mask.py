@@ -0,0 +1,90 @@
+import numba as nb
+import numpy as np
+
+"""
+Bit-packed dropout masks. The bits are drawn with a counter-based hash (splitmix64 of seed and element index), so
+the kernels can run in parallel and the mask only depends on the seed, which is drawn from the global numpy random
+state. The bits follow the C order of the masked array and the bit order of np.packbits.
+
+Dropout is inverted: kept units are scaled by 1 / (1 - rate) during training, so nothing has to be rescaled for
+prediction.
+"""
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_SHIFT_30 = np.uint64(30)
+_SHIFT_27 = np.uint64(27)
+_SHIFT_31 = np.uint64(31)
+_SHIFT_32 = np.uint64(32)
+
+
+@nb.njit(cache=True)
+def _hash(seed, i):
+    z = seed + np.uint64(i) * _GOLDEN
+    z = (z ^ (z >> _SHIFT_30)) * _MIX_1
+    z = (z ^ (z >> _SHIFT_27)) * _MIX_2
+    return z ^ (z >> _SHIFT_31)
+
+
+@nb.njit(parallel=True, cache=True)
+def _draw_bits(seed, threshold, size, bits):
+    """ bit i is set (unit i is kept) if the upper 32 bits of the hash of i are >= threshold """
+    for b in nb.prange(bits.shape[0]):
+        byte = 0
+        for k in range(8):
+            i = b * 8 + k
+            if i < size and (_hash(seed, i) >> _SHIFT_32) >= threshold:
+                byte |= 1 << (7 - k)
+        bits[b] = byte
+
+
+@nb.njit(parallel=True, cache=True)
+def _apply_bits(x, bits, scale):
+    """ x *= mask * scale, in place for a flat array x """
+    size = x.shape[0]
+    full = size // 8
+    for b in nb.prange(full):
+        byte = bits[b]
+        for k in range(8):
+            x[b * 8 + k] *= scale * ((byte >> (7 - k)) & 1)
+    for i in range(full * 8, size):
+        x[i] *= scale * ((bits[full] >> (7 - i + full * 8)) & 1)
+
+
+class DropoutMask(object):
+    def __init__(self, shape: tuple, rate: float) -> None:
+        assert 0 <= rate < 1, "dropout rate has to be in [0, 1)"
+        self.shape = tuple(shape)
+        self.rate = rate
+        self.scale = 1 / (1 - rate)
+        self.size = int(np.prod(self.shape))
+        self.bits = np.empty((self.size + 7) // 8, dtype=np.uint8)
+        seed = np.uint64(np.random.randint(0, 2 ** 63, dtype=np.int64))
+        _draw_bits(seed, np.uint64(rate * 2 ** 32), self.size, self.bits)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def unpack(self, dtype: type=np.float64) -> np.ndarray:
+        """ the mask as array of 0 and 1 / (1 - rate) """
+        mask = np.unpackbits(self.bits, count=self.size).reshape(self.shape).astype(dtype)
+        mask *= self.scale
+        return mask
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        """ multiplies x in place with the (scaled) mask and returns it """
+        assert x.shape == self.shape, "mask of shape {} does not match shape {}".format(self.shape, x.shape)
+        if x.flags.c_contiguous:
+            _apply_bits(x.reshape(-1), self.bits, x.dtype.type(self.scale))
+        else:
+            x *= self.unpack(x.dtype)
+        return x
+
+
+def dropout(x: np.ndarray, rate: float) -> DropoutMask:
+    """ draws a new mask for x and applies it to x in place """
+    mask = DropoutMask(x.shape, rate)
+    mask.apply(x)
+    return mask
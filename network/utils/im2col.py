@@ -1,5 +1,7 @@
 # from CS231n course assignment (http://cs231n.stanford.edu/)
 
+import functools
+
 import numpy as np
 
 
@@ -54,4 +56,86 @@ def col2im_indices(cols, x_shape, field_height=3, field_width=3, padding=1,
     return x_padded
   return x_padded[:, :, padding:-padding, padding:-padding]
 
-pass
\ No newline at end of file
+pass
+
+@functools.lru_cache(maxsize=32)
+def get_im2col_flat_indices(input_shape, field_height, field_width, padding=1,
+                            stride=1):
+  """ Flat (k, i, j) indices into the padded input of shape (C, H, W),
+  computed once per input shape and shared by gather and scatter """
+  C, H, W = input_shape
+  k, i, j = get_im2col_indices((None, C, H, W), field_height, field_width,
+                               padding, stride)
+  indices = (k * (H + 2 * padding) + i) * (W + 2 * padding) + j
+  indices.setflags(write=False)
+  return indices
+
+
+def im2col_gather(x, field_height, field_width, padding=1, stride=1, out=None):
+  """ An implementation of im2col based on a cached gather table and np.take
+  into a (preallocated) column matrix """
+  N, C, H, W = x.shape
+  p = padding
+  indices = get_im2col_flat_indices((C, H, W), field_height, field_width,
+                                    padding, stride)
+
+  x_padded = np.zeros((C, H + 2 * p, W + 2 * p, N), dtype=x.dtype)
+  x_padded[:, p:H + p, p:W + p, :] = x.transpose(1, 2, 3, 0)
+
+  if out is None:
+    out = np.empty((indices.shape[0], indices.shape[1] * N), dtype=x.dtype)
+  np.take(x_padded.reshape(-1, N), indices, axis=0,
+          out=out.reshape(indices.shape + (N,)))
+  return out
+
+
+def col2im_scatter(cols, N, C, H, W, field_height=3, field_width=3, padding=1,
+                   stride=1):
+  """ An implementation of col2im based on the cached gather table of
+  im2col_gather and np.add.at """
+  p = padding
+  indices = get_im2col_flat_indices((C, H, W), field_height, field_width,
+                                    padding, stride)
+
+  x_padded = np.zeros((C * (H + 2 * p) * (W + 2 * p), N), dtype=cols.dtype)
+  np.add.at(x_padded, indices.ravel(), cols.reshape(-1, N))
+  x_padded = x_padded.reshape(C, H + 2 * p, W + 2 * p, N)
+  return np.ascontiguousarray(x_padded[:, p:H + p, p:W + p, :].transpose(3, 0, 1, 2))
+
+
+def im2col_strided(x, field_height, field_width, padding=1, stride=1, out=None):
+  """ An implementation of im2col based on stride tricks: the patches are a
+  strided view of the padded input, which is copied once into the columns """
+  N, C, H, W = x.shape
+  p = padding
+  out_height = (H + 2 * padding - field_height) // stride + 1
+  out_width = (W + 2 * padding - field_width) // stride + 1
+
+  # (C, H, W, N) layout, so that the columns come out in the same order as im2col_cython
+  x_padded = np.zeros((C, H + 2 * p, W + 2 * p, N), dtype=x.dtype)
+  x_padded[:, p:H + p, p:W + p, :] = x.transpose(1, 2, 3, 0)
+
+  s_c, s_h, s_w, s_n = x_padded.strides
+  patches = np.lib.stride_tricks.as_strided(
+      x_padded, shape=(C, field_height, field_width, out_height, out_width, N),
+      strides=(s_c, s_h, s_w, stride * s_h, stride * s_w, s_n), writeable=False)
+  if out is None:
+    return patches.reshape(C * field_height * field_width, -1)
+  np.copyto(out.reshape(patches.shape), patches)
+  return out
+
+
+def col2im_strided(cols, N, C, H, W, field_height=3, field_width=3, padding=1,
+                   stride=1):
+  """ An implementation of col2im based on strided slices, one addition per
+  filter position """
+  p = padding
+  out_height = (H + 2 * padding - field_height) // stride + 1
+  out_width = (W + 2 * padding - field_width) // stride + 1
+
+  x_padded = np.zeros((C, H + 2 * p, W + 2 * p, N), dtype=cols.dtype)
+  cols_reshaped = cols.reshape(C, field_height, field_width, out_height, out_width, N)
+  for ii in range(field_height):
+    for jj in range(field_width):
+      x_padded[:, ii:ii + stride * out_height:stride, jj:jj + stride * out_width:stride, :] += cols_reshaped[:, ii, jj]
+  return np.ascontiguousarray(x_padded[:, p:H + p, p:W + p, :].transpose(3, 0, 1, 2))
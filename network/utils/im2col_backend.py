@@ -0,0 +1,46 @@
+from network.utils.im2col import im2col_gather, col2im_scatter, im2col_strided, col2im_strided
+from network.utils.im2col_numba import im2col_numba, col2im_numba
+
+"""
+Registry of im2col / col2im implementations. All backends share the signatures
+
+    im2col(x, field_height, field_width, padding, stride, out=None) -> cols
+    col2im(cols, N, C, H, W, field_height, field_width, padding, stride) -> x
+
+and the column layout of im2col_cython. If out is given, im2col writes the columns into it and returns it. 'auto' picks
+the first available backend of AUTO_ORDER (see 10_im2col_backends.py for the comparison), the Cython extension is only
+available if it has been built (python setup.py build_ext --inplace).
+"""
+
+BACKENDS = {}
+AUTO_ORDER = ['numba', 'cython', 'strided']
+
+
+def register_backend(name: str, im2col, col2im) -> None:
+    BACKENDS[name] = (im2col, col2im)
+
+
+def available_backends() -> list:
+    return list(BACKENDS.keys())
+
+
+def get_backend(name: str='auto') -> tuple:
+    """ returns (im2col, col2im) of the given backend """
+    if name == 'auto':
+        for candidate in AUTO_ORDER:
+            if candidate in BACKENDS:
+                return BACKENDS[candidate]
+    if name not in BACKENDS:
+        raise ValueError("Unknown im2col backend '{}', available backends: {}".format(name, available_backends()))
+    return BACKENDS[name]
+
+
+register_backend('indices', im2col_gather, col2im_scatter)
+register_backend('strided', im2col_strided, col2im_strided)
+register_backend('numba', im2col_numba, col2im_numba)
+
+try:
+    from network.utils.im2col_cython import im2col_cython, col2im_cython
+    register_backend('cython', im2col_cython, col2im_cython)
+except ImportError:
+    pass
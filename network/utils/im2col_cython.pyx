@@ -12,22 +12,24 @@ ctypedef fused DTYPE_t:
     np.float64_t
 
 def im2col_cython(np.ndarray[DTYPE_t, ndim=4] x, int field_height,
-                  int field_width, int padding, int stride):
+                  int field_width, int padding, int stride,
+                  np.ndarray[DTYPE_t, ndim=2] out=None):
     cdef int N = x.shape[0]
     cdef int C = x.shape[1]
     cdef int H = x.shape[2]
     cdef int W = x.shape[3]
 
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
 
     cdef int p = padding
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.pad(x,
             ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
 
-    cdef np.ndarray[DTYPE_t, ndim=2] cols = np.zeros(
-            (C * field_height * field_width, N * HH * WW),
-            dtype=x.dtype)
+    # every entry of cols is written by the inner loop, so a preallocated buffer can be reused as is
+    cdef np.ndarray[DTYPE_t, ndim=2] cols = out
+    if cols is None:
+        cols = np.zeros((C * field_height * field_width, N * HH * WW), dtype=x.dtype)
 
     # Moving the inner loop to a C function with no bounds checking works, but does
     # not seem to help performance in any measurable way.
@@ -59,8 +61,8 @@ cdef int im2col_cython_inner(np.ndarray[DTYPE_t, ndim=2] cols,
 def col2im_cython(np.ndarray[DTYPE_t, ndim=2] cols, int N, int C, int H, int W,
                   int field_height, int field_width, int padding, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * padding, W + 2 * padding),
                                         dtype=cols.dtype)
 
@@ -111,8 +113,8 @@ cdef col2im_6d_cython_inner(np.ndarray[DTYPE_t, ndim=6] cols,
 def col2im_6d_cython(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C, int H, int W,
         int HH, int WW, int pad, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int out_h = (H + 2 * pad - HH) / stride + 1
-    cdef int out_w = (W + 2 * pad - WW) / stride + 1
+    cdef int out_h = (H + 2 * pad - HH) // stride + 1
+    cdef int out_w = (W + 2 * pad - WW) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad),
                                                   dtype=cols.dtype)
 
@@ -0,0 +1,63 @@
+import numba as nb
+import numpy as np
+
+"""
+Numba implementation of im2col / col2im with the same column layout as im2col_cython: row c * fh * fw + ii * fw + jj,
+column (yy * WW + xx) * N + n. The input is transposed to (C, H, W, N) first, so the innermost loop over the samples
+reads and writes contiguous memory. Padding is handled by bounds checks instead of a padded copy.
+"""
+
+
+@nb.njit(parallel=True, cache=True)
+def im2col_numba(x, field_height, field_width, padding, stride, out=None):
+    N, C, H, W = x.shape
+    HH = (H + 2 * padding - field_height) // stride + 1
+    WW = (W + 2 * padding - field_width) // stride + 1
+
+    xt = np.ascontiguousarray(x.transpose(1, 2, 3, 0))
+    if out is None:
+        cols = np.empty((C * field_height * field_width, HH * WW * N), dtype=x.dtype)
+    else:
+        cols = out
+
+    for row in nb.prange(C * field_height * field_width):
+        c = row // (field_height * field_width)
+        ii = (row // field_width) % field_height
+        jj = row % field_width
+        for yy in range(HH):
+            y = stride * yy + ii - padding
+            for xx in range(WW):
+                col = (yy * WW + xx) * N
+                x_ = stride * xx + jj - padding
+                if 0 <= y < H and 0 <= x_ < W:
+                    for n in range(N):
+                        cols[row, col + n] = xt[c, y, x_, n]
+                else:
+                    for n in range(N):
+                        cols[row, col + n] = 0
+    return cols
+
+
+@nb.njit(parallel=True, cache=True)
+def col2im_numba(cols, N, C, H, W, field_height, field_width, padding, stride):
+    HH = (H + 2 * padding - field_height) // stride + 1
+    WW = (W + 2 * padding - field_width) // stride + 1
+
+    # every channel only receives values of its own rows, so channels can be accumulated in parallel
+    xt = np.zeros((C, H, W, N), dtype=cols.dtype)
+    for c in nb.prange(C):
+        for ii in range(field_height):
+            for jj in range(field_width):
+                row = (c * field_height + ii) * field_width + jj
+                for yy in range(HH):
+                    y = stride * yy + ii - padding
+                    if y < 0 or y >= H:
+                        continue
+                    for xx in range(WW):
+                        x_ = stride * xx + jj - padding
+                        if x_ < 0 or x_ >= W:
+                            continue
+                        col = (yy * WW + xx) * N
+                        for n in range(N):
+                            xt[c, y, x_, n] += cols[row, col + n]
+    return np.ascontiguousarray(xt.transpose(3, 0, 1, 2))
@@ -0,0 +1,154 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from network.arena import squared_sum
+from network.inference import InferenceEngine
+
+"""
+Validation during Model.train. A ValidationPolicy decides when the model is validated and on which samples:
+    - on the full validation set after every interval_epochs epochs and after the last epoch
+    - every interval_steps steps on a fixed random subset of subset_size validation samples, which gives a cheap and
+      fine grained estimate of the validation loss during long epochs
+
+With asynchronous the evaluations run in a background thread on a snapshot of the parameter arena, training goes on
+in the meantime. The snapshots are evaluated with an InferenceEngine on shallow copies of the layers, so the caches of
+the layers used for training are not touched. Results are handed to the model in the order of the evaluations as soon
+as they are finished, i.e. the validation of an epoch may arrive some steps into the next one. Training waits when
+more than max_pending evaluations are outstanding, which bounds the memory of the snapshots.
+"""
+
+
+class ValidationResult(object):
+    def __init__(self, subset: bool, epoch: int, step: int, loss: float, accuracy: float,
+                 params: np.ndarray=None) -> None:
+        self.subset = subset
+        self.epoch = epoch
+        self.step = step
+        self.loss = loss
+        self.accuracy = accuracy
+        # the evaluated snapshot of the arena parameters, None if the current parameters were evaluated
+        self.params = params
+
+
+class ValidationPolicy(object):
+    """
+    interval_epochs: full validation after every interval_epochs epochs (and after the last one)
+    interval_steps: validation on the subset every interval_steps steps (0: never)
+    subset_size: number of validation samples in the subset, drawn once with seed
+    asynchronous: evaluate on weight snapshots in a background thread
+    max_pending: maximum number of outstanding asynchronous evaluations
+    """
+    def __init__(self, interval_epochs: int=1, interval_steps: int=0, subset_size: int=1000,
+                 asynchronous: bool=False, max_pending: int=2, seed: int=0) -> None:
+        assert interval_epochs > 0, "interval_epochs has to be positive"
+        assert interval_steps >= 0, "interval_steps must not be negative"
+        assert max_pending > 0, "max_pending has to be positive"
+        self.interval_epochs = interval_epochs
+        self.interval_steps = interval_steps
+        self.subset_size = subset_size
+        self.asynchronous = asynchronous
+        self.max_pending = max_pending
+        self.seed = seed
+
+        self.model = None
+        self.valid_set = None
+        self.subset = None
+        self.executor = None
+        self.engine = None
+        self.layers = []
+        self.pending = []
+
+    def start(self, model, X_valid: np.ndarray, y_valid: np.ndarray) -> None:
+        """ called before the first step, after the parameter arena of model is created """
+        self.model = model
+        self.valid_set = X_valid, y_valid
+        self.subset = None
+        if self.interval_steps > 0:
+            # a separate generator, the global random state drives the shuffling of the training data
+            n = y_valid.shape[0]
+            indices = np.sort(np.random.RandomState(self.seed).permutation(n)[:min(self.subset_size, n)])
+            self.subset = X_valid[indices], y_valid[indices]
+
+        self.pending = []
+        self.engine = None
+        if self.asynchronous:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            # pairs of (copy, layer), the copies get the weights of the snapshot to evaluate
+            self.layers = [(copy.copy(layer), layer) for layer in model.layers]
+            self.engine = InferenceEngine([layer_copy for layer_copy, _ in self.layers], model.input_size,
+                                          model.dtype, model.eval_batch_size or 1000)
+
+    def on_step(self, step: int, epoch: int) -> list:
+        """ called after step (counted from 1), returns the finished results """
+        if self.subset is not None and step % self.interval_steps == 0:
+            self.__evaluate(True, epoch, step)
+        return self.__collect(wait=False)
+
+    def on_epoch(self, step: int, epoch: int, last: bool) -> list:
+        """ called at the end of epoch, returns the finished results """
+        if last or (epoch + 1) % self.interval_epochs == 0:
+            self.__evaluate(False, epoch, step)
+        return self.__collect(wait=False)
+
+    def finish(self) -> list:
+        """ waits for the outstanding evaluations and returns their results """
+        results = self.__collect(wait=True)
+        self.close()
+        return results
+
+    def close(self) -> None:
+        """ shuts the background thread down, outstanding evaluations are discarded """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        self.pending = []
+
+    def __evaluate(self, subset: bool, epoch: int, step: int) -> None:
+        X, y = self.subset if subset else self.valid_set
+        if not self.asynchronous:
+            loss, accuracy = self.model.cost(X, y)
+            self.pending.append((None, ValidationResult(subset, epoch, step, loss, accuracy)))
+            return
+
+        if len(self.pending) >= self.max_pending:
+            self.pending[0][0].result()
+        params = np.copy(self.model.arena.params)
+        future = self.executor.submit(self.__cost, X, y, params)
+        self.pending.append((future, ValidationResult(subset, epoch, step, None, None, params)))
+
+    def __cost(self, X: np.ndarray, y: np.ndarray, params: np.ndarray) -> tuple:
+        """ loss and accuracy of the parameters params like Model.cost, runs in the background thread """
+        model = self.model
+        arena = model.arena
+        for layer_copy, layer in self.layers:
+            if id(layer) in arena.slices:
+                layer_copy.W, layer_copy.b = arena.views(layer, params)
+
+        n = X.shape[0]
+        total_loss = 0
+        correct = 0
+        for start, end, out in self.engine.chunks(X):
+            chunk_loss, _, chunk_correct = model.loss.evaluate(out, y[start:end], gradient=False)
+            total_loss += chunk_loss * (end - start)
+            correct += chunk_correct
+        loss = total_loss / n
+
+        if model.regularization > 0:
+            loss += (squared_sum(params[:arena.num_weights], model.accumulate_dtype) * model.regularization / 2.) / n
+
+        return loss, correct / n
+
+    def __collect(self, wait: bool) -> list:
+        """ the finished results in the order of the evaluations """
+        results = []
+        while self.pending:
+            future, result = self.pending[0]
+            if future is not None:
+                if not wait and not future.done():
+                    break
+                result.loss, result.accuracy = future.result()
+            self.pending.pop(0)
+            results.append(result)
+        return results
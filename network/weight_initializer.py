@@ -2,7 +2,8 @@ import numpy as np
 
 
 class WeightInitializer(object):
-    def init(self, dim: tuple) -> np.ndarray:
+    def init(self, dim: tuple, dtype: type=np.float64, rng=None) -> np.ndarray:
+        """ rng: generator (e.g. np.random.Generator) to draw from, the global numpy random state if None """
         raise NotImplementedError()
 
     def __str__(self):
@@ -14,8 +15,8 @@ class Fill(WeightInitializer):
     def __init__(self, fill_value: float) -> None:
         self.fill_value = fill_value
 
-    def init(self, dim: tuple) -> np.ndarray:
-        return np.full(shape=dim, fill_value=self.fill_value, dtype=float)
+    def init(self, dim: tuple, dtype: type=np.float64, rng=None) -> np.ndarray:
+        return np.full(shape=dim, fill_value=self.fill_value, dtype=dtype)
 
     def __str__(self):
         return "Fill(fill_value={})".format(self.fill_value)
@@ -27,8 +28,9 @@ class RandomUniform(WeightInitializer):
         self.low = low
         self.high = high
 
-    def init(self, dim: tuple) -> np.ndarray:
-        return np.random.uniform(low=self.low, high=self.high, size=dim)
+    def init(self, dim: tuple, dtype: type=np.float64, rng=None) -> np.ndarray:
+        rng = np.random if rng is None else rng
+        return rng.uniform(low=self.low, high=self.high, size=dim).astype(dtype, copy=False)
 
     def __str__(self):
         return "Uniform(low={}, high={})".format(self.low, self.high)
@@ -40,8 +42,9 @@ class RandomNormal(WeightInitializer):
         self.sigma = sigma
         self.mu = mu
 
-    def init(self, dim: tuple) -> np.ndarray:
-        return self.sigma * np.random.randn(*dim) + self.mu
+    def init(self, dim: tuple, dtype: type=np.float64, rng=None) -> np.ndarray:
+        rng = np.random if rng is None else rng
+        return (self.sigma * rng.standard_normal(size=dim) + self.mu).astype(dtype, copy=False)
 
     def __str__(self):
         return "Normal(sigma={}, mu={})".format(self.sigma, self.mu)
\ No newline at end of file